@@ -0,0 +1,333 @@
+"""
+MÓDULO DE ANALÍTICA DE CITAS
+Agregaciones de citas servidas desde un cubo en memoria o calculadas en la
+base de datos: nunca viaja el dataset completo de citas
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+from cache import CacheTTL
+from config import CACHE_CONFIG
+from cubo_citas import CuboCitas
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+DIAS_NOMBRE = {
+    0: "Domingo", 1: "Lunes", 2: "Martes", 3: "Miércoles",
+    4: "Jueves", 5: "Viernes", 6: "Sábado"
+}
+
+
+# =============================================================================
+# FORMATO DE RESULTADOS
+# =============================================================================
+# Compartido con PetStorePredictor.analizar_* para que el chatbot y la API
+# entreguen exactamente la misma estructura venga de SQL o de un DataFrame
+
+def formatear_tipos_mascota(conteos: List[Tuple[str, int]], total: int = None) -> Optional[Dict]:
+    """
+    Arma el análisis de tipo de mascota más común
+
+    Args:
+        conteos: Pares (tipo_mascota, cantidad_citas)
+        total: Total de citas para el porcentaje (default: suma de conteos)
+    """
+    if not conteos:
+        return None
+
+    if total is None:
+        total = sum(int(cantidad) for _, cantidad in conteos)
+
+    resultados = []
+    for tipo, cantidad in sorted(conteos, key=lambda x: x[1], reverse=True):
+        resultados.append({
+            "tipo": str(tipo),
+            "cantidad": int(cantidad),
+            "porcentaje": round(int(cantidad) / total * 100, 2) if total else 0.0
+        })
+
+    return {
+        "tipo_mas_comun": resultados[0]["tipo"],
+        "estadisticas": resultados
+    }
+
+
+def formatear_dias(conteos: List[Tuple[int, int]]) -> Optional[Dict]:
+    """
+    Arma el análisis de día con más atención
+
+    Args:
+        conteos: Pares (numero_dia 0=Domingo..6=Sábado, cantidad_citas)
+    """
+    if not conteos:
+        return None
+
+    resultados = []
+    for dia, cantidad in sorted(conteos, key=lambda x: x[0]):
+        resultados.append({
+            "dia": DIAS_NOMBRE.get(int(dia), str(dia)),
+            "numero_dia": int(dia),
+            "cantidad_citas": int(cantidad)
+        })
+
+    # Ordenar por cantidad
+    resultados_ordenados = sorted(resultados, key=lambda x: x['cantidad_citas'], reverse=True)
+
+    return {
+        "dia_con_mas_atencion": resultados_ordenados[0]["dia"],
+        "estadisticas": resultados_ordenados
+    }
+
+
+def formatear_horas(conteos: List[Tuple[int, int]]) -> Optional[Dict]:
+    """
+    Arma el análisis de hora pico (top 5)
+
+    Args:
+        conteos: Pares (hora 0-23, cantidad_citas)
+    """
+    if not conteos:
+        return None
+
+    resultados = []
+    for hora, cantidad in sorted(conteos, key=lambda x: x[0]):
+        resultados.append({
+            "hora": int(hora),
+            "cantidad_citas": int(cantidad)
+        })
+
+    # Ordenar por cantidad
+    resultados_ordenados = sorted(resultados, key=lambda x: x['cantidad_citas'], reverse=True)
+
+    return {
+        "hora_pico": resultados_ordenados[0]["hora"],
+        "estadisticas": resultados_ordenados[:5]  # Top 5
+    }
+
+
+# =============================================================================
+# CAPA DE ANALÍTICA
+# =============================================================================
+
+class AnaliticaCitas:
+    """
+    Capa única de analítica usada por los chatbots y la API
+
+    Por defecto responde desde el cubo pre-agregado en memoria (CuboCitas),
+    que se refresca solo con las citas nuevas. Si el cubo está desactivado
+    o no se pudo construir, cada análisis se resuelve con un GROUP BY en
+    PostgreSQL y el resultado se guarda en caché durante `ttl_segundos`.
+    Retorna None cuando no hay datos.
+    """
+
+    def __init__(self, db, ttl_segundos: float = None, usar_cubo: bool = None):
+        """
+        Args:
+            db: Instancia de PetStoreDatabase
+            ttl_segundos: Vigencia de los agregados en caché (modo SQL)
+            usar_cubo: Responder desde el cubo en memoria (default: CACHE_CONFIG)
+        """
+        self.db = db
+        if ttl_segundos is None:
+            ttl_segundos = CACHE_CONFIG['analitica_ttl']
+        if usar_cubo is None:
+            usar_cubo = CACHE_CONFIG['usar_cubo']
+        self.cache = CacheTTL('analitica_citas', ttl_segundos)
+        self.cubo = CuboCitas(db) if usar_cubo else None
+
+    def tipo_mascota_mas_comun(self) -> Optional[Dict]:
+        """Tipo de mascota con más citas y distribución completa"""
+        if self._cubo_disponible():
+            tipos, conteos, _ = self.cubo.marginal('tipo_mascota')
+            return formatear_tipos_mascota([
+                (tipo, citas) for tipo, citas in zip(tipos, conteos[:, 0])
+                if tipo is not None and citas > 0
+            ])
+        return self.cache.obtener('tipos_mascota', self._calcular_tipos_mascota)
+
+    def dia_mas_atencion(self) -> Optional[Dict]:
+        """Día de la semana con más citas y distribución semanal"""
+        if self._cubo_disponible():
+            dias, conteos, _ = self.cubo.marginal('dia_semana')
+            return formatear_dias([(dia, citas) for dia, citas in zip(dias, conteos[:, 0]) if citas > 0])
+        return self.cache.obtener('dias', self._calcular_dias)
+
+    def hora_pico(self) -> Optional[Dict]:
+        """Hora del día con más citas (top 5)"""
+        if self._cubo_disponible():
+            horas, conteos, _ = self.cubo.marginal('hora')
+            return formatear_horas([(hora, citas) for hora, citas in zip(horas, conteos[:, 0]) if citas > 0])
+        return self.cache.obtener('horas', self._calcular_horas)
+
+    def invalidar(self):
+        """Descarta los agregados en caché (p. ej. después de cargar datos)"""
+        self.cache.invalidar()
+        if self.cubo is not None:
+            self.cubo.invalidar()
+
+    # -------------------------------------------------------------------------
+    # Estadísticas detalladas (endpoints /api/analisis/*)
+    # -------------------------------------------------------------------------
+
+    def estadisticas_tipos_mascota(self) -> List[Dict]:
+        """Mascotas, citas, promedio y porcentaje por tipo (de mayor a menor)"""
+        if not self._cubo_disponible():
+            return self.cache.obtener('estadisticas_tipos', self._calcular_estadisticas_tipos)
+
+        etiquetas, conteos, _ = self.cubo.marginal('tipo_mascota')
+        citas_por_tipo = dict(zip(etiquetas, conteos[:, 0]))
+        total_mascotas = sum(self.cubo.mascotas_por_tipo.values())
+
+        tipos = []
+        for tipo, mascotas in sorted(self.cubo.mascotas_por_tipo.items(), key=lambda x: x[1], reverse=True):
+            citas = int(citas_por_tipo.get(tipo, 0))
+            tipos.append({
+                "tipo_mascota": tipo,
+                "total_mascotas": mascotas,
+                "total_citas": citas,
+                "promedio_citas": round(citas / mascotas, 2) if mascotas else 0.0,
+                "porcentaje": round(mascotas * 100.0 / total_mascotas, 2) if total_mascotas else 0.0
+            })
+        return tipos
+
+    def estadisticas_dias(self) -> List[Dict]:
+        """Citas, completadas, canceladas y tasa de asistencia por día (Domingo..Sábado)"""
+        if not self._cubo_disponible():
+            return self.cache.obtener('estadisticas_dias', self._calcular_estadisticas_dias)
+
+        etiquetas, conteos, _ = self.cubo.marginal('dia_semana')
+        dias = []
+        for dia, (citas, completadas, canceladas, _) in zip(etiquetas, conteos):
+            if citas == 0:
+                continue
+            dias.append({
+                "dia_semana": DIAS_NOMBRE[dia],
+                "numero_dia": dia,
+                "total_citas": int(citas),
+                "completadas": int(completadas),
+                "canceladas": int(canceladas),
+                "tasa_asistencia": round(float(completadas) * 100.0 / float(citas), 2)
+            })
+        return dias
+
+    def estadisticas_horas(self) -> List[Dict]:
+        """Citas, mascotas/clientes únicos y duración promedio por hora (0..23)"""
+        if not self._cubo_disponible():
+            return self.cache.obtener('estadisticas_horas', self._calcular_estadisticas_horas)
+
+        _, conteos, sumas = self.cubo.marginal('hora')
+        horas = []
+        for hora in range(24):
+            citas, _, _, con_duracion = conteos[hora]
+            if citas == 0:
+                continue
+            # Mascotas/clientes únicos no se pueden sumar: vienen de la última reconstrucción
+            mascotas, clientes = self.cubo.unicos_por_hora.get(hora, (0, 0))
+            horas.append({
+                "hora": hora,
+                "total_citas": int(citas),
+                "mascotas_unicas": mascotas,
+                "clientes_unicos": clientes,
+                "duracion_promedio": round(float(sumas[hora, 1]) / int(con_duracion), 2) if con_duracion else 0
+            })
+        return horas
+
+    def estadisticas_servicios(self) -> List[Dict]:
+        """Ranking de servicios por total de citas con tasa de asistencia"""
+        if not self._cubo_disponible():
+            return self.cache.obtener('estadisticas_servicios', self._calcular_estadisticas_servicios)
+
+        etiquetas, conteos, _ = self.cubo.marginal('servicio')
+        servicios = []
+        for service_id, (citas, completadas, canceladas, _) in zip(etiquetas, conteos):
+            if citas == 0:
+                continue
+            info = self.cubo.info_servicios.get(service_id, {"nombre": str(service_id), "precio": 0.0})
+            servicios.append({
+                "service_id": service_id,
+                "servicio": info["nombre"],
+                "precio": info["precio"],
+                "total_citas": int(citas),
+                "completadas": int(completadas),
+                "canceladas": int(canceladas),
+                "tasa_asistencia": round(float(completadas) * 100.0 / float(citas), 2)
+            })
+        return sorted(servicios, key=lambda x: x['total_citas'], reverse=True)
+
+    def _cubo_disponible(self) -> bool:
+        """Refresca el cubo si corresponde; False si hay que ir a SQL"""
+        if self.cubo is None:
+            return False
+        try:
+            self.cubo.asegurar_actualizado()
+        except Exception as e:
+            # Si el refresco falla se sigue respondiendo con el último cubo construido
+            logger.error(f"Error actualizando el cubo de citas: {e}")
+        return self.cubo.construido
+
+    # -------------------------------------------------------------------------
+    # Cálculo en base de datos
+    # -------------------------------------------------------------------------
+
+    def _calcular_tipos_mascota(self) -> Optional[Dict]:
+        df = self.db.contar_citas_por_tipo_mascota()
+        if df.empty:
+            return None
+        return formatear_tipos_mascota(list(zip(df['tipo_mascota'], df['total_citas'])))
+
+    def _calcular_dias(self) -> Optional[Dict]:
+        df = self.db.obtener_dias_con_mas_atencion()
+        if df.empty:
+            return None
+        return formatear_dias(list(zip(df['numero_dia'], df['total_citas'])))
+
+    def _calcular_horas(self) -> Optional[Dict]:
+        df = self.db.obtener_horas_pico()
+        if df.empty:
+            return None
+        return formatear_horas(list(zip(df['hora'], df['total_citas'])))
+
+    def _calcular_estadisticas_tipos(self) -> List[Dict]:
+        df = self.db.obtener_tipos_mascota_mas_comunes()
+        return [{
+            "tipo_mascota": row['tipo_mascota'],
+            "total_mascotas": int(row['total_mascotas']),
+            "total_citas": int(row['total_citas']),
+            "promedio_citas": float(row['promedio_citas_por_mascota']),
+            "porcentaje": float(row['porcentaje'])
+        } for _, row in df.iterrows()]
+
+    def _calcular_estadisticas_dias(self) -> List[Dict]:
+        df = self.db.obtener_dias_con_mas_atencion()
+        return [{
+            "dia_semana": row['dia_semana'],
+            "numero_dia": int(row['numero_dia']),
+            "total_citas": int(row['total_citas']),
+            "completadas": int(row['completadas']),
+            "canceladas": int(row['canceladas']),
+            "tasa_asistencia": float(row['tasa_asistencia'])
+        } for _, row in df.iterrows()]
+
+    def _calcular_estadisticas_horas(self) -> List[Dict]:
+        df = self.db.obtener_horas_pico()
+        return [{
+            "hora": int(row['hora']),
+            "total_citas": int(row['total_citas']),
+            "mascotas_unicas": int(row['mascotas_unicas']),
+            "clientes_unicos": int(row['clientes_unicos']),
+            "duracion_promedio": float(row['duracion_promedio']) if row['duracion_promedio'] else 0
+        } for _, row in df.iterrows()]
+
+    def _calcular_estadisticas_servicios(self) -> List[Dict]:
+        df = self.db.obtener_servicios_mas_utilizados()
+        return [{
+            "service_id": int(row['service_id']),
+            "servicio": row['servicio'],
+            "precio": float(row['precio']),
+            "total_citas": int(row['total_citas']),
+            "completadas": int(row['completadas']),
+            "canceladas": int(row['canceladas']),
+            "tasa_asistencia": float(row['tasa_asistencia'])
+        } for _, row in df.iterrows()]
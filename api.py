@@ -3,17 +3,29 @@ API REST PARA PET STORE CHATBOT
 Endpoints para integración con frontend React
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import logging
+import time
 
-from database import PetStoreDatabase
+from database import PetStoreDatabase, estadisticas_sentencias
 from predictor import PetStorePredictor
 from chatbot import PetStoreBot
 from transformer_chatbot import PetStoreBotTransformer
+from analitica import AnaliticaCitas
+from busqueda import IndiceBusqueda, normalizar
+from contadores import ContadorEstadisticas
+from exportacion import FORMATOS_EXPORTACION, parquet_disponible
+from cache import CacheTTL
+from trazas import resumen_latencias
+from metricas import MetricasHTTP, MonitorEventLoop, RUTA_DESCONOCIDA, TIPO_CONTENIDO, generar_exposicion
+from registro_chat import RegistroChat
+from config import EXPORTACION_CONFIG, REGISTRO_CHAT_CONFIG, SALUD_CONFIG
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -37,11 +49,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas de Prometheus (ver GET /metrics)
+metricas_http = MetricasHTTP()
+monitor_loop = MonitorEventLoop()
+# Log JSONL de los mensajes del chat para reentrenar (ver registro_chat.py)
+registro_chat = RegistroChat()
+
+
+def _plantilla_ruta(request: Request) -> str:
+    """Ruta declarada ("/api/mascotas/{pet_id}/historial"), no la URL concreta"""
+    ruta = request.scope.get('route')
+    if ruta is None:
+        for candidata in app.router.routes:
+            if candidata.matches(request.scope)[0] == Match.FULL:
+                ruta = candidata
+                break
+    return getattr(ruta, 'path', RUTA_DESCONOCIDA)
+
+
+@app.middleware("http")
+async def medir_peticiones(request: Request, call_next):
+    """Cuenta cada petición y mide su latencia (hasta el primer byte en las descargas en streaming)"""
+    metricas_http.iniciar()
+    inicio = time.perf_counter()
+    estado = 500
+    try:
+        response = await call_next(request)
+        estado = response.status_code
+        return response
+    finally:
+        metricas_http.observar(request.method, _plantilla_ruta(request), estado, time.perf_counter() - inicio)
+
+
+@app.on_event("startup")
+async def iniciar_monitor_loop():
+    monitor_loop.iniciar()
+    if REGISTRO_CHAT_CONFIG['activo']:
+        registro_chat.iniciar()
+
+
+@app.on_event("shutdown")
+async def detener_monitor_loop():
+    monitor_loop.detener()
+    registro_chat.detener()
+
+
 # Inicializar componentes
 db = PetStoreDatabase()
+analitica = AnaliticaCitas(db)
+busqueda = IndiceBusqueda(db)
+contador = ContadorEstadisticas(db)
 predictor = PetStorePredictor()
-bot = PetStoreBot()
-bot_transformer = PetStoreBotTransformer()
+# Los bots comparten la conexión, el cubo, el índice de búsqueda y el contador de la API
+componentes = dict(db=db, predictor=predictor, analitica=analitica, busqueda=busqueda, contador=contador)
+bot = PetStoreBot(**componentes)
+bot_transformer = PetStoreBotTransformer(**componentes)
 
 # Intentar cargar modelos entrenados
 try:
@@ -71,6 +133,7 @@ class ChatResponse(BaseModel):
     confianza: float
     timestamp: str
     modelo: Optional[str] = "Transformer"  # Indica qué modelo generó la respuesta
+    debug_timings: Optional[Dict[str, Any]] = None  # Tiempos por etapa (solo con ?debug_timings=true)
 
 class PrediccionTipoMascotaRequest(BaseModel):
     dia_semana: int  # 0=Domingo, 1=Lunes, ..., 6=Sábado
@@ -142,22 +205,80 @@ async def root():
         }
     }
 
+# Resultado del SELECT 1 reutilizado entre sondas (el balanceador consulta cada pocos segundos)
+cache_salud = CacheTTL('salud_db', SALUD_CONFIG['ping_ttl'])
+
+def _estado_modelos() -> Dict[str, bool]:
+    """Indica qué modelos están cargados en memoria"""
+    return {
+        "predictor": predictor.trained,
+        "chatbot_lstm": bot.chatbot_model is not None,
+        "transformer": bot_transformer.model is not None
+    }
+
+def _verificar_preparacion() -> Dict:
+    """Conexión a la base de datos (SELECT 1 en caché) y modelos requeridos"""
+    database_ok = cache_salud.obtener('ping', db.ping)
+    modelos = _estado_modelos()
+    faltantes = [nombre for nombre in SALUD_CONFIG['modelos_requeridos'] if not modelos.get(nombre)]
+    return {
+        "listo": database_ok and not faltantes,
+        "database": "connected" if database_ok else "disconnected",
+        "modelos": modelos,
+        "modelos_faltantes": faltantes
+    }
+
+@app.get("/livez", tags=["General"])
+async def liveness():
+    """
+    Sonda de vida: el proceso responde
+    
+    No consulta la base de datos ni los modelos.
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["General"])
+def readiness():
+    """
+    Sonda de preparación: la instancia puede atender tráfico
+    
+    Verifica la conexión con `SELECT 1` (en caché por unos segundos) y que
+    los modelos de SALUD_CONFIG['modelos_requeridos'] estén cargados.
+    Retorna 503 si no está lista. Nunca recorre tablas.
+    """
+    # Función síncrona: FastAPI la ejecuta en el pool de hilos y un ping lento no bloquea el event loop
+    estado = _verificar_preparacion()
+    estado["timestamp"] = datetime.now().isoformat()
+    if not estado["listo"]:
+        return JSONResponse(status_code=503, content=estado)
+    return estado
+
+@app.get("/metrics", tags=["General"], include_in_schema=False)
+def metricas():
+    """
+    Métricas en formato de texto de Prometheus: peticiones y latencia por ruta,
+    conexiones y sentencias de la base de datos, etapas del chatbot (incluida la
+    inferencia de los modelos), cachés y retraso del event loop
+    """
+    # Los bots usan la misma conexión que la API (ver `componentes`)
+    bases = {'api': db}
+    return PlainTextResponse(generar_exposicion(bases, metricas_http, monitor_loop), media_type=TIPO_CONTENIDO)
+
 @app.get("/api/health", tags=["General"])
-async def health_check():
+def health_check():
     """Verifica el estado de la API y conexiones"""
-    try:
-        # Obtengo las estadísticas generales desde la base de datos para verificar la conexión
-        stats = db.obtener_estadisticas_generales()
-        # Retorno un diccionario con el estado del sistema, confirmando que todo funciona correctamente
-        return {
-            "status": "ok",  # Indico que la API está funcionando sin problemas
-            "database": "connected",  # Confirmo que la conexión con la base de datos es exitosa
-            "modelos_entrenados": predictor.trained,  # Verifico si los modelos de IA están listos para hacer predicciones
-            "timestamp": datetime.now().isoformat()  # Registro la fecha y hora exacta de la verificación en formato ISO
-        }
-    except Exception as e:
-        # Si algo sale mal, lanzo una excepción HTTP 503 indicando que el servicio no está disponible
-        raise HTTPException(status_code=503, detail=f"Error: {str(e)}")
+    # Uso la misma verificación liviana que /readyz (sin conteos sobre las tablas)
+    estado = _verificar_preparacion()
+    if estado["database"] != "connected":
+        # Si la base de datos no responde, lanzo una excepción HTTP 503 indicando que el servicio no está disponible
+        raise HTTPException(status_code=503, detail="Error: la base de datos no responde")
+    # Retorno un diccionario con el estado del sistema
+    return {
+        "status": "ok",  # Indico que la API está funcionando sin problemas
+        "database": estado["database"],  # Confirmo que la conexión con la base de datos es exitosa
+        "modelos_entrenados": predictor.trained,  # Verifico si los modelos de IA están listos para hacer predicciones
+        "timestamp": datetime.now().isoformat()  # Registro la fecha y hora exacta de la verificación en formato ISO
+    }
 
 
 # =============================================================================
@@ -165,7 +286,7 @@ async def health_check():
 # =============================================================================
 
 @app.post("/api/chat", response_model=ChatResponse, tags=["Chatbot"])
-async def chat(request: ChatRequest, use_transformer: bool = True):
+async def chat(request: ChatRequest, use_transformer: bool = True, debug_timings: bool = False):
     """
     Envía un mensaje al chatbot y obtiene respuesta usando Red Neuronal Transformer
     
@@ -179,6 +300,7 @@ async def chat(request: ChatRequest, use_transformer: bool = True):
     - mensaje: El texto del usuario
     - usuario_id: Identificador del usuario (opcional)
     - use_transformer: True para usar Transformer, False para LSTM clásico (default: True)
+    - debug_timings: True para incluir los tiempos por etapa en la respuesta (default: False)
     
 
     **Ventajas del Transformer:**
@@ -188,6 +310,7 @@ async def chat(request: ChatRequest, use_transformer: bool = True):
     - Arquitectura estado del arte en NLP
     """
     try:
+        inicio = time.perf_counter()
         # Verifico qué modelo de IA voy a usar según el parámetro recibido
         if use_transformer:
             # Proceso el mensaje del usuario usando el modelo Transformer que es más avanzado y contextual
@@ -199,6 +322,15 @@ async def chat(request: ChatRequest, use_transformer: bool = True):
             resultado = bot.procesar_mensaje(request.mensaje)
             # Registro en el log la confianza del modelo LSTM en su respuesta
             logger.info(f"LSTM genero respuesta con {resultado['confianza']:.0%} confianza")
+        resultado.setdefault('modelo', 'Transformer' if use_transformer else 'LSTM')
+        
+        # Solo se encola: el hilo del registro serializa y escribe
+        registro_chat.registrar(request.mensaje, resultado['intencion'], resultado['confianza'],
+                                resultado['modelo'], (time.perf_counter() - inicio) * 1000, resultado['respuesta'])
+        
+        # Los tiempos por etapa ya quedaron en el log y en los histogramas; solo se devuelven si se piden
+        if not debug_timings:
+            resultado.pop('debug_timings', None)
         
         # Retorno la respuesta del chatbot encapsulada en el modelo ChatResponse para el frontend
         return ChatResponse(**resultado)
@@ -263,8 +395,8 @@ async def obtener_estadisticas():
     - Total de servicios disponibles
     """
     try:
-        # Consulto a la base de datos para obtener un resumen con las métricas generales del negocio
-        stats = db.obtener_estadisticas_generales()
+        # Obtengo el resumen con las métricas generales del negocio desde el servicio de contadores
+        stats = contador.obtener()
         # Transformo el diccionario de estadísticas en un objeto de respuesta validado por Pydantic
         return EstadisticasResponse(**stats)
     except Exception as e:
@@ -284,27 +416,15 @@ async def analisis_tipos_mascota():
     - Total de mascotas por tipo
     """
     try:
-        # Consulto la base de datos para obtener información agregada sobre tipos de mascotas (perro, gato, etc.)
-        df = db.obtener_tipos_mascota_mas_comunes()
+        # Obtengo las estadísticas por tipo de mascota (perro, gato, etc.) desde la capa de analítica,
+        # que responde desde el cubo pre-agregado en memoria sin recorrer las citas
+        tipos = analitica.estadisticas_tipos_mascota()
         
-        # Verifico si la consulta devolvió datos o está vacía
-        if df.empty:
+        # Verifico si hay datos disponibles
+        if not tipos:
             # Si no hay datos, retorno un mensaje de error informativo al usuario
             return {"error": "No hay datos disponibles"}
         
-        # Creo una lista vacía donde almacenaré cada tipo de mascota con sus estadísticas
-        tipos = []
-        # Itero sobre cada fila del DataFrame para transformar los datos a formato JSON
-        for _, row in df.iterrows():
-            # Agrego un diccionario con las estadísticas de cada tipo de mascota
-            tipos.append({
-                "tipo_mascota": row['tipo_mascota'],  # Nombre del tipo (perro, gato, conejo, etc.)
-                "total_mascotas": int(row['total_mascotas']),  # Cantidad total de mascotas de este tipo
-                "total_citas": int(row['total_citas']),  # Cantidad de citas agendadas por este tipo
-                "promedio_citas": float(row['promedio_citas_por_mascota']),  # Promedio de citas por mascota
-                "porcentaje": float(row['porcentaje'])  # Porcentaje que representa del total de mascotas
-            })
-        
         # Retorno el tipo más común (primera posición) junto con todas las estadísticas
         return {
             "tipo_mas_comun": tipos[0]['tipo_mascota'] if tipos else None,  # El tipo con más mascotas registradas
@@ -327,28 +447,14 @@ async def analisis_dias_atencion():
     - Tasa de asistencia por día
     """
     try:
-        # Consulto la base de datos para obtener las estadísticas de citas agrupadas por día de la semana
-        df = db.obtener_dias_con_mas_atencion()
+        # Obtengo las estadísticas de citas por día de la semana (desde el cubo de citas)
+        dias = analitica.estadisticas_dias()
         
-        # Verifico si hay información disponible en la consulta
-        if df.empty:
+        # Verifico si hay información disponible
+        if not dias:
             # Si no hay datos, informo al usuario que no hay información para mostrar
             return {"error": "No hay datos disponibles"}
         
-        # Creo una lista para almacenar las estadísticas de cada día
-        dias = []
-        # Recorro cada fila del DataFrame que representa un día de la semana
-        for _, row in df.iterrows():
-            # Agrego un diccionario con las métricas de cada día
-            dias.append({
-                "dia_semana": row['dia_semana'],  # Nombre del día (Lunes, Martes, etc.)
-                "numero_dia": int(row['numero_dia']),  # Número del día (0=Domingo, 1=Lunes, etc.)
-                "total_citas": int(row['total_citas']),  # Cantidad total de citas programadas ese día
-                "completadas": int(row['completadas']),  # Cuántas citas se realizaron exitosamente
-                "canceladas": int(row['canceladas']),  # Cuántas citas fueron canceladas
-                "tasa_asistencia": float(row['tasa_asistencia'])  # Porcentaje de asistencia real ese día
-            })
-        
         # Ordeno los días de mayor a menor según la cantidad de citas para identificar el más concurrido
         dias_ordenados = sorted(dias, key=lambda x: x['total_citas'], reverse=True)
         
@@ -374,27 +480,14 @@ async def analisis_horas_pico():
     - Mascotas y clientes únicos por hora
     """
     try:
-        # Consulto la base de datos para obtener la distribución de citas por hora del día
-        df = db.obtener_horas_pico()
+        # Obtengo la distribución de citas por hora del día (desde el cubo de citas)
+        horas = analitica.estadisticas_horas()
         
-        # Verifico si la consulta retornó información o está vacía
-        if df.empty:
+        # Verifico si hay información disponible
+        if not horas:
             # Si no hay datos disponibles, informo al usuario con un mensaje descriptivo
             return {"error": "No hay datos disponibles"}
         
-        # Creo una lista para almacenar las estadísticas de cada hora del día
-        horas = []
-        # Itero sobre cada fila del DataFrame que representa una hora específica
-        for _, row in df.iterrows():
-            # Agrego un diccionario con todas las métricas de esa hora
-            horas.append({
-                "hora": int(row['hora']),  # Hora del día en formato 24 horas (0-23)
-                "total_citas": int(row['total_citas']),  # Cantidad de citas agendadas en esta hora
-                "mascotas_unicas": int(row['mascotas_unicas']),  # Cuántas mascotas diferentes fueron atendidas
-                "clientes_unicos": int(row['clientes_unicos']),  # Cuántos clientes diferentes visitaron
-                "duracion_promedio": float(row['duracion_promedio']) if row['duracion_promedio'] else 0  # Tiempo promedio de duración de las citas en minutos
-            })
-        
         # Ordeno las horas de mayor a menor demanda para identificar las horas pico
         horas_ordenadas = sorted(horas, key=lambda x: x['total_citas'], reverse=True)
         
@@ -420,23 +513,11 @@ async def analisis_servicios():
     - Tasa de asistencia por servicio
     """
     try:
-        df = db.obtener_servicios_mas_utilizados()
+        servicios = analitica.estadisticas_servicios()
         
-        if df.empty:
+        if not servicios:
             return {"error": "No hay datos disponibles"}
         
-        servicios = []
-        for _, row in df.iterrows():
-            servicios.append({
-                "service_id": int(row['service_id']),
-                "servicio": row['servicio'],
-                "precio": float(row['precio']),
-                "total_citas": int(row['total_citas']),
-                "completadas": int(row['completadas']),
-                "canceladas": int(row['canceladas']),
-                "tasa_asistencia": float(row['tasa_asistencia'])
-            })
-        
         return {
             "servicio_mas_popular": servicios[0]['servicio'] if servicios else None,
             "estadisticas": servicios
@@ -543,12 +624,12 @@ async def obtener_tipo_mas_comun():
     - Estadísticas completas por tipo
     """
     try:
-        df = db.obtener_dataset_completo()
+        # Conteo agregado en SQL (no se descarga el dataset completo)
+        analisis = analitica.tipo_mascota_mas_comun()
         
-        if df.empty:
+        if analisis is None:
             raise HTTPException(status_code=404, detail="No hay datos disponibles")
         
-        analisis = predictor.analizar_tipo_mascota_mas_comun(df)
         return analisis
     except Exception as e:
         logger.error(f"Error en análisis: {e}")
@@ -564,12 +645,12 @@ async def obtener_dia_mas_atencion():
     - Estadísticas semanales
     """
     try:
-        df = db.obtener_dataset_completo()
+        # Conteo agregado en SQL (no se descarga el dataset completo)
+        analisis = analitica.dia_mas_atencion()
         
-        if df.empty:
+        if analisis is None:
             raise HTTPException(status_code=404, detail="No hay datos disponibles")
         
-        analisis = predictor.analizar_dia_mas_atencion(df)
         return analisis
     except Exception as e:
         logger.error(f"Error en análisis: {e}")
@@ -1013,18 +1094,20 @@ async def buscar_mascota(nombre: str):
     """
     Busca mascotas por nombre
     
+    Tolera errores de tipeo y tildes; los resultados vienen ordenados por
+    relevancia (exacta, prefijo, parcial y luego similitud).
+    
     **Parámetros:**
     - nombre: Nombre de la mascota (parcial o completo)
     
     **Ejemplo:** `/api/mascotas/buscar/Max`
     """
     try:
-        df = db.buscar_mascota_por_nombre(nombre)
+        mascotas = busqueda.buscar_mascotas(nombre)
         
-        if df.empty:
+        if not mascotas:
             return {"mascotas": [], "mensaje": f"No se encontró '{nombre}'"}
         
-        mascotas = df.to_dict('records')
         return {"mascotas": mascotas, "total": len(mascotas)}
     except Exception as e:
         logger.error(f"Error buscando mascota: {e}")
@@ -1099,12 +1182,15 @@ async def buscar_cliente(correo: str):
     - correo: Email del cliente
     """
     try:
-        df = db.buscar_cliente_por_correo(correo)
+        clientes = busqueda.buscar_clientes(correo)
         
-        if df.empty:
+        # Solo se retorna el cliente si el correo coincide exactamente (sin mayúsculas ni tildes)
+        exactos = [c for c in clientes if normalizar(c['correo'] or '') == normalizar(correo)]
+        if not exactos:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
         
-        cliente = df.to_dict('records')[0]
+        # Misma forma que antes del índice: sin la similitud interna de la búsqueda
+        cliente = {campo: valor for campo, valor in exactos[0].items() if campo != 'similitud'}
         return {"cliente": cliente}
     except Exception as e:
         logger.error(f"Error buscando cliente: {e}")
@@ -1222,39 +1308,83 @@ async def estado_modelos():
         "todos_listos": all(modelos_existentes.values())
     }
 
+@app.get("/api/admin/latencias", tags=["Administración"])
+async def latencias_chat():
+    """
+    Percentiles de latencia del chatbot por etapa
+    
+    **Retorna:**
+    - Por etapa (`lstm.intencion`, `transformer.modelo`, `lstm.db.citas_hoy`, ...):
+      muestras, promedio, p50, p95, p99 y máximo en milisegundos
+    """
+    return {
+        "etapas": resumen_latencias(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/admin/sentencias", tags=["Administración"])
+async def estadisticas_de_sentencias():
+    """
+    Uso de las sentencias preparadas desde que arrancó el servidor
+    
+    **Retorna:**
+    - Por sentencia: llamadas, errores, filas y tiempos (total, promedio, máximo)
+    - Ordenadas por tiempo total; `sin_registrar` agrupa las consultas ad hoc
+    """
+    sentencias = estadisticas_sentencias()
+    return {
+        "total": len(sentencias),
+        "sentencias": sentencias,
+        "timestamp": datetime.now().isoformat()
+    }
+
 
 # =============================================================================
 # EXPORTACIÓN DE DATOS
 # =============================================================================
 
 @app.get("/api/exportar/dataset", tags=["Exportación"])
-async def exportar_dataset():
+async def exportar_dataset(formato: str = "ndjson", tamano_lote: Optional[int] = None):
     """
     Exporta el dataset completo para análisis externo
     
+    Las filas se leen de un cursor del servidor por lotes y se envían a medida
+    que se generan, así la memoria no crece con la cantidad de citas.
+    
+    **Parámetros:**
+    - formato: `ndjson` (default), `csv` o `parquet` (requiere pyarrow)
+    - tamano_lote: Filas por lote (default: 5000)
+    
     **Retorna:**
-    - Dataset en formato JSON
-    - Incluye todas las citas con información de mascotas y servicios
+    - Archivo descargable con todas las citas e información de mascotas y servicios
     """
-    try:
-        df = db.obtener_dataset_completo()
-        
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No hay datos")
-        
-        # Convertir fechas a string
-        df['fecha_cita'] = df['fecha_cita'].astype(str)
-        
-        dataset = df.to_dict('records')
-        
-        return {
-            "dataset": dataset,
-            "total_registros": len(dataset),
-            "columnas": list(df.columns)
-        }
-    except Exception as e:
-        logger.error(f"Error exportando dataset: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400,
+                            detail=f"Formato no soportado: '{formato}'. Use: {', '.join(FORMATOS_EXPORTACION)}")
+    if formato == 'parquet' and not parquet_disponible():
+        raise HTTPException(status_code=400, detail="El formato parquet requiere instalar pyarrow")
+    
+    tamano_lote = tamano_lote or EXPORTACION_CONFIG['tamano_lote']
+    if not 1 <= tamano_lote <= EXPORTACION_CONFIG['tamano_lote_max']:
+        raise HTTPException(status_code=400,
+                            detail=f"tamano_lote debe estar entre 1 y {EXPORTACION_CONFIG['tamano_lote_max']}")
+    
+    generador, media_type, extension = FORMATOS_EXPORTACION[formato]
+    nombre_archivo = f"dataset_citas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    
+    def contenido():
+        try:
+            yield from generador(db.iterar_dataset_completo(tamano_lote))
+        except Exception as e:
+            # La respuesta ya empezó: solo se puede registrar el error y cortar el archivo
+            logger.error(f"Error exportando dataset: {e}")
+            raise
+    
+    return StreamingResponse(
+        contenido(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre_archivo}"'}
+    )
 
 
 # =============================================================================
@@ -0,0 +1,277 @@
+"""
+PRUEBA DE CARGA DE LA API
+Envía peticiones a los endpoints principales con concurrencia controlada y
+reporta latencia (p50/p95/p99), throughput, errores y memoria del servidor
+
+Uso:
+    # 1) Base sintética y API (ver benchmarks/sembrar_datos.py)
+    DB_NAME=petstore_bench python api.py &
+
+    # 2) Carga: 20 s por escenario en concurrencia 1, 4 y 16
+    python benchmarks/carga.py --pid $(pgrep -f "python api.py")
+    python benchmarks/carga.py --escenarios chat_lstm dashboard --concurrencia 8 --duracion 60
+
+    # 3) Comparar con una corrida anterior (otro commit)
+    python benchmarks/carga.py --comparar benchmarks/resultados/<anterior>.json
+
+Solo usa la biblioteca estándar. Los resultados se escriben como JSON en
+benchmarks/resultados/ con el commit actual en el nombre. La memoria (RSS) se
+lee de /proc/<pid>/status, así que requiere --pid y Linux.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import platform
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+RAIZ = Path(__file__).resolve().parent.parent
+DIRECTORIO_RESULTADOS = RAIZ / 'benchmarks' / 'resultados'
+
+MENSAJES_CHAT = [
+    "hola",
+    "¿cuántas citas hay hoy?",
+    "estadísticas del sistema",
+    "¿cuál es el tipo de mascota más común?",
+    "mi perro tiene fiebre y no quiere comer",
+    "¿qué vacunas necesita un cachorro?",
+    "busca la mascota Luna",
+    "¿cómo van las ventas del mes?",
+    "alertas de inventario",
+]
+
+# escenario -> peticiones (método, ruta, cuerpo JSON) que se envían en rotación
+ESCENARIOS: Dict[str, List[Tuple[str, str, Optional[dict]]]] = {
+    'chat_transformer': [('POST', '/api/chat?use_transformer=true', {'mensaje': m}) for m in MENSAJES_CHAT],
+    'chat_lstm': [('POST', '/api/chat?use_transformer=false', {'mensaje': m}) for m in MENSAJES_CHAT],
+    'dashboard': [('GET', '/api/metricas/dashboard', None)],
+    'clustering': [
+        ('GET', '/api/clustering/mascotas', None),
+        ('GET', '/api/clustering/clientes', None),
+        ('GET', '/api/clustering/servicios', None),
+    ],
+    'predicciones': [
+        ('POST', '/api/predicciones/tipo-mascota', {'dia_semana': 2, 'hora': 10, 'mes': 6, 'service_id': 1}),
+        ('POST', '/api/predicciones/asistencia',
+         {'dia_semana': 4, 'hora': 16, 'mes': 11, 'service_id': 3, 'edad_mascota': 5}),
+        ('GET', '/api/predicciones/tipo-mas-comun', None),
+        ('GET', '/api/predicciones/dia-mas-atencion', None),
+    ],
+}
+
+
+# =============================================================================
+# MEDICIONES
+# =============================================================================
+
+def percentil(ordenados: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def leer_rss_mb(pid: int) -> Dict[str, float]:
+    """VmRSS (actual) y VmHWM (pico) del proceso en MB"""
+    valores = {}
+    try:
+        with open(f'/proc/{pid}/status') as archivo:
+            for linea in archivo:
+                if linea.startswith(('VmRSS:', 'VmHWM:')):
+                    clave, kb = linea.split()[:2]
+                    valores[clave.rstrip(':')] = round(int(kb) / 1024, 1)
+    except OSError:
+        pass
+    return valores
+
+
+class MuestreadorMemoria:
+    """Lee el RSS del servidor cada `intervalo` segundos mientras corre un escenario"""
+
+    def __init__(self, pid: Optional[int], intervalo: float = 0.5):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.maximo = 0.0
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def __enter__(self):
+        if self.pid:
+            self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+            self._hilo.start()
+        return self
+
+    def __exit__(self, *args):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def _muestrear(self):
+        while not self._detener.is_set():
+            self.maximo = max(self.maximo, leer_rss_mb(self.pid).get('VmRSS', 0.0))
+            self._detener.wait(self.intervalo)
+
+
+def enviar(url_base: str, metodo: str, ruta: str, cuerpo: Optional[dict], timeout: float) -> Tuple[float, int]:
+    """Una petición; retorna (segundos, código HTTP o 0 si no hubo respuesta)"""
+    datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+    peticion = urllib.request.Request(url_base + ruta, data=datos, method=metodo,
+                                      headers={'Content-Type': 'application/json'})
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            respuesta.read()
+            estado = respuesta.status
+    except urllib.error.HTTPError as e:
+        estado = e.code
+    except Exception:
+        estado = 0
+    return time.perf_counter() - inicio, estado
+
+
+# =============================================================================
+# EJECUCIÓN DE ESCENARIOS
+# =============================================================================
+
+def ejecutar_escenario(url_base: str, escenario: str, concurrencia: int, duracion: float,
+                       calentamiento: float, timeout: float, pid: Optional[int]) -> Dict:
+    """Corre el escenario durante `duracion` segundos con `concurrencia` clientes"""
+    peticiones = ESCENARIOS[escenario]
+    rotacion = itertools.cycle(peticiones)
+    lock = threading.Lock()
+
+    def siguiente():
+        with lock:
+            return next(rotacion)
+
+    # Calentamiento (cachés, cubo, índices en memoria): no se mide
+    fin_calentamiento = time.monotonic() + calentamiento
+    while time.monotonic() < fin_calentamiento:
+        enviar(url_base, *siguiente(), timeout)
+
+    latencias: List[float] = []
+    errores: Dict[str, int] = {}
+
+    def cliente(fin: float):
+        propias, propios_errores = [], {}
+        while time.monotonic() < fin:
+            segundos, estado = enviar(url_base, *siguiente(), timeout)
+            if 200 <= estado < 300:
+                propias.append(segundos)
+            else:
+                propios_errores[str(estado)] = propios_errores.get(str(estado), 0) + 1
+        with lock:
+            latencias.extend(propias)
+            for estado, total in propios_errores.items():
+                errores[estado] = errores.get(estado, 0) + total
+
+    with MuestreadorMemoria(pid) as memoria:
+        inicio = time.perf_counter()
+        fin = time.monotonic() + duracion
+        with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+            for _ in range(concurrencia):
+                ejecutor.submit(cliente, fin)
+        transcurrido = time.perf_counter() - inicio
+
+    latencias.sort()
+    rss = leer_rss_mb(pid) if pid else {}
+    resultado = {
+        'escenario': escenario,
+        'concurrencia': concurrencia,
+        'duracion_s': round(transcurrido, 2),
+        'peticiones_ok': len(latencias),
+        'errores': errores,
+        'throughput_rps': round(len(latencias) / transcurrido, 2) if transcurrido else 0.0,
+        'promedio_ms': round(sum(latencias) / len(latencias) * 1000, 2) if latencias else 0.0,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        'max_ms': round(latencias[-1] * 1000, 2) if latencias else 0.0,
+        'rss_mb_max': memoria.maximo or None,
+        'rss_mb_final': rss.get('VmRSS'),
+        'rss_mb_pico_proceso': rss.get('VmHWM'),
+    }
+    logger.info(f" {escenario:<17} c={concurrencia:<3} {resultado['throughput_rps']:>8.1f} req/s  "
+                f"p50={resultado['p50_ms']:.1f}ms p95={resultado['p95_ms']:.1f}ms p99={resultado['p99_ms']:.1f}ms  "
+                f"errores={sum(errores.values())}")
+    return resultado
+
+
+def commit_actual() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'desconocido'
+
+
+def comparar(actual: Dict, anterior_ruta: Path):
+    """Imprime la variación de p95 y throughput respecto a un resultado anterior"""
+    anterior = json.loads(anterior_ruta.read_text(encoding='utf-8'))
+    previos = {(r['escenario'], r['concurrencia']): r for r in anterior['resultados']}
+    print(f"\n  Comparación {anterior['commit']} -> {actual['commit']}")
+    print(f"  {'escenario':<17} {'c':>3} {'p95 antes':>10} {'p95 ahora':>10} {'Δp95':>8} {'rps antes':>10} {'rps ahora':>10}")
+    for r in actual['resultados']:
+        previo = previos.get((r['escenario'], r['concurrencia']))
+        if previo is None:
+            continue
+        delta = (r['p95_ms'] - previo['p95_ms']) / previo['p95_ms'] * 100 if previo['p95_ms'] else 0.0
+        print(f"  {r['escenario']:<17} {r['concurrencia']:>3} {previo['p95_ms']:>10.1f} {r['p95_ms']:>10.1f} "
+              f"{delta:>+7.1f}% {previo['throughput_rps']:>10.1f} {r['throughput_rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API del Pet Store")
+    parser.add_argument('--url', default='http://localhost:8000', help="URL base de la API")
+    parser.add_argument('--escenarios', nargs='+', choices=sorted(ESCENARIOS), default=sorted(ESCENARIOS))
+    parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 4, 16],
+                        help="Clientes simultáneos (se corre cada escenario con cada valor)")
+    parser.add_argument('--duracion', type=float, default=20, help="Segundos medidos por escenario")
+    parser.add_argument('--calentamiento', type=float, default=3, help="Segundos sin medir antes de cada escenario")
+    parser.add_argument('--timeout', type=float, default=60, help="Timeout por petición en segundos")
+    parser.add_argument('--pid', type=int, help="PID del servidor para medir RSS")
+    parser.add_argument('--etiqueta', default='', help="Texto libre guardado en el resultado (p. ej. '1M citas')")
+    parser.add_argument('--comparar', type=Path, help="Resultado JSON anterior para comparar")
+    args = parser.parse_args()
+
+    commit = commit_actual()
+    resultados = [
+        ejecutar_escenario(args.url, escenario, concurrencia, args.duracion, args.calentamiento,
+                           args.timeout, args.pid)
+        for escenario in args.escenarios
+        for concurrencia in args.concurrencia
+    ]
+
+    salida = {
+        'commit': commit,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'etiqueta': args.etiqueta,
+        'url': args.url,
+        'parametros': {'duracion_s': args.duracion, 'calentamiento_s': args.calentamiento,
+                       'concurrencia': args.concurrencia},
+        'sistema': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                    'procesador': platform.processor()},
+        'resultados': resultados,
+    }
+    DIRECTORIO_RESULTADOS.mkdir(parents=True, exist_ok=True)
+    ruta = DIRECTORIO_RESULTADOS / f"{commit}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    ruta.write_text(json.dumps(salida, indent=2, ensure_ascii=False), encoding='utf-8')
+    logger.info(f" Resultados guardados en {ruta}")
+
+    if args.comparar:
+        comparar(salida, args.comparar)
@@ -0,0 +1,120 @@
+-- ============================================================================
+-- ESQUEMA MÍNIMO PARA BENCHMARKS
+-- Pet Store - Solo las tablas y columnas que leen database.py, cubo_citas.py,
+-- busqueda.py y contadores.py
+-- ============================================================================
+-- ¡Borra las tablas! Ejecutar únicamente sobre la base de datos de benchmarks
+-- (benchmarks/sembrar_datos.py lo aplica y se niega a usar la base 'petstore').
+-- ============================================================================
+
+DROP TABLE IF EXISTS detalle_venta, venta, producto, vaccination, pet_medical_history,
+    appointment, service, pet_owner, pet, client, "user" CASCADE;
+
+CREATE TABLE "user" (
+    user_id SERIAL PRIMARY KEY,
+    name VARCHAR(200) NOT NULL
+);
+
+CREATE TABLE client (
+    client_id SERIAL PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    correo VARCHAR(200),
+    telefono VARCHAR(20),
+    direccion VARCHAR(200),
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE pet (
+    pet_id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    tipo VARCHAR(50),
+    raza VARCHAR(100),
+    edad INTEGER,
+    sexo VARCHAR(10),
+    color VARCHAR(50),
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE pet_owner (
+    pet_id INTEGER REFERENCES pet(pet_id),
+    client_id INTEGER REFERENCES client(client_id),
+    PRIMARY KEY (pet_id, client_id)
+);
+
+CREATE TABLE service (
+    service_id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    precio DECIMAL(10, 2) NOT NULL,
+    duracion_minutos INTEGER,
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE appointment (
+    appointment_id SERIAL PRIMARY KEY,
+    pet_id INTEGER REFERENCES pet(pet_id),
+    client_id INTEGER REFERENCES client(client_id),
+    service_id INTEGER REFERENCES service(service_id),
+    veterinarian_id INTEGER REFERENCES "user"(user_id),
+    fecha_hora TIMESTAMP NOT NULL,
+    estado VARCHAR(50),
+    observaciones TEXT,
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE pet_medical_history (
+    history_id SERIAL PRIMARY KEY,
+    pet_id INTEGER REFERENCES pet(pet_id),
+    service_id INTEGER REFERENCES service(service_id),
+    veterinarian_id INTEGER REFERENCES "user"(user_id),
+    fecha_atencion TIMESTAMP,
+    tipo_procedimiento VARCHAR(100),
+    diagnostico TEXT,
+    tratamiento TEXT,
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE vaccination (
+    vaccination_id SERIAL PRIMARY KEY,
+    pet_id INTEGER REFERENCES pet(pet_id),
+    veterinarian_id INTEGER REFERENCES "user"(user_id),
+    vaccine_name VARCHAR(100),
+    application_date DATE,
+    next_dose_date DATE,
+    dose_number INTEGER,
+    estado VARCHAR(50),
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE producto (
+    producto_id SERIAL PRIMARY KEY,
+    nombre VARCHAR(200) NOT NULL,
+    categoria VARCHAR(100),
+    precio_compra DECIMAL(10, 2) NOT NULL,
+    precio_venta DECIMAL(10, 2) NOT NULL,
+    stock_actual INTEGER NOT NULL DEFAULT 0,
+    stock_minimo INTEGER NOT NULL DEFAULT 10,
+    stock_maximo INTEGER NOT NULL DEFAULT 100,
+    fecha_vencimiento DATE,
+    proveedor VARCHAR(200),
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE venta (
+    venta_id SERIAL PRIMARY KEY,
+    client_id INTEGER REFERENCES client(client_id),
+    fecha_venta TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    subtotal DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    total DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    activo BOOLEAN DEFAULT true
+);
+
+CREATE TABLE detalle_venta (
+    detalle_id SERIAL PRIMARY KEY,
+    venta_id INTEGER REFERENCES venta(venta_id) ON DELETE CASCADE,
+    producto_id INTEGER REFERENCES producto(producto_id),
+    cantidad INTEGER NOT NULL,
+    precio_unitario DECIMAL(10, 2) NOT NULL,
+    subtotal DECIMAL(10, 2) NOT NULL,
+    activo BOOLEAN DEFAULT true
+);
@@ -0,0 +1,488 @@
+"""
+MICROBENCHMARKS DE LAS RUTAS CALIENTES DE ML
+Mide por separado las funciones que dominan la latencia del chat y de la
+analítica, con datos sintéticos y sin conexión a la base de datos
+
+Uso:
+    python benchmarks/micro_benchmarks.py
+    python benchmarks/micro_benchmarks.py --filtro clustering --tamanos 1000 10000
+    python benchmarks/micro_benchmarks.py --filtro generate texto_a_indices --repeticiones 10
+
+    # Comparar con una corrida anterior (otro commit)
+    python benchmarks/micro_benchmarks.py --comparar benchmarks/resultados/micro_<anterior>.json
+
+Cada caso se calienta una vez y luego se ejecuta en rondas de N llamadas (N
+crece hasta que la ronda dura al menos --tiempo-minimo); se reportan mínimo,
+mediana, media y desviación por llamada, como pytest-benchmark. Los modelos se
+construyen con pesos aleatorios y la arquitectura de producción: miden costo,
+no calidad. Los bots se crean sin __init__ para no abrir la base de datos.
+
+Requisitos por benchmark (los que no los tengan instalados se reportan como
+omitidos):
+    intencion_destilada                       numpy (intenciones)
+    texto_a_indices                           numpy (normalizacion, tokenizador_bpe)
+    TransformerChatbot.generate               torch (modelo_transformer)
+    clustering_*                              scikit-learn, scipy, psycopg2
+    predecir_tipo_mascota/asistencia          scikit-learn, scipy, psycopg2, tensorflow
+    normalizar_texto, detectar_intencion      scikit-learn, scipy, psycopg2
+    predecir_intencion_neuronal               scikit-learn, scipy, psycopg2, tensorflow
+psycopg2 sólo tiene que estar instalado: chatbot.py y predictor.py importan
+database (predictor a través de analitica), pero no se abre ninguna conexión.
+TensorFlow se importa únicamente donde se construye un modelo Keras.
+
+El clustering jerárquico necesita memoria O(n²): los tamaños que no caben en
+la memoria disponible se omiten en vez de arriesgar que el sistema mate el
+proceso.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import timeit
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / 'benchmarks'))
+from carga import DIRECTORIO_RESULTADOS, MENSAJES_CHAT, commit_actual  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+TIPOS_MASCOTA = ['Perro', 'Gato', 'Conejo', 'Ave', 'Hámster', 'Tortuga']
+PESOS_TIPO = [0.48, 0.32, 0.07, 0.06, 0.04, 0.03]
+SERVICIOS = [
+    ('Consulta general', 45000), ('Vacunación', 60000), ('Baño y peluquería', 55000),
+    ('Desparasitación', 35000), ('Cirugía menor', 350000), ('Odontología', 150000),
+    ('Radiografía', 120000), ('Laboratorio clínico', 90000), ('Hospitalización', 250000),
+    ('Esterilización', 300000), ('Control postoperatorio', 40000), ('Microchip', 70000),
+]
+INTENCIONES = ['saludo', 'despedida', 'sintomas', 'vacunas', 'alimentacion', 'emergencia',
+               'citas', 'estadisticas', 'ventas', 'alertas', 'mascotas', 'servicios']
+MENSAJE_LARGO = " ".join(MENSAJES_CHAT * 4)
+
+# Tokens a generar en el benchmark de TransformerChatbot.generate (80 es el que usa el chat)
+LONGITUDES_GENERACION = [16, 40, 80]
+
+
+# =============================================================================
+# DATOS SINTÉTICOS
+# =============================================================================
+
+def dataset_sintetico(n: int, semilla: int = 42) -> pd.DataFrame:
+    """n filas con las columnas de QUERY_DATASET_COMPLETO que usan los modelos y el clustering"""
+    rng = np.random.default_rng(semilla)
+    servicio = rng.integers(0, len(SERVICIOS), n)
+    fechas = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 730 * 24, n), unit='h')
+    return pd.DataFrame({
+        'appointment_id': np.arange(1, n + 1),
+        'pet_id': rng.integers(1, max(2, n // 3), n),
+        'client_id': rng.integers(1, max(2, n // 5), n),
+        'service_id': servicio + 1,
+        'mes': fechas.month,
+        'dia_semana': (fechas.dayofweek + 1) % 7,
+        'hora': rng.integers(8, 19, n),
+        'servicio': [SERVICIOS[i][0] for i in servicio],
+        'precio_servicio': np.array([SERVICIOS[i][1] for i in servicio], dtype=float),
+        'tipo_mascota': rng.choice(TIPOS_MASCOTA, n, p=PESOS_TIPO),
+        'edad_mascota': rng.integers(0, 16, n),
+        'asistio': (rng.random(n) < 0.7).astype(int),
+    })
+
+
+def corpus_sintetico(frases: int = 2000, semilla: int = 42) -> List[str]:
+    """Frases armadas con las palabras de los mensajes de prueba (para tokenizers y vocabularios)"""
+    rng = np.random.default_rng(semilla)
+    palabras = " ".join(MENSAJES_CHAT).lower().replace('¿', '').replace('?', '').split()
+    palabras += [f"palabra{i}" for i in range(3000)]
+    return [" ".join(rng.choice(palabras, rng.integers(4, 20))) for _ in range(frases)]
+
+
+def memoria_disponible() -> Optional[int]:
+    """MemAvailable de /proc/meminfo en bytes (None fuera de Linux)"""
+    try:
+        with open('/proc/meminfo') as archivo:
+            for linea in archivo:
+                if linea.startswith('MemAvailable:'):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def cabe_matriz_distancias(filas: int) -> bool:
+    """Si la matriz de distancias condensada (float64) ocupa menos de la mitad de la memoria libre"""
+    disponible = memoria_disponible()
+    return disponible is None or 8 * filas * (filas - 1) / 2 < disponible / 2
+
+
+# =============================================================================
+# REGISTRO Y MEDICIÓN
+# =============================================================================
+
+class Caso:
+    """Una función a medir (sin argumentos) o el motivo por el que se omite"""
+
+    def __init__(self, nombre: str, funcion: Optional[Callable[[], object]] = None, omitido: str = ''):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.omitido = omitido
+
+
+# nombre -> generador de casos; lo que se prepara antes de cada yield no se mide
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Iterator[Caso]]] = {}
+
+
+def benchmark(nombre: str) -> Callable:
+    def registrar(fabrica: Callable[[argparse.Namespace], Iterator[Caso]]):
+        BENCHMARKS[nombre] = fabrica
+        return fabrica
+    return registrar
+
+
+def medir(funcion: Callable[[], object], repeticiones: int, tiempo_minimo: float) -> Dict:
+    """Estadísticas por llamada en microsegundos"""
+    temporizador = timeit.Timer(funcion)
+    llamadas = 1
+    while True:
+        duracion = temporizador.timeit(llamadas)
+        if duracion >= tiempo_minimo or llamadas >= 1_000_000:
+            break
+        llamadas = min(1_000_000, llamadas * max(2, int(tiempo_minimo / max(duracion, 1e-9))))
+
+    tiempos = [temporizador.timeit(llamadas) / llamadas * 1e6 for _ in range(repeticiones)]
+    media = statistics.fmean(tiempos)
+    return {
+        'rondas': repeticiones,
+        'llamadas_por_ronda': llamadas,
+        'min_us': round(min(tiempos), 3),
+        'mediana_us': round(statistics.median(tiempos), 3),
+        'media_us': round(media, 3),
+        'desviacion_us': round(statistics.stdev(tiempos), 3) if len(tiempos) > 1 else 0.0,
+        'max_us': round(max(tiempos), 3),
+        'ops_s': round(1e6 / media, 2) if media else 0.0,
+    }
+
+
+def ejecutar(nombre: str, args: argparse.Namespace) -> List[Dict]:
+    resultados = []
+    try:
+        for caso in BENCHMARKS[nombre](args):
+            resultado = {'benchmark': nombre, 'caso': caso.nombre}
+            if caso.omitido:
+                resultado['omitido'] = caso.omitido
+                logger.info(f" {nombre:<28} {caso.nombre:<18} omitido: {caso.omitido}")
+                resultados.append(resultado)
+                continue
+            # Calentamiento (cachés, grafos de TF, asignaciones iniciales); los métodos
+            # de predictor.py atrapan sus excepciones y devuelven {"error": ...}
+            salida = caso.funcion()
+            if isinstance(salida, dict) and 'error' in salida:
+                resultado['error'] = salida['error']
+                logger.error(f" {nombre:<28} {caso.nombre:<18} error: {salida['error']}")
+            else:
+                resultado.update(medir(caso.funcion, args.repeticiones, args.tiempo_minimo))
+                logger.info(f" {nombre:<28} {caso.nombre:<18} mediana={resultado['mediana_us']:>14,.1f} us  "
+                            f"min={resultado['min_us']:>14,.1f} us  ±{resultado['desviacion_us']:,.1f}")
+            resultados.append(resultado)
+    except ImportError as e:
+        logger.warning(f" {nombre:<28} omitido: falta la dependencia ({e})")
+        resultados.append({'benchmark': nombre, 'caso': '*', 'omitido': f"dependencia no instalada: {e}"})
+    return resultados
+
+
+# =============================================================================
+# CHATBOT LSTM (chatbot.py)
+# =============================================================================
+
+def bot_lstm():
+    """PetStoreBot sin __init__ (no abre la base de datos ni carga modelos de disco)"""
+    from chatbot import PetStoreBot
+    return PetStoreBot.__new__(PetStoreBot)
+
+
+@benchmark('normalizar_texto')
+def bench_normalizar_texto(args) -> Iterator[Caso]:
+    bot = bot_lstm()
+    yield Caso('corto', lambda: bot.normalizar_texto("¿Cuántas citas hay hoy?"))
+    yield Caso('largo', lambda: bot.normalizar_texto(MENSAJE_LARGO))
+
+
+@benchmark('detectar_intencion')
+def bench_detectar_intencion(args) -> Iterator[Caso]:
+    bot = bot_lstm()
+    # 'saludo' sale en la primera regla; el mensaje sin coincidencias recorre todas
+    yield Caso('primera_regla', lambda: bot.detectar_intencion("hola, buenos días"))
+    yield Caso('sin_coincidencia', lambda: bot.detectar_intencion("xyz qwerty asdf zxcv"))
+    yield Caso('mensajes_chat', lambda: [bot.detectar_intencion(m) for m in MENSAJES_CHAT])
+
+
+@benchmark('predecir_intencion_neuronal')
+def bench_predecir_intencion_neuronal(args) -> Iterator[Caso]:
+    from sklearn.preprocessing import LabelEncoder
+    from tensorflow import keras
+    from tensorflow.keras.layers import LSTM, Bidirectional, Dense, Dropout, Embedding
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    from config import MODEL_CONFIG
+
+    bot = bot_lstm()
+    bot.max_len = MODEL_CONFIG['max_len']
+    bot.confidence_threshold = MODEL_CONFIG['confidence_threshold']
+    bot.tokenizer = Tokenizer(num_words=MODEL_CONFIG['max_words'], oov_token="<OOV>")
+    bot.tokenizer.fit_on_texts(corpus_sintetico())
+    bot.label_encoder = LabelEncoder().fit(INTENCIONES)
+    # Misma arquitectura que entrenar_chatbot_veterinario.py
+    bot.chatbot_model = keras.Sequential([
+        keras.Input(shape=(bot.max_len,)),
+        Embedding(MODEL_CONFIG['max_words'], MODEL_CONFIG['embedding_dim']),
+        Bidirectional(LSTM(MODEL_CONFIG['lstm_units'], return_sequences=True)),
+        Dropout(0.5),
+        Bidirectional(LSTM(32)),
+        Dropout(0.5),
+        Dense(64, activation='relu'),
+        Dropout(0.3),
+        Dense(32, activation='relu'),
+        Dense(len(INTENCIONES), activation='softmax'),
+    ])
+    yield Caso('corto', lambda: bot.predecir_intencion_neuronal("¿Cuántas citas hay hoy?"))
+    yield Caso('largo', lambda: bot.predecir_intencion_neuronal(MENSAJE_LARGO))
+
+
+@benchmark('intencion_destilada')
+def bench_intencion_destilada(args) -> Iterator[Caso]:
+    from config import INTENCIONES_CONFIG
+    from intenciones import ClasificadorIntenciones
+
+    # Tabla del tamaño de producción con pesos aleatorios (el router por defecto del chat)
+    rng = np.random.default_rng(42)
+    dimension = INTENCIONES_CONFIG['dimension_hash']
+    clasificador = ClasificadorIntenciones(
+        INTENCIONES, rng.normal(0, 0.1, (dimension, len(INTENCIONES))).astype(np.float32),
+        np.zeros(len(INTENCIONES), dtype=np.float32), dimension
+    )
+    yield Caso('corto', lambda: clasificador.predecir("¿Cuántas citas hay hoy?"))
+    yield Caso('largo', lambda: clasificador.predecir(MENSAJE_LARGO))
+    yield Caso('mensajes_chat', lambda: [clasificador.predecir(m) for m in MENSAJES_CHAT])
+
+
+# =============================================================================
+# CHATBOT TRANSFORMER (modelo_transformer.py, tokenizador_bpe.py)
+# =============================================================================
+
+ESPECIALES_TRANSFORMER = ['<PAD>', '<SOS>', '<EOS>', '<UNK>']
+
+
+class VocabularioSintetico:
+    """
+    Lo que usa PetStoreBotTransformer para tokenizar (construir_vocabulario,
+    tokens y textos_a_indices) armado directo sobre normalizacion y
+    tokenizador_bpe, sin importar el bot (que arrastra la base de datos)
+    """
+
+    def __init__(self, tipo: str = 'palabras', max_len: int = 128):
+        from config_transformer import TRANSFORMER_CONFIG
+        from normalizacion import NORMALIZADOR_TRANSFORMER
+        from tokenizador_bpe import TokenizadorBPE
+
+        corpus = corpus_sintetico()
+        if tipo == 'bpe':
+            self.tokenizador = TokenizadorBPE.entrenar(corpus, TRANSFORMER_CONFIG['bpe_vocab_size'],
+                                                       ESPECIALES_TRANSFORMER)
+            vocab = self.tokenizador.vocab
+            self.tokens = self.tokenizador.tokens
+        else:
+            frecuencias = Counter(t for texto in corpus for t in NORMALIZADOR_TRANSFORMER.tokens(texto))
+            vocab = ESPECIALES_TRANSFORMER + [palabra for palabra, _ in
+                                              frecuencias.most_common(TRANSFORMER_CONFIG['vocab_size'])]
+            self.tokens = NORMALIZADOR_TRANSFORMER.tokens
+        self.word2idx = {token: indice for indice, token in enumerate(vocab)}
+        self.vocab_size = len(vocab)
+        self.max_len = max_len
+
+    def textos_a_indices(self, textos: List[str], salida: Optional[np.ndarray] = None) -> np.ndarray:
+        from normalizacion import matriz_indices
+        return matriz_indices([self.tokens(texto) for texto in textos], self.word2idx, self.max_len,
+                              desconocido=3, inicio=1, fin=2, relleno=0, salida=salida)
+
+    def texto_a_indices(self, texto: str) -> np.ndarray:
+        return self.textos_a_indices([texto])[0]
+
+
+@benchmark('texto_a_indices')
+def bench_texto_a_indices(args) -> Iterator[Caso]:
+    vocabulario = VocabularioSintetico()
+    yield Caso('corto', lambda: vocabulario.texto_a_indices("¿Cuántas citas hay hoy?"))
+    yield Caso('largo', lambda: vocabulario.texto_a_indices(MENSAJE_LARGO))
+    # API por lotes sobre una matriz preasignada (la que usa el entrenamiento)
+    lote = corpus_sintetico(64)
+    salida = np.empty((len(lote), vocabulario.max_len), dtype=np.int64)
+    yield Caso('lote_64', lambda: vocabulario.textos_a_indices(lote, salida=salida))
+    # Subpalabras (tokenizador_bpe.py): piezas de palabras ya vistas salen de la caché
+    vocabulario_bpe = VocabularioSintetico('bpe')
+    yield Caso('bpe_corto', lambda: vocabulario_bpe.texto_a_indices("¿Cuántas citas hay hoy?"))
+    yield Caso('bpe_largo', lambda: vocabulario_bpe.texto_a_indices(MENSAJE_LARGO))
+    yield Caso('bpe_lote_64', lambda: vocabulario_bpe.textos_a_indices(lote, salida=salida))
+
+
+@benchmark('TransformerChatbot.generate')
+def bench_generate(args) -> Iterator[Caso]:
+    import torch
+    from config_transformer import TRANSFORMER_CONFIG, TRANSFORMER_PRESETS
+    from modelo_transformer import TransformerChatbot
+
+    vocabulario = VocabularioSintetico(TRANSFORMER_CONFIG['tokenizer'], TRANSFORMER_CONFIG['max_len'])
+    eos = vocabulario.word2idx['<EOS>']
+
+    def crear(nombre: str) -> TransformerChatbot:
+        """Modelo del preset `nombre` con el resto de la configuración de producción, sin <EOS> posible"""
+        preset = TRANSFORMER_PRESETS[nombre]
+        torch.manual_seed(args.semilla)
+        modelo = TransformerChatbot(vocabulario.vocab_size, preset['d_model'], preset['num_heads'],
+                                    preset['num_layers'], preset['d_ff'], vocabulario.max_len, preset['dropout'],
+                                    causal=TRANSFORMER_CONFIG['objetivo'] == 'causal',
+                                    tie_embeddings=TRANSFORMER_CONFIG['tie_embeddings'])
+        # Cada caso genera exactamente los tokens pedidos
+        with torch.no_grad():
+            modelo.fc_out.bias[eos] = -1e9
+        return modelo
+
+    # Prompt sin padding: prompt + tokens generados debe caber en la codificación posicional (max_len)
+    prompt = torch.from_numpy(vocabulario.texto_a_indices("¿Cuántas citas hay hoy?"))
+    prompt = prompt[prompt != vocabulario.word2idx['<PAD>']].unsqueeze(0)
+    # Preset configurado (el que usa el chat), con cada longitud
+    configurado = TRANSFORMER_CONFIG['model_size']
+    modelo = crear(configurado)
+    for longitud in LONGITUDES_GENERACION:
+        caso = f'{configurado}_{longitud}_tokens'
+        if prompt.size(1) + longitud > vocabulario.max_len:
+            yield Caso(caso, omitido=f"prompt + {longitud} tokens excede max_len={vocabulario.max_len}")
+            continue
+        yield Caso(caso, lambda longitud=longitud: modelo.generate(prompt, max_length=longitud,
+                                                                   temperature=0.7, top_k=40))
+    # Los demás presets (tiny, small, base), 40 tokens
+    for nombre in TRANSFORMER_PRESETS:
+        if nombre != configurado:
+            otro = crear(nombre)
+            yield Caso(f'{nombre}_40_tokens',
+                       lambda otro=otro: otro.generate(prompt, max_length=40, temperature=0.7, top_k=40))
+
+
+# =============================================================================
+# MODELOS PREDICTIVOS Y CLUSTERING (predictor.py)
+# =============================================================================
+
+@benchmark('predecir_tipo_mascota')
+def bench_predecir_tipo_mascota(args) -> Iterator[Caso]:
+    from predictor import PetStorePredictor
+
+    predictor = PetStorePredictor()
+    df = dataset_sintetico(5000, args.semilla)
+    predictor.scaler.fit(df[['dia_semana', 'hora', 'mes', 'service_id']].values)
+    predictor.label_encoder_tipo.fit(TIPOS_MASCOTA)
+    predictor.model_tipo_mascota = predictor.construir_modelo_tipo_mascota(4, len(TIPOS_MASCOTA))
+    yield Caso('una_prediccion', lambda: predictor.predecir_tipo_mascota(2, 10, 6, 1))
+
+
+@benchmark('predecir_asistencia')
+def bench_predecir_asistencia(args) -> Iterator[Caso]:
+    from predictor import PetStorePredictor
+
+    predictor = PetStorePredictor()
+    df = dataset_sintetico(5000, args.semilla)
+    predictor.scaler.fit(df[['dia_semana', 'hora', 'mes', 'service_id', 'edad_mascota']].values)
+    predictor.model_asistencia = predictor.construir_modelo_asistencia(5)
+    yield Caso('una_prediccion', lambda: predictor.predecir_asistencia(4, 16, 11, 3, 5))
+
+
+def casos_clustering(args, metodo: str, filas_distancias: Callable[[pd.DataFrame], int]) -> Iterator[Caso]:
+    """Un caso por tamaño; `filas_distancias` da las filas que entran al clustering jerárquico"""
+    from predictor import PetStorePredictor
+
+    predictor = PetStorePredictor()
+    for n in args.tamanos:
+        df = dataset_sintetico(n, args.semilla)
+        filas = filas_distancias(df)
+        if not cabe_matriz_distancias(filas):
+            yield Caso(f'n={n}', omitido=f"la matriz de distancias de {filas:,} filas no cabe en memoria")
+            continue
+        yield Caso(f'n={n}', lambda df=df: getattr(predictor, metodo)(df))
+
+
+@benchmark('clustering_mascotas')
+def bench_clustering_mascotas(args) -> Iterator[Caso]:
+    yield from casos_clustering(args, 'clustering_mascotas', len)
+
+
+@benchmark('clustering_clientes')
+def bench_clustering_clientes(args) -> Iterator[Caso]:
+    yield from casos_clustering(args, 'clustering_clientes', lambda df: df['client_id'].nunique())
+
+
+@benchmark('clustering_servicios')
+def bench_clustering_servicios(args) -> Iterator[Caso]:
+    yield from casos_clustering(args, 'clustering_servicios', lambda df: df['service_id'].nunique())
+
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+
+def comparar(actual: Dict, anterior_ruta: Path):
+    """Imprime la variación de la mediana por caso respecto a un resultado anterior"""
+    anterior = json.loads(anterior_ruta.read_text(encoding='utf-8'))
+    previos = {(r['benchmark'], r['caso']): r for r in anterior['resultados'] if 'mediana_us' in r}
+    print(f"\n  Comparación {anterior['commit']} -> {actual['commit']}")
+    print(f"  {'benchmark':<28} {'caso':<18} {'antes (us)':>14} {'ahora (us)':>14} {'Δ':>8}")
+    for r in actual['resultados']:
+        previo = previos.get((r['benchmark'], r['caso']))
+        if previo is None or 'mediana_us' not in r:
+            continue
+        delta = (r['mediana_us'] - previo['mediana_us']) / previo['mediana_us'] * 100 if previo['mediana_us'] else 0.0
+        print(f"  {r['benchmark']:<28} {r['caso']:<18} {previo['mediana_us']:>14,.1f} {r['mediana_us']:>14,.1f} "
+              f"{delta:>+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks de las rutas calientes de ML del Pet Store")
+    parser.add_argument('--filtro', nargs='+', default=[],
+                        help="Solo los benchmarks cuyo nombre contenga alguno de estos textos")
+    parser.add_argument('--repeticiones', type=int, default=5, help="Rondas medidas por caso")
+    parser.add_argument('--tiempo-minimo', type=float, default=0.2,
+                        help="Segundos mínimos por ronda (se ajusta el número de llamadas)")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Filas del dataset sintético para el clustering")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla de los datos y modelos sintéticos")
+    parser.add_argument('--etiqueta', default='', help="Texto libre guardado en el resultado")
+    parser.add_argument('--comparar', type=Path, help="Resultado JSON anterior para comparar")
+    args = parser.parse_args()
+
+    nombres = [n for n in BENCHMARKS if not args.filtro or any(f in n for f in args.filtro)]
+    resultados = [r for nombre in nombres for r in ejecutar(nombre, args)]
+
+    commit = commit_actual()
+    salida = {
+        'commit': commit,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'etiqueta': args.etiqueta,
+        'parametros': {'repeticiones': args.repeticiones, 'tiempo_minimo_s': args.tiempo_minimo,
+                       'tamanos': args.tamanos, 'semilla': args.semilla},
+        'sistema': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                    'procesador': platform.processor()},
+        'resultados': resultados,
+    }
+    DIRECTORIO_RESULTADOS.mkdir(parents=True, exist_ok=True)
+    ruta = DIRECTORIO_RESULTADOS / f"micro_{commit}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    ruta.write_text(json.dumps(salida, indent=2, ensure_ascii=False), encoding='utf-8')
+    logger.info(f" Resultados guardados en {ruta}")
+
+    if args.comparar:
+        comparar(salida, args.comparar)
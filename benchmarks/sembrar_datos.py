@@ -0,0 +1,347 @@
+"""
+SEMBRADOR DE DATOS SINTÉTICOS PARA BENCHMARKS
+Crea el esquema mínimo en una base de PostgreSQL dedicada y la llena con
+citas, mascotas, clientes, servicios, productos y ventas a la escala pedida
+
+Uso:
+    createdb -p 5433 petstore_bench
+    python benchmarks/sembrar_datos.py --citas 100000
+    python benchmarks/sembrar_datos.py --citas 10000000 --semilla 7
+
+    # Luego levantar la API contra esa base:
+    DB_NAME=petstore_bench python api.py
+
+La base se toma de BENCH_DB_NAME (default: petstore_bench); host, puerto y
+credenciales de DB_CONFIG. Los datos dependen solo de --citas y --semilla (las
+fechas se generan relativas al día de la corrida, para que haya citas y ventas
+"de hoy"), así que dos corridas con los mismos argumentos son comparables.
+Se carga con COPY por bloques (memoria acotada aunque sean 10M de citas) y al
+final se aplican migraciones/001_indices_metricas.sql y ANALYZE.
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+import psycopg2
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+from config import DB_CONFIG  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+TAMANO_BLOQUE = 200_000
+BASES_PROTEGIDAS = {'petstore', 'postgres'}
+
+TIPOS_MASCOTA = ['Perro', 'Gato', 'Conejo', 'Ave', 'Hámster', 'Tortuga']
+PESOS_TIPO = [0.48, 0.32, 0.07, 0.06, 0.04, 0.03]
+RAZAS = {
+    'Perro': ['Labrador', 'Pastor Alemán', 'Bulldog', 'Poodle', 'Criollo', 'Golden Retriever'],
+    'Gato': ['Persa', 'Siamés', 'Angora', 'Criollo', 'Bengalí'],
+    'Conejo': ['Holandés', 'Cabeza de León', 'Rex'],
+    'Ave': ['Canario', 'Periquito', 'Cacatúa'],
+    'Hámster': ['Sirio', 'Ruso'],
+    'Tortuga': ['Morrocoy', 'Orejas Rojas'],
+}
+NOMBRES_MASCOTA = ['Max', 'Luna', 'Rocky', 'Nala', 'Toby', 'Milo', 'Kira', 'Simba', 'Coco', 'Lola',
+                   'Bruno', 'Canela', 'Zeus', 'Maya', 'Thor', 'Mía', 'Oreo', 'Pelusa', 'Corona', 'Manchas']
+SERVICIOS = [
+    ('Consulta general', 45000, 30), ('Vacunación', 60000, 20), ('Baño y peluquería', 55000, 90),
+    ('Desparasitación', 35000, 15), ('Cirugía menor', 350000, 120), ('Odontología', 150000, 60),
+    ('Radiografía', 120000, 30), ('Laboratorio clínico', 90000, 20), ('Hospitalización', 250000, 240),
+    ('Esterilización', 300000, 120), ('Control postoperatorio', 40000, 20), ('Microchip', 70000, 15),
+]
+ESTADOS_CITA = ['COMPLETADA', 'CANCELADA', 'PROGRAMADA', 'EN_PROCESO']
+PESOS_ESTADO = [0.70, 0.12, 0.15, 0.03]
+CATEGORIAS = ['Alimento', 'Juguetes', 'Medicamentos', 'Accesorios', 'Higiene']
+VACUNAS = ['Rabia', 'Parvovirus', 'Moquillo', 'Triple felina', 'Leptospirosis']
+
+# Distribución de las citas por hora del día (más demanda a media mañana y al final de la tarde)
+HORAS = np.arange(8, 19)
+PESOS_HORA = np.array([4, 8, 10, 9, 6, 4, 6, 8, 9, 7, 4], dtype=float)
+
+
+# =============================================================================
+# CARGA CON COPY
+# =============================================================================
+
+def copiar(conn, tabla: str, bloques: Iterator[pd.DataFrame]) -> int:
+    """COPY de cada bloque (DataFrame con las columnas de la tabla) en formato CSV"""
+    total = 0
+    with conn.cursor() as cursor:
+        for df in bloques:
+            buffer = io.StringIO()
+            df.to_csv(buffer, header=False, index=False)
+            buffer.seek(0)
+            columnas = ', '.join(df.columns)
+            cursor.copy_expert(f'COPY {tabla} ({columnas}) FROM STDIN WITH (FORMAT csv)', buffer)
+            total += len(df)
+    conn.commit()
+    logger.info(f"   {tabla}: {total:,} filas")
+    return total
+
+
+def en_bloques(total: int):
+    """Rangos [inicio, fin) de TAMANO_BLOQUE ids (los ids empiezan en 1)"""
+    for inicio in range(1, total + 1, TAMANO_BLOQUE):
+        yield inicio, min(inicio + TAMANO_BLOQUE, total + 1)
+
+
+# =============================================================================
+# GENERADORES POR TABLA
+# =============================================================================
+
+def generar_clientes(rng, n: int):
+    for inicio, fin in en_bloques(n):
+        ids = np.arange(inicio, fin)
+        yield pd.DataFrame({
+            'client_id': ids,
+            'name': [f'Cliente {i}' for i in ids],
+            'correo': [f'cliente{i}@correo.com' for i in ids],
+            'telefono': rng.integers(3000000000, 3299999999, len(ids)).astype(str),
+            'direccion': [f'Calle {i % 200} # {i % 97}-{i % 50}' for i in ids],
+            'activo': rng.random(len(ids)) > 0.02,
+        })
+
+
+def generar_mascotas(rng, n: int):
+    for inicio, fin in en_bloques(n):
+        ids = np.arange(inicio, fin)
+        tipos = rng.choice(TIPOS_MASCOTA, len(ids), p=PESOS_TIPO)
+        yield pd.DataFrame({
+            'pet_id': ids,
+            'nombre': [f'{NOMBRES_MASCOTA[i % len(NOMBRES_MASCOTA)]} {i}' for i in ids],
+            'tipo': tipos,
+            'raza': [RAZAS[t][rng.integers(len(RAZAS[t]))] for t in tipos],
+            'edad': rng.integers(0, 16, len(ids)),
+            'sexo': rng.choice(['Macho', 'Hembra'], len(ids)),
+            'color': rng.choice(['Negro', 'Blanco', 'Café', 'Gris', 'Mixto'], len(ids)),
+            'activo': rng.random(len(ids)) > 0.02,
+        })
+
+
+def generar_duenos(n_mascotas: int, n_clientes: int):
+    """Cada mascota tiene un dueño; los clientes se reparten en orden"""
+    for inicio, fin in en_bloques(n_mascotas):
+        ids = np.arange(inicio, fin)
+        yield pd.DataFrame({'pet_id': ids, 'client_id': (ids - 1) % n_clientes + 1})
+
+
+def generar_citas(rng, n: int, n_mascotas: int, n_clientes: int, n_veterinarios: int, dias: int):
+    ahora = pd.Timestamp.now().normalize()
+    inicio_rango = ahora - pd.Timedelta(days=dias)
+    for inicio, fin in en_bloques(n):
+        tam = fin - inicio
+        # Fechas crecientes con el id (como en producción), algunas en los próximos 30 días:
+        # cada bloque cubre su tramo proporcional del rango
+        desde = (dias + 30) * (inicio - 1) // n
+        hasta = max((dias + 30) * (fin - 1) // n, desde + 1)
+        dia = np.sort(rng.integers(desde, hasta, tam))
+        hora = rng.choice(HORAS, tam, p=PESOS_HORA / PESOS_HORA.sum())
+        minuto = rng.choice([0, 15, 30, 45], tam)
+        fechas = inicio_rango + pd.to_timedelta(dia, unit='D') + pd.to_timedelta(hora * 60 + minuto, unit='m')
+        mascotas = rng.integers(1, n_mascotas + 1, tam)
+        futuras = fechas >= ahora
+        estados = rng.choice(ESTADOS_CITA, tam, p=PESOS_ESTADO)
+        estados[futuras] = 'PROGRAMADA'
+        yield pd.DataFrame({
+            'appointment_id': np.arange(inicio, fin),
+            'pet_id': mascotas,
+            'client_id': (mascotas - 1) % n_clientes + 1,
+            'service_id': rng.integers(1, len(SERVICIOS) + 1, tam),
+            'veterinarian_id': rng.integers(1, n_veterinarios + 1, tam),
+            'fecha_hora': fechas.strftime('%Y-%m-%d %H:%M:%S'),
+            'estado': estados,
+            'activo': rng.random(tam) > 0.01,
+        })
+
+
+def generar_historial(rng, n: int, n_mascotas: int, n_veterinarios: int, dias: int):
+    ahora = pd.Timestamp.now().normalize()
+    for inicio, fin in en_bloques(n):
+        tam = fin - inicio
+        fechas = ahora - pd.to_timedelta(rng.integers(1, dias, tam), unit='D')
+        yield pd.DataFrame({
+            'history_id': np.arange(inicio, fin),
+            'pet_id': rng.integers(1, n_mascotas + 1, tam),
+            'service_id': rng.integers(1, len(SERVICIOS) + 1, tam),
+            'veterinarian_id': rng.integers(1, n_veterinarios + 1, tam),
+            'fecha_atencion': fechas.strftime('%Y-%m-%d %H:%M:%S'),
+            'tipo_procedimiento': rng.choice(['Consulta', 'Procedimiento', 'Control'], tam),
+            'diagnostico': 'Sin hallazgos relevantes',
+            'tratamiento': 'Control en 6 meses',
+            'activo': True,
+        })
+
+
+def generar_vacunas(rng, n: int, n_mascotas: int, n_veterinarios: int, dias: int):
+    hoy = pd.Timestamp.now().normalize()
+    for inicio, fin in en_bloques(n):
+        tam = fin - inicio
+        aplicacion = hoy - pd.to_timedelta(rng.integers(1, dias, tam), unit='D')
+        yield pd.DataFrame({
+            'vaccination_id': np.arange(inicio, fin),
+            'pet_id': rng.integers(1, n_mascotas + 1, tam),
+            'veterinarian_id': rng.integers(1, n_veterinarios + 1, tam),
+            'vaccine_name': rng.choice(VACUNAS, tam),
+            'application_date': aplicacion.strftime('%Y-%m-%d'),
+            'next_dose_date': (aplicacion + pd.Timedelta(days=365)).strftime('%Y-%m-%d'),
+            'dose_number': rng.integers(1, 4, tam),
+            'estado': 'APLICADA',
+            'activo': True,
+        })
+
+
+def generar_productos(rng, n: int):
+    hoy = pd.Timestamp.now().normalize()
+    ids = np.arange(1, n + 1)
+    compra = np.round(rng.uniform(5000, 150000, n), 2)
+    minimo = rng.integers(5, 30, n)
+    yield pd.DataFrame({
+        'producto_id': ids,
+        'nombre': [f'Producto {i}' for i in ids],
+        'categoria': rng.choice(CATEGORIAS, n),
+        'precio_compra': compra,
+        'precio_venta': np.round(compra * rng.uniform(1.2, 1.8, n), 2),
+        # ~15 % por debajo del mínimo para la alerta de inventario
+        'stock_actual': np.where(rng.random(n) < 0.15, rng.integers(0, 5, n), rng.integers(10, 200, n)),
+        'stock_minimo': minimo,
+        'stock_maximo': minimo * 10,
+        'fecha_vencimiento': (hoy + pd.to_timedelta(rng.integers(-30, 540, n), unit='D')).strftime('%Y-%m-%d'),
+        'proveedor': rng.choice(['Distribuidora Norte', 'PetSupply', 'VetFarma'], n),
+        'activo': True,
+    })
+
+
+def generar_ventas(rng, n: int, n_clientes: int, dias: int):
+    ahora = pd.Timestamp.now()
+    for inicio, fin in en_bloques(n):
+        tam = fin - inicio
+        segundos = np.sort(rng.integers(0, dias * 86400, tam))[::-1]
+        total = np.round(rng.uniform(10000, 400000, tam), 2)
+        yield pd.DataFrame({
+            'venta_id': np.arange(inicio, fin),
+            'client_id': rng.integers(1, n_clientes + 1, tam),
+            'fecha_venta': (ahora - pd.to_timedelta(segundos, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+            'subtotal': total,
+            'total': total,
+            'activo': rng.random(tam) > 0.01,
+        })
+
+
+def generar_detalles(rng, n_ventas: int, n_productos: int):
+    """Entre 1 y 4 ítems por venta"""
+    siguiente_id = 1
+    for inicio, fin in en_bloques(n_ventas):
+        items = rng.integers(1, 5, fin - inicio)
+        ventas = np.repeat(np.arange(inicio, fin), items)
+        tam = len(ventas)
+        cantidad = rng.integers(1, 6, tam)
+        precio = np.round(rng.uniform(5000, 200000, tam), 2)
+        yield pd.DataFrame({
+            'detalle_id': np.arange(siguiente_id, siguiente_id + tam),
+            'venta_id': ventas,
+            'producto_id': rng.integers(1, n_productos + 1, tam),
+            'cantidad': cantidad,
+            'precio_unitario': precio,
+            'subtotal': np.round(cantidad * precio, 2),
+            'activo': True,
+        })
+        siguiente_id += tam
+
+
+# =============================================================================
+# PROCESO PRINCIPAL
+# =============================================================================
+
+def sembrar(citas: int, semilla: int = 42, dias: int = 730, con_indices: bool = True) -> dict:
+    """Crea el esquema y carga los datos; retorna las filas por tabla"""
+    base = os.getenv('BENCH_DB_NAME', 'petstore_bench')
+    if base in BASES_PROTEGIDAS:
+        raise SystemExit(f"Negado: '{base}' no es una base de benchmarks (el esquema borra las tablas)")
+
+    rng = np.random.default_rng(semilla)
+    n_clientes = max(100, citas // 25)
+    n_mascotas = int(n_clientes * 1.4)
+    n_veterinarios = 10
+    n_productos = 500
+    n_ventas = max(100, citas // 2)
+
+    conn = psycopg2.connect(**dict(DB_CONFIG, database=base))
+    inicio = time.perf_counter()
+    try:
+        logger.info(f" Sembrando '{base}' con {citas:,} citas (semilla {semilla})...")
+        with conn.cursor() as cursor:
+            cursor.execute((RAIZ / 'benchmarks' / 'esquema_minimo.sql').read_text(encoding='utf-8'))
+        conn.commit()
+
+        filas = {}
+        filas['user'] = copiar(conn, '"user"', iter([pd.DataFrame({
+            'user_id': np.arange(1, n_veterinarios + 1),
+            'name': [f'Dr. Veterinario {i}' for i in range(1, n_veterinarios + 1)],
+        })]))
+        filas['service'] = copiar(conn, 'service', iter([pd.DataFrame({
+            'service_id': np.arange(1, len(SERVICIOS) + 1),
+            'nombre': [s[0] for s in SERVICIOS],
+            'descripcion': [f'Servicio de {s[0].lower()}' for s in SERVICIOS],
+            'precio': [s[1] for s in SERVICIOS],
+            'duracion_minutos': [s[2] for s in SERVICIOS],
+            'activo': True,
+        })]))
+        filas['client'] = copiar(conn, 'client', generar_clientes(rng, n_clientes))
+        filas['pet'] = copiar(conn, 'pet', generar_mascotas(rng, n_mascotas))
+        filas['pet_owner'] = copiar(conn, 'pet_owner', generar_duenos(n_mascotas, n_clientes))
+        filas['appointment'] = copiar(conn, 'appointment',
+                                      generar_citas(rng, citas, n_mascotas, n_clientes, n_veterinarios, dias))
+        filas['pet_medical_history'] = copiar(conn, 'pet_medical_history',
+                                              generar_historial(rng, citas // 3, n_mascotas, n_veterinarios, dias))
+        filas['vaccination'] = copiar(conn, 'vaccination',
+                                      generar_vacunas(rng, n_mascotas, n_mascotas, n_veterinarios, dias))
+        filas['producto'] = copiar(conn, 'producto', generar_productos(rng, n_productos))
+        filas['venta'] = copiar(conn, 'venta', generar_ventas(rng, n_ventas, n_clientes, dias))
+        filas['detalle_venta'] = copiar(conn, 'detalle_venta', generar_detalles(rng, n_ventas, n_productos))
+
+        with conn.cursor() as cursor:
+            # Los ids se insertaron explícitamente: alinear las secuencias
+            for tabla, columna in [('"user"', 'user_id'), ('client', 'client_id'), ('pet', 'pet_id'),
+                                   ('service', 'service_id'), ('appointment', 'appointment_id'),
+                                   ('pet_medical_history', 'history_id'), ('vaccination', 'vaccination_id'),
+                                   ('producto', 'producto_id'), ('venta', 'venta_id'),
+                                   ('detalle_venta', 'detalle_id')]:
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{tabla}', '{columna}'), "
+                               f"(SELECT COALESCE(MAX({columna}), 1) FROM {tabla}))")
+            if con_indices:
+                cursor.execute((RAIZ / 'migraciones' / '001_indices_metricas.sql').read_text(encoding='utf-8'))
+        conn.commit()
+
+        # ANALYZE fuera de la transacción para que las estadísticas queden listas
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    logger.info(f" Base sembrada en {time.perf_counter() - inicio:.1f}s")
+    return filas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Llena la base de benchmarks con datos sintéticos")
+    parser.add_argument('--citas', type=int, default=100_000,
+                        help="Cantidad de citas (10k - 10M); el resto de tablas escala a partir de esta")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla del generador (datos reproducibles)")
+    parser.add_argument('--dias', type=int, default=730, help="Días de historia hacia atrás")
+    parser.add_argument('--sin-indices', action='store_true',
+                        help="No aplicar migraciones/001_indices_metricas.sql (para medir su efecto)")
+    args = parser.parse_args()
+
+    sembrar(args.citas, args.semilla, args.dias, not args.sin_indices)
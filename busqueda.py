@@ -0,0 +1,311 @@
+"""
+MÓDULO DE BÚSQUEDA DIFUSA
+Índice de trigramas en memoria sobre nombres de mascotas y correos de clientes
+"""
+
+import logging
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+from config import CACHE_CONFIG
+from database import registrar_sentencia
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+QUERY_MASCOTAS_INDICE = registrar_sentencia('indice_mascotas', """
+SELECT
+    p.pet_id,
+    p.nombre,
+    p.tipo,
+    p.raza,
+    p.edad,
+    p.sexo,
+    c.name as propietario,
+    c.telefono,
+    c.correo
+FROM pet p
+JOIN pet_owner po ON p.pet_id = po.pet_id
+JOIN client c ON po.client_id = c.client_id
+WHERE p.activo = true;
+""")
+
+QUERY_CLIENTES_INDICE = registrar_sentencia('indice_clientes', """
+SELECT
+    client_id,
+    name,
+    correo,
+    telefono,
+    direccion
+FROM client
+WHERE activo = true AND correo IS NOT NULL;
+""")
+
+# Firma de las tablas indexadas: si cambia, se reconstruye el índice. Además de
+# conteos y último id suma un hash de las columnas que se muestran, así un
+# cambio de nombre, correo o teléfono también se detecta (el recorrido es el
+# mismo que ya hacen los conteos). No cubre el cambio de dueño en pet_owner:
+# ese se refleja a más tardar en `busqueda_ttl`
+QUERY_FIRMA_INDICE = registrar_sentencia('indice_firma', """
+SELECT
+    (SELECT COUNT(*) FROM pet WHERE activo = true) AS mascotas,
+    (SELECT MAX(pet_id) FROM pet) AS max_pet_id,
+    (SELECT COALESCE(SUM(hashtext(concat_ws('|', nombre, tipo, raza, edad, sexo))::bigint), 0)
+     FROM pet WHERE activo = true) AS hash_mascotas,
+    (SELECT COUNT(*) FROM client WHERE activo = true) AS clientes,
+    (SELECT MAX(client_id) FROM client) AS max_client_id,
+    (SELECT COALESCE(SUM(hashtext(concat_ws('|', name, correo, telefono, direccion))::bigint), 0)
+     FROM client WHERE activo = true) AS hash_clientes;
+""")
+
+
+# =============================================================================
+# TRIGRAMAS
+# =============================================================================
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes ("Múñeca" -> "muneca")"""
+    texto = unicodedata.normalize('NFKD', str(texto).lower().strip())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def trigramas(texto: str) -> Set[str]:
+    """
+    Trigramas de cada palabra, con el mismo relleno que pg_trgm
+    (dos espacios al inicio y uno al final): "max" -> {"  m", " ma", "max", "ax "}
+    """
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f"  {palabra} "
+        for i in range(len(relleno) - 2):
+            resultado.add(relleno[i:i + 3])
+    return resultado
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama -> documentos
+
+    La similitud es la de pg_trgm: trigramas compartidos / trigramas totales.
+    Las coincidencias por subcadena (el antiguo LIKE '%x%') siempre se incluyen.
+    """
+
+    def __init__(self, textos: List[str]):
+        self.textos = [normalizar(t) for t in textos]
+        self.trigramas = [trigramas(t) for t in self.textos]
+        self.invertido: Dict[str, List[int]] = defaultdict(list)
+        for doc, trigs in enumerate(self.trigramas):
+            for trig in trigs:
+                self.invertido[trig].append(doc)
+
+    def buscar(self, consulta: str, limite: int = 10, umbral: float = 0.3) -> List[tuple]:
+        """
+        Returns:
+            Lista de (doc, similitud) ordenada: exactas, prefijos, subcadenas
+            y luego por similitud de trigramas
+        """
+        q = normalizar(consulta)
+        if not q:
+            return []
+        q_trigs = trigramas(q)
+
+        compartidos: Dict[int, int] = defaultdict(int)
+        for trig in q_trigs:
+            for doc in self.invertido.get(trig, ()):
+                compartidos[doc] += 1
+
+        # Con menos de 3 letras los trigramas internos no bastan para hallar subcadenas
+        candidatos = compartidos.keys() if len(q) >= 3 else range(len(self.textos))
+
+        resultados = []
+        for doc in candidatos:
+            texto = self.textos[doc]
+            comunes = compartidos.get(doc, 0)
+            similitud = comunes / (len(q_trigs) + len(self.trigramas[doc]) - comunes) if comunes else 0.0
+
+            if texto == q:
+                rango = 3
+                similitud = 1.0
+            elif texto.startswith(q):
+                rango = 2
+            elif q in texto:
+                rango = 1
+            elif similitud >= umbral:
+                rango = 0
+            else:
+                continue
+            resultados.append((rango, similitud, doc))
+
+        resultados.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        return [(doc, round(similitud, 4)) for _, similitud, doc in resultados[:limite]]
+
+
+def es_coincidencia_aproximada(consulta: str, resultados: List[Dict], campo: str = 'nombre') -> bool:
+    """True si ningún resultado contiene la consulta (solo hubo coincidencias difusas)"""
+    q = normalizar(consulta)
+    return bool(resultados) and not any(q in normalizar(r.get(campo) or '') for r in resultados)
+
+
+# =============================================================================
+# ÍNDICE DE BÚSQUEDA
+# =============================================================================
+
+class IndiceBusqueda:
+    """
+    Búsqueda tolerante a errores de mascotas (por nombre) y clientes (por correo)
+
+    Los datos se cargan una vez en memoria. Cada `verificacion_segundos` se
+    compara una firma de las tablas (conteos, último id y hash de los campos
+    indexados) y, si cambió, o si pasaron `ttl_segundos`, el índice se
+    reconstruye: un cambio se ve en las búsquedas a lo sumo
+    `verificacion_segundos` después (más lo que tarde la reconstrucción).
+    La verificación y la reconstrucción corren en un hilo aparte, uno a la vez:
+    la búsqueda que las dispara no espera y responde con el índice actual hasta
+    que el nuevo lo reemplaza.
+    Si el índice no se pudo cargar (o las tablas están vacías) se recurre a la
+    consulta SQL original y la carga se reintenta cada `verificacion_segundos`,
+    no en cada búsqueda; si una reconstrucción falla se conserva el índice anterior.
+    """
+
+    def __init__(self, db, ttl_segundos: float = None, verificacion_segundos: float = None):
+        """
+        Args:
+            db: Instancia de PetStoreDatabase
+            ttl_segundos: Vigencia máxima del índice (reconstrucción forzada)
+            verificacion_segundos: Intervalo entre verificaciones de la firma
+        """
+        self.db = db
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else CACHE_CONFIG['busqueda_ttl']
+        self.verificacion_segundos = (verificacion_segundos if verificacion_segundos is not None
+                                      else CACHE_CONFIG['busqueda_verificacion'])
+        self.umbral = CACHE_CONFIG['busqueda_umbral']
+
+        self._lock = threading.Lock()
+        # Lo tiene el hilo que verifica o reconstruye; las búsquedas nunca lo esperan
+        self._lock_refresco = threading.Lock()
+        self._mascotas: List[Dict] = []
+        self._clientes: List[Dict] = []
+        self._indice_mascotas: Optional[IndiceTrigramas] = None
+        self._indice_clientes: Optional[IndiceTrigramas] = None
+        self._firma = None
+        self._construido_en = 0.0
+        self._verificado_en = 0.0
+        self._intentado_en: Optional[float] = None
+
+    # =========================================================================
+    # CONSTRUCCIÓN Y REFRESCO
+    # =========================================================================
+
+    def _obtener_firma(self) -> Optional[tuple]:
+        fila = self.db.consultar_fila(QUERY_FIRMA_INDICE, estricto=True)
+        return tuple(fila.values()) if fila else None
+
+    def reconstruir(self):
+        """Carga mascotas y clientes y reconstruye ambos índices (si una consulta falla, se propaga)"""
+        inicio = time.perf_counter()
+        self._intentado_en = time.monotonic()
+        firma = self._obtener_firma()
+        mascotas = self.db.consultar_filas(QUERY_MASCOTAS_INDICE, estricto=True)
+        clientes = self.db.consultar_filas(QUERY_CLIENTES_INDICE, estricto=True)
+        indice_mascotas = IndiceTrigramas([m['nombre'] if isinstance(m['nombre'], str) else '' for m in mascotas])
+        indice_clientes = IndiceTrigramas([c['correo'] if isinstance(c['correo'], str) else '' for c in clientes])
+
+        # Se reemplaza todo junto para que las búsquedas concurrentes vean un estado consistente
+        with self._lock:
+            self._mascotas, self._indice_mascotas = mascotas, indice_mascotas
+            self._clientes, self._indice_clientes = clientes, indice_clientes
+            self._firma = firma
+            self._construido_en = self._verificado_en = time.monotonic()
+
+        logger.info(f" Índice de búsqueda: {len(mascotas)} mascotas, {len(clientes)} clientes "
+                    f"en {time.perf_counter() - inicio:.2f}s")
+
+    def _tarea_pendiente(self) -> Optional[str]:
+        """'reconstruir', 'verificar' (la firma) o None si el índice está al día"""
+        ahora = time.monotonic()
+        if self._indice_mascotas is None or not self._mascotas or ahora - self._construido_en >= self.ttl_segundos:
+            # Vacío, sin cargar o vencido: se reintenta cada verificacion_segundos, no en cada búsqueda
+            if self._intentado_en is None or ahora - self._intentado_en >= self.verificacion_segundos:
+                return 'reconstruir'
+        elif ahora - self._verificado_en >= self.verificacion_segundos:
+            return 'verificar'
+        return None
+
+    def asegurar_actualizado(self):
+        """
+        Si el índice venció o toca verificar la firma, lo hace en un hilo aparte
+        (si no hay otro en curso) y vuelve enseguida
+        """
+        tarea = self._tarea_pendiente()
+        if tarea is None or not self._lock_refresco.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._refrescar, args=(tarea,), name='indice-busqueda', daemon=True).start()
+        except RuntimeError as e:
+            # Sin hilos disponibles (p. ej. al cerrar el intérprete): se sigue con el índice actual
+            self._lock_refresco.release()
+            logger.error(f"No se pudo iniciar la actualización del índice de búsqueda: {e}")
+
+    def _refrescar(self, tarea: str):
+        """Cuerpo del hilo de asegurar_actualizado (libera _lock_refresco al terminar)"""
+        try:
+            if tarea == 'verificar':
+                self._verificado_en = time.monotonic()
+                if self._obtener_firma() == self._firma:
+                    return
+            self.reconstruir()
+        except Exception as e:
+            logger.error(f"Error actualizando el índice de búsqueda (se conserva el anterior): {e}")
+        finally:
+            self._lock_refresco.release()
+
+    def invalidar(self):
+        """Fuerza la reconstrucción a partir de la siguiente búsqueda"""
+        self._construido_en = 0.0
+        self._intentado_en = None
+
+    # =========================================================================
+    # BÚSQUEDAS
+    # =========================================================================
+
+    def buscar_mascotas(self, nombre: str, limite: int = 10) -> List[Dict]:
+        """
+        Busca mascotas por nombre (parcial, con errores de tipeo o sin tildes)
+
+        Returns:
+            Lista de dicts (pet_id, nombre, tipo, raza, edad, sexo, propietario,
+            telefono, correo, similitud) ordenada por relevancia
+        """
+        self.asegurar_actualizado()
+
+        with self._lock:
+            indice, mascotas = self._indice_mascotas, self._mascotas
+
+        if not mascotas:
+            df = self.db.buscar_mascota_por_nombre(nombre)
+            return [dict(row, similitud=None) for row in df.to_dict('records')]
+
+        return [dict(mascotas[doc], similitud=similitud)
+                for doc, similitud in indice.buscar(nombre, limite, self.umbral)]
+
+    def buscar_clientes(self, correo: str, limite: int = 5) -> List[Dict]:
+        """
+        Busca clientes por correo; la coincidencia exacta (similitud 1.0) va primero
+
+        Returns:
+            Lista de dicts (client_id, name, correo, telefono, direccion, similitud)
+        """
+        self.asegurar_actualizado()
+
+        with self._lock:
+            indice, clientes = self._indice_clientes, self._clientes
+
+        if not clientes:
+            df = self.db.buscar_cliente_por_correo(correo)
+            return [dict(row, similitud=1.0) for row in df.to_dict('records')]
+
+        return [dict(clientes[doc], similitud=similitud)
+                for doc, similitud in indice.buscar(correo, limite, self.umbral)]
@@ -0,0 +1,83 @@
+"""
+MÓDULO DE CACHÉ EN MEMORIA
+Caché con expiración por tiempo (TTL) para resultados agregados y consultas frecuentes
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+# Registro de todas las cachés creadas (para reportar aciertos/fallos)
+CACHES_REGISTRADAS: List['CacheTTL'] = []
+
+
+class CacheTTL:
+    """
+    Caché clave -> valor donde cada entrada expira después de `ttl_segundos`
+
+    Con `max_entradas` (claves que vienen del usuario) al superar el límite se
+    descartan primero las vencidas y luego las guardadas hace más tiempo.
+    Si `calcular` lanza una excepción no se guarda nada.
+
+    Uso:
+        cache = CacheTTL('estadisticas', ttl_segundos=30)
+        valor = cache.obtener('generales', lambda: db.obtener_estadisticas_generales())
+    """
+
+    def __init__(self, nombre: str, ttl_segundos: float, max_entradas: Optional[int] = None):
+        self.nombre = nombre
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self._entradas: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        CACHES_REGISTRADAS.append(self)
+
+    def obtener(self, clave: Hashable, calcular: Callable[[], Any]) -> Any:
+        """Retorna el valor en caché o lo calcula (y guarda) si expiró"""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+
+        # Calculo fuera del lock para no bloquear otras claves
+        valor = calcular()
+        self.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave: Hashable, valor: Any):
+        """Guarda un valor con el TTL de la caché"""
+        ahora = time.monotonic()
+        with self._lock:
+            # Reinsertar la deja al final: el orden del dict es el de guardado
+            self._entradas.pop(clave, None)
+            self._entradas[clave] = (ahora + self.ttl_segundos, valor)
+            if self.max_entradas is not None and len(self._entradas) > self.max_entradas:
+                for vencida in [c for c, (expira, _) in self._entradas.items() if expira <= ahora]:
+                    del self._entradas[vencida]
+                while len(self._entradas) > self.max_entradas:
+                    del self._entradas[next(iter(self._entradas))]
+
+    def invalidar(self, clave: Optional[Hashable] = None):
+        """Elimina una clave (o todas si no se indica)"""
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+
+    def estadisticas(self) -> Dict:
+        """Aciertos, fallos y tasa de aciertos de la caché"""
+        total = self.aciertos + self.fallos
+        return {
+            "nombre": self.nombre,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / total, 4) if total else 0.0,
+            "entradas": len(self._entradas)
+        }
@@ -3,7 +3,6 @@ CHATBOT VETERINARIO INTELIGENTE CON RED NEURONAL LSTM
 Responde preguntas sobre enfermedades, cuidados, vacunas y análisis de datos
 """
 
-import re
 import random
 import pickle
 import numpy as np
@@ -11,14 +10,19 @@ from typing import Dict, List, Tuple
 from datetime import datetime
 from database import PetStoreDatabase
 from predictor import PetStorePredictor
+from analitica import AnaliticaCitas
+from busqueda import IndiceBusqueda, es_coincidencia_aproximada
+from contadores import ContadorEstadisticas
+from config import INTENCIONES_CONFIG
+from intenciones import ClasificadorIntenciones, respuestas_por_intencion
+from normalizacion import NORMALIZADOR_CHATBOT, matriz_indices
+from trazas import etapa, registrar_etapa, trazado
 import logging
 import os
+import time
 
-# Configurar TensorFlow para no mostrar warnings
+# Configurar TensorFlow para no mostrar warnings (se importa al cargar el modelo)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,11 +43,26 @@ class PetStoreBot:
     - Arquitectura: Embedding  Bidirectional LSTM  Dense  Softmax
     - Entrenada con datos veterinarios
     - Clasifica intenciones del usuario
+    
+    Router de intenciones (INTENCIONES_CONFIG['router']):
+    - 'destilado': clasificador de n-gramas destilado de la LSTM y las reglas
+      (destilar_intenciones.py), decenas de microsegundos por mensaje
+    - 'lstm': la red neuronal directamente
     """
     
-    def __init__(self):
-        self.db = PetStoreDatabase()
-        self.predictor = PetStorePredictor()
+    def __init__(self, db: PetStoreDatabase = None, predictor: PetStorePredictor = None,
+                 analitica: AnaliticaCitas = None, busqueda: IndiceBusqueda = None,
+                 contador: ContadorEstadisticas = None):
+        """
+        Los componentes que se reciben se comparten (la API pasa los suyos:
+        un solo cubo, índice de búsqueda y contador para todo el proceso); los
+        que faltan se crean sobre `db`
+        """
+        self.db = db if db is not None else PetStoreDatabase()
+        self.predictor = predictor if predictor is not None else PetStorePredictor()
+        self.analitica = analitica if analitica is not None else AnaliticaCitas(self.db)
+        self.busqueda = busqueda if busqueda is not None else IndiceBusqueda(self.db)
+        self.contador = contador if contador is not None else ContadorEstadisticas(self.db)
         self.nombre_bot = "VetBot"
         self.contexto = {}
         
@@ -63,15 +82,52 @@ class PetStoreBot:
             logger.warning(f"ADVERTENCIA: Modelo de chatbot no encontrado: {e}")
             logger.warning("   Ejecuta: python entrenar_chatbot_veterinario.py")
         
-        # Intentar cargar modelos de predicción de datos
+        # Router destilado (si no está, se usa la LSTM)
+        self.clasificador = None
+        if INTENCIONES_CONFIG['router'] == 'destilado':
+            try:
+                self.clasificador = ClasificadorIntenciones.cargar(INTENCIONES_CONFIG['modelo_destilado'])
+                if not self.intents:
+                    self.intents = respuestas_por_intencion()
+                logger.info(f"Router de intenciones destilado cargado ({len(self.clasificador.clases)} intenciones)")
+            except Exception as e:
+                logger.warning(f"ADVERTENCIA: Router destilado no disponible, se usa la LSTM: {e}")
+                logger.warning("   Ejecuta: python destilar_intenciones.py")
+        
+        # Intentar cargar modelos de predicción de datos (un predictor compartido ya los carga quien lo creó)
+        if predictor is None:
+            try:
+                self.predictor.cargar_modelos()
+                logger.info("Modelos predictivos de datos cargados")
+            except:
+                logger.warning("ADVERTENCIA: Modelos predictivos no encontrados.")
+    
+    @classmethod
+    def solo_intenciones(cls) -> 'PetStoreBot':
+        """
+        Bot sin base de datos ni predictores, solo con la LSTM (si está
+        entrenada) y detectar_intencion: el maestro de destilar_intenciones.py
+        """
+        bot = cls.__new__(cls)
+        bot.contexto = {}
+        bot.chatbot_model = None
+        bot.tokenizer = None
+        bot.label_encoder = None
+        bot.intents = {}
+        bot.clasificador = None
+        bot.max_len = 50
+        bot.confidence_threshold = 0.6
         try:
-            self.predictor.cargar_modelos()
-            logger.info("Modelos predictivos de datos cargados")
-        except:
-            logger.warning("ADVERTENCIA: Modelos predictivos no encontrados.")
+            bot.cargar_modelo_chatbot()
+        except Exception as e:
+            bot.chatbot_model = None
+            logger.warning(f"ADVERTENCIA: Modelo de chatbot no encontrado, solo se usan las reglas: {e}")
+        return bot
     
     def cargar_modelo_chatbot(self):
         """Carga el modelo de red neuronal entrenado para el chatbot"""
+        from tensorflow.keras.models import load_model
+        
         # Cargar modelo
         self.chatbot_model = load_model('models/chatbot_veterinario.h5')
         
@@ -92,20 +148,30 @@ class PetStoreBot:
     # =========================================================================
     
     def normalizar_texto(self, texto: str) -> str:
-        """Normaliza el texto de entrada"""
-        texto = texto.lower().strip()
-        
-        # Eliminar signos de puntuación pero mantener letras con acento
-        texto = re.sub(r'[^a-záéíóúñü\s0-9]', '', texto)
+        """Normaliza el texto de entrada (minúsculas, sin puntuación ni acentos, espacios simples)"""
+        return NORMALIZADOR_CHATBOT.normalizar(texto)
+    
+    def predecir_intencion(self, texto: str) -> Tuple[str, float, str]:
+        """
+        Intención con el router configurado: el clasificador destilado si está
+        cargado, si no la red neuronal. "desconocido" cuando la confianza no
+        llega al umbral de cada uno (el llamador recurre a las reglas)
         
-        # Quitar acentos para mejor coincidencia
-        acentos = {'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ü': 'u'}
-        for acento, sin_acento in acentos.items():
-            texto = texto.replace(acento, sin_acento)
+        El destilado aprende las intenciones de datos (citas de hoy, ventas...)
+        de las reglas (ver destilar_intenciones.py): no se corren las reglas
+        antes, el umbral decide cuándo hacen falta
         
-        # Eliminar espacios múltiples
-        texto = re.sub(r'\s+', ' ', texto)
-        return texto
+        Returns:
+            Tuple (intención, confianza, modelo que decidió)
+        """
+        if self.clasificador is not None:
+            with etapa('destilado'):
+                intencion, confianza = self.clasificador.predecir(texto)
+            if confianza < INTENCIONES_CONFIG['umbral_confianza']:
+                return "desconocido", confianza, "Destilado"
+            return intencion, confianza, "Destilado"
+        intencion, confianza = self.predecir_intencion_neuronal(texto)
+        return intencion, confianza, "LSTM"
     
     def predecir_intencion_neuronal(self, texto: str) -> Tuple[str, float]:
         """
@@ -125,16 +191,16 @@ class PetStoreBot:
             return "desconocido", 0.0
         
         # Normalizar
-        texto_norm = self.normalizar_texto(texto)
+        with etapa('normalizar'):
+            texto_norm = self.normalizar_texto(texto)
         
-        # Tokenizar y convertir a secuencia
-        sequence = self.tokenizer.texts_to_sequences([texto_norm])
-        
-        # Padding
-        padded = pad_sequences(sequence, maxlen=self.max_len, padding='post')
+        # Tokenizar y rellenar (mismo resultado que texts_to_sequences + pad_sequences)
+        with etapa('tokenizar'):
+            padded = self.secuencias_lstm([texto_norm])
         
         # Predecir con la red neuronal
-        prediction = self.chatbot_model.predict(padded, verbose=0)[0]
+        with etapa('modelo'):
+            prediction = self.chatbot_model.predict(padded, verbose=0)[0]
         
         # Obtener clase con mayor probabilidad
         max_confidence = float(np.max(prediction))
@@ -149,6 +215,20 @@ class PetStoreBot:
         
         return intent, max_confidence
     
+    def secuencias_lstm(self, textos_norm: List[str]) -> np.ndarray:
+        """
+        Matriz (len(textos_norm), max_len) de índices del tokenizer de Keras para
+        textos ya normalizados: relleno al final y truncado al inicio, igual que
+        texts_to_sequences + pad_sequences(padding='post'), sin pasar por Keras
+        """
+        word_index = self.tokenizer.word_index
+        oov = word_index.get(self.tokenizer.oov_token) if self.tokenizer.oov_token else None
+        return matriz_indices(
+            [texto.split() for texto in textos_norm], word_index, self.max_len,
+            desconocido=oov, limite_vocabulario=self.tokenizer.num_words, truncar='pre',
+            salida=np.empty((len(textos_norm), self.max_len), dtype=np.int32)
+        )
+    
     def detectar_intencion(self, texto: str) -> str:
         """Detecta la intención del usuario"""
         texto_norm = self.normalizar_texto(texto)
@@ -377,7 +457,7 @@ Ejemplos:
     
     def responder_estadisticas(self) -> str:
         """Muestra estadísticas generales"""
-        stats = self.db.obtener_estadisticas_generales()
+        stats = self.contador.obtener()
         
         respuesta = " **ESTADÍSTICAS GENERALES:**\n\n"
         respuesta += f" Mascotas registradas: **{stats['total_mascotas']}**\n"
@@ -389,13 +469,11 @@ Ejemplos:
     
     def responder_tipo_mas_comun(self) -> str:
         """Responde sobre el tipo de mascota más común"""
-        df = self.db.obtener_dataset_completo()
+        analisis = self.analitica.tipo_mascota_mas_comun()
         
-        if df.empty:
+        if analisis is None:
             return " No hay datos suficientes para realizar el análisis."
         
-        analisis = self.predictor.analizar_tipo_mascota_mas_comun(df)
-        
         respuesta = f" **ANÁLISIS: Tipo de Mascota Más Común**\n\n"
         respuesta += f" El tipo más común es: **{analisis['tipo_mas_comun']}**\n\n"
         respuesta += " **Distribución completa:**\n"
@@ -408,13 +486,11 @@ Ejemplos:
     
     def responder_dia_mas_atencion(self) -> str:
         """Responde sobre el día con más atención"""
-        df = self.db.obtener_dataset_completo()
+        analisis = self.analitica.dia_mas_atencion()
         
-        if df.empty:
+        if analisis is None:
             return " No hay datos suficientes para realizar el análisis."
         
-        analisis = self.predictor.analizar_dia_mas_atencion(df)
-        
         respuesta = f" **ANÁLISIS: Día con Más Atención**\n\n"
         respuesta += f" El día con más citas es: **{analisis['dia_con_mas_atencion']}**\n\n"
         respuesta += " **Distribución semanal:**\n"
@@ -424,8 +500,9 @@ Ejemplos:
             respuesta += f"• {stat['dia']}: {stat['cantidad_citas']} citas {barra}\n"
         
         # Obtener hora pico también
-        analisis_hora = self.predictor.analizar_hora_pico(df)
-        respuesta += f"\n⏰ **Hora pico:** {analisis_hora['hora_pico']}:00 horas"
+        analisis_hora = self.analitica.hora_pico()
+        if analisis_hora is not None:
+            respuesta += f"\n⏰ **Hora pico:** {analisis_hora['hora_pico']}:00 horas"
         
         return respuesta
     
@@ -464,14 +541,16 @@ Ejemplos:
         if not nombre:
             return " Por favor proporciona el nombre de la mascota. Ej: 'buscar mascota Max'"
         
-        df = self.db.buscar_mascota_por_nombre(nombre)
+        mascotas = self.busqueda.buscar_mascotas(nombre)
         
-        if df.empty:
+        if not mascotas:
             return f" No se encontró ninguna mascota con el nombre '{nombre}'."
         
         respuesta = f" **RESULTADOS DE BÚSQUEDA: '{nombre}'**\n\n"
+        if es_coincidencia_aproximada(nombre, mascotas):
+            respuesta += " _Sin coincidencia exacta, mostrando nombres parecidos:_\n\n"
         
-        for idx, row in df.iterrows():
+        for row in mascotas:
             respuesta += f" **{row['nombre']}** (ID: {row['pet_id']})\n"
             respuesta += f"   • Tipo: {row['tipo']}\n"
             respuesta += f"   • Raza: {row['raza']}\n"
@@ -963,29 +1042,35 @@ Puedo ayudarte a verificar el historial y programar citas.
     # PROCESAMIENTO PRINCIPAL
     # =========================================================================
     
+    @trazado('lstm')
     def procesar_mensaje(self, mensaje: str) -> Dict:
         """
         Procesa un mensaje del usuario y genera respuesta
         
         Proceso:
-        1. Usa la red neuronal para detectar la intención
+        1. Detecta la intención con el router (destilado o red neuronal)
         2. Si es una intención veterinaria, responde con información médica
         3. Si es una consulta de datos, consulta la base de datos
         4. Si no entiende, da respuesta genérica
         
         Returns:
-            Dict con respuesta, intención, confianza y timestamp
+            Dict con respuesta, intención, confianza, modelo, timestamp y debug_timings
+            (tiempos por etapa; ver trazas.py)
         """
-        # Usar red neuronal para detectar intención
-        intencion, confianza = self.predecir_intencion_neuronal(mensaje)
-        
-        # Obtener respuesta según la intención
-        if intencion == "desconocido" or self.chatbot_model is None:
-            # Fallback: usar detección de patrones simple
-            intencion = self.detectar_intencion(mensaje)
-            confianza = 0.5
+        # Usar el router (destilado o red neuronal) para detectar intención
+        with etapa('intencion'):
+            intencion, confianza, modelo = self.predecir_intencion(mensaje)
+            
+            # Obtener respuesta según la intención
+            if intencion == "desconocido":
+                # Fallback: usar detección de patrones simple
+                with etapa('reglas'):
+                    intencion = self.detectar_intencion(mensaje)
+                confianza = 0.5
+                modelo = "Reglas"
         
-        # Generar respuesta según intención
+        # Generar respuesta según intención (incluye las etapas db.* de las consultas)
+        inicio_respuesta = time.perf_counter()
         
         # Respuestas de la red neuronal veterinaria (intenciones médicas)
         if intencion in self.intents:
@@ -1123,10 +1208,13 @@ Puedo ayudarte con:
 """
             confianza = 0.3
         
+        registrar_etapa('respuesta', time.perf_counter() - inicio_respuesta)
+        
         return {
             "respuesta": respuesta,
             "intencion": intencion,
             "confianza": confianza,
+            "modelo": modelo,
             "timestamp": datetime.now().isoformat()
         }
     
@@ -46,6 +46,82 @@ PREDICTOR_CONFIG = {
     'random_state': 42
 }
 
+# =============================================================================
+# CONFIGURACIÓN DE CACHÉ Y ANALÍTICA
+# =============================================================================
+CACHE_CONFIG = {
+    'analitica_ttl': 60,      # Segundos que se reutilizan los agregados de citas
+    'usar_cubo': True,        # Responder la analítica desde el cubo pre-agregado en memoria
+    'cubo_refresco_incremental': 30,   # Segundos entre refrescos incrementales (citas nuevas)
+    'cubo_refresco_completo': 600,     # Segundos entre reconstrucciones completas del cubo
+    'busqueda_ttl': 600,               # Segundos antes de reconstruir el índice de búsqueda
+    'busqueda_verificacion': 30,       # Segundos entre verificaciones de cambios en pet/client
+    'busqueda_umbral': 0.3,            # Similitud mínima de trigramas (igual que pg_trgm)
+    'estadisticas_ttl': 15,            # Segundos que se reutilizan los conteos generales
+    'estadisticas_escuchar': False,    # Mantener conteos con LISTEN/NOTIFY (migraciones/002)
+    'vencimientos_ttl': 300,           # Segundos que se reutilizan los productos próximos a vencer (por días)
+    'vencimientos_max_entradas': 16,   # Valores de `dias` distintos en caché (el parámetro viene del usuario)
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE SONDAS DE SALUD (/livez, /readyz)
+# =============================================================================
+SALUD_CONFIG = {
+    'ping_ttl': 2,            # Segundos que se reutiliza el resultado de SELECT 1
+    # Modelos sin los cuales la instancia no se considera lista
+    # Opciones: 'predictor', 'chatbot_lstm', 'transformer'
+    'modelos_requeridos': []
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE EXPORTACIÓN
+# =============================================================================
+EXPORTACION_CONFIG = {
+    'tamano_lote': 5000,      # Filas por lote leídas del cursor del servidor
+    'tamano_lote_max': 50000  # Límite para el parámetro tamano_lote del endpoint
+}
+
+# =============================================================================
+# CONFIGURACIÓN DE TRAZAS DE LATENCIA (chatbot)
+# =============================================================================
+TRAZAS_CONFIG = {
+    'log_json': True,         # Una línea JSON por mensaje con los tiempos de cada etapa
+    'lento_ms': 1000          # Sin log JSON: solo se avisa de los mensajes más lentos que esto
+}
+
+# =============================================================================
+# CONFIGURACIÓN DEL ROUTER DE INTENCIONES (chatbot)
+# =============================================================================
+INTENCIONES_CONFIG = {
+    'router': 'destilado',    # 'destilado' (clasificador de n-gramas, ver destilar_intenciones.py) o 'lstm'
+    'modelo_destilado': 'models/intenciones_destiladas.npz',
+    'reporte_destilacion': 'models/reporte_destilacion.json',
+    'umbral_confianza': 0.65,  # Por debajo se usan las reglas de detectar_intencion (ver 'umbral_sin_errores'
+                               # en el reporte: en la prueba hubo errores con 0.60)
+    'dimension_hash': 2 ** 15,  # Columnas de la tabla de n-gramas
+    'temperatura': 2.0,       # Suavizado de las probabilidades de la LSTM (maestro)
+    'peso_etiqueta': 0.5,     # En los patrones del JSON: peso de su etiqueta frente a la LSTM
+    'epocas': 300,
+    'learning_rate': 0.05,
+    'l2': 1e-4,
+    'mensajes_registrados': ['data/registro_chat/*.jsonl']  # .jsonl (campo 'mensaje') o .txt; acepta comodines
+}
+
+# =============================================================================
+# CONFIGURACIÓN DEL REGISTRO DE CONVERSACIONES (ver registro_chat.py)
+# =============================================================================
+REGISTRO_CHAT_CONFIG = {
+    'activo': True,               # /api/chat registra cada mensaje (en un hilo aparte)
+    'directorio': 'data/registro_chat',
+    'max_bytes': 50 * 1024 * 1024,  # Tamaño al que se rota el archivo activo
+    'tamano_cola': 10000,         # Registros pendientes; con la cola llena se descartan
+    'lote': 256,                  # Registros por escritura
+    'reintento_max_segundos': 60, # Espera máxima entre intentos de abrir el archivo si falla
+    'directorio_shards': 'data/shards',
+    'ejemplos_por_shard': 10000,
+    'confianza_minima': 0.6       # Mensajes con menos confianza no entran a los shards
+}
+
 # =============================================================================
 # RUTAS DE ARCHIVOS
 # =============================================================================
@@ -7,17 +7,25 @@ Parámetros y configuraciones para el modelo Transformer
 # CONFIGURACIÓN DEL MODELO TRANSFORMER
 # =============================================================================
 
+# Tamaños del modelo: d_model (embeddings y hidden states), attention heads,
+# bloques transformer, dimensión feed-forward y dropout. En CPU la latencia
+# de generate crece más o menos con d_model² x num_layers
+TRANSFORMER_PRESETS = {
+    'tiny':  {'d_model': 64,  'num_heads': 4, 'num_layers': 2, 'd_ff': 256,  'dropout': 0.1},
+    'small': {'d_model': 128, 'num_heads': 4, 'num_layers': 3, 'd_ff': 512,  'dropout': 0.1},
+    'base':  {'d_model': 256, 'num_heads': 8, 'num_layers': 4, 'd_ff': 1024, 'dropout': 0.1},
+}
+
 TRANSFORMER_CONFIG = {
     # Dimensiones del modelo
-    'd_model': 256,          # Dimensión de embeddings y hidden states
-    'num_heads': 8,          # Número de attention heads
-    'num_layers': 4,         # Número de bloques transformer
-    'd_ff': 1024,            # Dimensión de la capa feed-forward
+    'model_size': 'small',   # Preset de TRANSFORMER_PRESETS (se guarda en el checkpoint)
+    'tie_embeddings': True,  # fc_out comparte la matriz del embedding (vocab_size x d_model parámetros menos)
     'max_len': 128,          # Longitud máxima de secuencia
-    'dropout': 0.1,          # Tasa de dropout
     
     # Vocabulario
-    'vocab_size': 5000,      # Tamaño máximo del vocabulario
+    'tokenizer': 'bpe',      # 'bpe' (subpalabras, ver tokenizador_bpe.py) o 'palabras'
+    'bpe_vocab_size': 2000,  # Piezas del vocabulario BPE (con especiales y alfabeto)
+    'vocab_size': 5000,      # Tamaño máximo del vocabulario de palabras
     'min_word_freq': 2,      # Frecuencia mínima para incluir palabra
     
     # Tokens especiales
@@ -37,13 +45,25 @@ TRANSFORMER_CONFIG = {
     'batch_size': 32,
     'learning_rate': 0.0001,
     'num_epochs': 50,
-    'warmup_steps': 4000,
-    'gradient_clip': 1.0,
+    'warmup_steps': 4000,     # Calentamiento lineal de la tasa (se acorta si supera los pasos totales)
+    'lr_scheduler': 'cosine', # Después del calentamiento: 'cosine', 'inverse_sqrt' o 'constante'
+    'min_lr_ratio': 0.1,      # Fracción de learning_rate al final del coseno
+    'gradient_clip': 1.0,     # Norma máxima del gradiente (0 = sin recorte)
+    'early_stopping_patience': 5,     # Épocas sin mejorar la validación antes de parar (0 = nunca)
+    'early_stopping_min_delta': 0.001,  # Mejora mínima de la pérdida de validación que cuenta
+    'gradient_accumulation_steps': 1,   # Lotes cuyos gradientes se suman antes de cada paso del optimizador
+    'objetivo': 'causal',           # 'causal': prompt + <SOS> + respuesta, pérdida solo en la respuesta;
+                                    # 'posicional': pregunta y respuesta alineadas por posición (modo anterior)
+    'agrupar_por_longitud': True,   # Lotes de longitud parecida, rellenos solo hasta su propio máximo
+    'lotes_por_grupo': 50,          # Lotes que se ordenan juntos por longitud (más = menos relleno, menos azar)
+    'validation_split': 0.1,        # Fracción de pares apartada para validar y elegir el mejor modelo
     
     # Rutas de archivos
     'model_path': 'models/transformer_chatbot.pth',
     'vocab_path': 'models/transformer_vocab.pkl',
     'training_data': 'data/chatbot_training_data.json',
+    'token_cache_dir': 'data/cache_tokens',   # Pares tokenizados (.npy) reutilizados entre corridas
+    'checkpoint_path': 'models/transformer_entrenamiento.pth',  # Estado completo para --resume
 }
 
 # =============================================================================
@@ -110,8 +130,10 @@ LOGGING_CONFIG = {
 PYTORCH_CONFIG = {
     'use_cuda': True,           # Usar GPU si está disponible
     'seed': 42,                 # Semilla para reproducibilidad
-    'num_workers': 4,           # Workers para DataLoader
-    'pin_memory': True,         # Optimización de memoria
+    'num_workers': 4,           # Workers para DataLoader (arman los lotes desde la caché de tokens)
+    'pin_memory': True,         # Optimización de memoria (solo aplica al copiar a GPU)
+    'num_threads': 0,           # Hilos de torch para entrenar (0 = uno por núcleo disponible)
+    'bf16': 'auto',             # Autocast bfloat16: 'auto' (si la CPU/GPU lo soporta), True o False
 }
 
 # =============================================================================
@@ -216,6 +238,7 @@ def get_config(config_name='TRANSFORMER_CONFIG'):
     """
     configs = {
         'TRANSFORMER_CONFIG': TRANSFORMER_CONFIG,
+        'TRANSFORMER_PRESETS': TRANSFORMER_PRESETS,
         'INTENCIONES_BASE': INTENCIONES_BASE,
         'CONTEXT_CONFIG': CONTEXT_CONFIG,
         'DB_KEYWORDS': DB_KEYWORDS,
@@ -0,0 +1,153 @@
+"""
+SERVICIO DE CONTADORES
+Estadísticas generales (mascotas, clientes, citas, servicios) servidas desde memoria,
+con caché TTL y actualización opcional por LISTEN/NOTIFY de PostgreSQL
+"""
+
+import logging
+import select
+import threading
+import time
+from typing import Dict, Optional
+import psycopg2
+from cache import CacheTTL
+from config import CACHE_CONFIG, DB_CONFIG
+from database import QUERY_ESTADISTICAS_GENERALES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Canal usado por los triggers de migraciones/002_notificar_cambios.sql
+CANAL_CAMBIOS = 'petstore_cambios'
+# Espera entre reconexiones de la escucha: se duplica en cada fallo seguido hasta el máximo
+ESPERA_RECONEXION_INICIAL = 1.0
+ESPERA_RECONEXION_MAXIMA = 60.0
+# Lo que se responde si la base no contesta (no se guarda en caché)
+CONTEOS_VACIOS = {'total_mascotas': 0, 'total_clientes': 0, 'total_citas': 0, 'total_servicios': 0}
+
+
+class ContadorEstadisticas:
+    """
+    Contadores generales del sistema
+
+    - Sin escucha: el resultado de la consulta combinada se reutiliza durante
+      `ttl_segundos` (CacheTTL).
+    - Con escucha: un hilo con conexión propia hace LISTEN sobre CANAL_CAMBIOS
+      y recalcula los conteos solo cuando un trigger avisa de un cambio en
+      pet, client, appointment o service. Las lecturas no tocan la base de datos.
+      Si la conexión de escucha se cae, se sirve en modo TTL mientras el hilo
+      reconecta (con espera creciente).
+
+    Un error de la base no se guarda en caché: se responde con ceros y la
+    siguiente lectura vuelve a consultar.
+    """
+
+    def __init__(self, db, ttl_segundos: float = None, escuchar: bool = None):
+        """
+        Args:
+            db: Instancia de PetStoreDatabase
+            ttl_segundos: Vigencia de los conteos en caché (modo sin escucha)
+            escuchar: Mantener los conteos con LISTEN/NOTIFY (default: CACHE_CONFIG)
+        """
+        self.db = db
+        if ttl_segundos is None:
+            ttl_segundos = CACHE_CONFIG['estadisticas_ttl']
+        if escuchar is None:
+            escuchar = CACHE_CONFIG['estadisticas_escuchar']
+        self.cache = CacheTTL('estadisticas_generales', ttl_segundos)
+
+        self._conteos: Optional[Dict] = None
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.notificaciones = 0
+
+        if escuchar:
+            self.iniciar_escucha()
+
+    def obtener(self) -> Dict:
+        """Conteos de mascotas, clientes, citas y servicios activos"""
+        if self.escuchando and self._conteos is not None:
+            return self._conteos
+        try:
+            return self.cache.obtener('generales', lambda: self.db.obtener_estadisticas_generales(estricto=True))
+        except Exception as e:
+            logger.error(f" Error obteniendo estadísticas generales: {e}")
+            return dict(CONTEOS_VACIOS)
+
+    def invalidar(self):
+        """Fuerza recalcular en la siguiente lectura (modo TTL)"""
+        self.cache.invalidar()
+
+    @property
+    def escuchando(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    # =========================================================================
+    # LISTEN / NOTIFY
+    # =========================================================================
+
+    def iniciar_escucha(self):
+        """Arranca el hilo que escucha los cambios (requiere la migración 002)"""
+        if self.escuchando:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._escuchar, name='contador-estadisticas', daemon=True)
+        self._hilo.start()
+
+    def detener_escucha(self):
+        """Detiene el hilo de escucha y vuelve al modo TTL"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        self._hilo = None
+        self._conteos = None
+
+    def _recalcular(self, conn) -> Dict:
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY_ESTADISTICAS_GENERALES)
+            fila = cursor.fetchone()
+            columnas = [col.name for col in cursor.description]
+        return {col: int(valor) for col, valor in zip(columnas, fila)}
+
+    def _escuchar(self):
+        """Escucha hasta detener_escucha(); ante un error reconecta con espera creciente"""
+        espera = ESPERA_RECONEXION_INICIAL
+        while not self._detener.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**DB_CONFIG)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL_CAMBIOS};")
+
+                self._conteos = self._recalcular(conn)
+                espera = ESPERA_RECONEXION_INICIAL
+                logger.info(f" Contadores escuchando '{CANAL_CAMBIOS}': {self._conteos}")
+
+                while not self._detener.is_set():
+                    # Espera hasta 1 s por notificaciones para poder revisar _detener
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    # Varias notificaciones seguidas (p. ej. una carga masiva) -> un solo recálculo
+                    self.notificaciones += len(conn.notifies)
+                    conn.notifies.clear()
+                    time.sleep(0.05)
+                    conn.poll()
+                    conn.notifies.clear()
+                    self._conteos = self._recalcular(conn)
+            except Exception as e:
+                logger.error(f" Escucha de contadores interrumpida, caché TTL hasta reconectar "
+                             f"(reintento en {espera:.0f}s): {e}")
+            finally:
+                # Los cambios ocurridos sin escucha no llegaron: la caché TTL empieza de cero
+                self._conteos = None
+                self.cache.invalidar()
+                if conn is not None and not conn.closed:
+                    conn.close()
+            if self._detener.wait(espera):
+                break
+            espera = min(espera * 2, ESPERA_RECONEXION_MAXIMA)
@@ -0,0 +1,309 @@
+"""
+CUBO PRE-AGREGADO DE CITAS
+Conteos de citas en memoria (NumPy) por día × hora × mes × servicio × tipo de mascota
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import CACHE_CONFIG
+from database import FROM_CITAS_ANALITICA, registrar_sentencia
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Agregado por celda del cubo. Solo viajan filas agregadas, nunca citas individuales.
+# El filtro `a.appointment_id > %s` permite traer únicamente las citas nuevas. Las citas que
+# entran son las de FROM_CITAS_ANALITICA, las mismas que cuentan las consultas SQL de respaldo.
+QUERY_CELDAS_CUBO = registrar_sentencia('cubo_celdas', f"""
+SELECT
+    EXTRACT(DOW FROM a.fecha_hora)::int AS dia_semana,
+    EXTRACT(HOUR FROM a.fecha_hora)::int AS hora,
+    EXTRACT(MONTH FROM a.fecha_hora)::int AS mes,
+    a.service_id,
+    p.tipo AS tipo_mascota,
+    COUNT(*) AS citas,
+    COUNT(*) FILTER (WHERE a.estado = 'COMPLETADA') AS completadas,
+    COUNT(*) FILTER (WHERE a.estado = 'CANCELADA') AS canceladas,
+    COUNT(s.duracion_minutos) AS con_duracion,
+    COALESCE(SUM(s.precio) FILTER (WHERE a.estado = 'COMPLETADA'), 0) AS ingresos,
+    COALESCE(SUM(s.duracion_minutos), 0) AS duracion_total,
+    MAX(a.appointment_id) AS max_id
+{FROM_CITAS_ANALITICA}
+  AND a.appointment_id > %s
+GROUP BY 1, 2, 3, 4, 5;
+""")
+
+QUERY_SERVICIOS_CUBO = registrar_sentencia('cubo_servicios', """
+SELECT service_id, nombre, precio
+FROM service;
+""")
+
+# Medidas no aditivas: se recalculan solo en la reconstrucción completa
+QUERY_MASCOTAS_POR_TIPO = registrar_sentencia('cubo_mascotas_por_tipo', """
+SELECT p.tipo AS tipo_mascota, COUNT(*) AS total_mascotas
+FROM pet p
+WHERE p.activo = true
+GROUP BY p.tipo;
+""")
+
+QUERY_UNICOS_POR_HORA = registrar_sentencia('cubo_unicos_por_hora', f"""
+SELECT
+    EXTRACT(HOUR FROM a.fecha_hora)::int AS hora,
+    COUNT(DISTINCT a.pet_id) AS mascotas_unicas,
+    COUNT(DISTINCT a.client_id) AS clientes_unicos
+{FROM_CITAS_ANALITICA}
+GROUP BY 1;
+""")
+
+
+class CuboCitas:
+    """
+    Cubo denso de conteos de citas
+
+    Ejes:    dia_semana (7) × hora (24) × mes (12) × servicio (S) × tipo_mascota (T)
+    Medidas: citas, completadas, canceladas, con_duracion (enteros)
+             ingresos (precio de citas completadas), duracion_total (flotantes)
+
+    Refresco:
+    - Incremental: cada `refresco_incremental` segundos se agregan solo las
+      citas con appointment_id mayor al último visto
+    - Completo: cada `refresco_completo` segundos se reconstruye todo, para
+      reflejar cambios de estado/cancelaciones y las medidas no aditivas
+      (mascotas por tipo, mascotas/clientes únicos por hora)
+
+    Las consultas a la base corren fuera del lock: la reconstrucción carga un
+    cubo aparte y lo reemplaza al final (si falla se conserva el anterior), y
+    mientras tanto se sigue respondiendo con el actual
+    """
+
+    EJES = ('dia_semana', 'hora', 'mes', 'servicio', 'tipo_mascota')
+    MEDIDAS_CONTEO = ('citas', 'completadas', 'canceladas', 'con_duracion')
+    MEDIDAS_SUMA = ('ingresos', 'duracion_total')
+    # Lo que reemplaza una reconstrucción (todo lo que deja _limpiar salvo tiempos y versión)
+    ESTADO = ('servicios', 'tipos', '_idx_servicio', '_idx_tipo', 'info_servicios', 'mascotas_por_tipo',
+              'unicos_por_hora', 'conteos', 'sumas', 'ultimo_id', '_marginales', 'construido')
+
+    def __init__(self, db, refresco_incremental: float = None, refresco_completo: float = None):
+        """
+        Args:
+            db: Instancia de PetStoreDatabase
+            refresco_incremental: Segundos entre refrescos incrementales
+            refresco_completo: Segundos entre reconstrucciones completas
+        """
+        self.db = db
+        self.refresco_incremental = (refresco_incremental if refresco_incremental is not None
+                                     else CACHE_CONFIG['cubo_refresco_incremental'])
+        self.refresco_completo = (refresco_completo if refresco_completo is not None
+                                  else CACHE_CONFIG['cubo_refresco_completo'])
+
+        self._lock = threading.RLock()
+        # Un solo refresco a la vez; los demás hilos responden con el cubo actual
+        self._lock_refresco = threading.Lock()
+        self._limpiar()
+
+    def _limpiar(self):
+        """Deja el cubo vacío (sin servicios ni tipos)"""
+        self.servicios: List[int] = []             # índice -> service_id
+        self.tipos: List[Optional[str]] = []       # índice -> tipo de mascota
+        self._idx_servicio: Dict[int, int] = {}
+        self._idx_tipo: Dict[Optional[str], int] = {}
+        self.info_servicios: Dict[int, Dict] = {}  # service_id -> {nombre, precio}
+        self.mascotas_por_tipo: Dict[Optional[str], int] = {}
+        self.unicos_por_hora: Dict[int, Tuple[int, int]] = {}
+
+        self.conteos = np.zeros((7, 24, 12, 0, 0, len(self.MEDIDAS_CONTEO)), dtype=np.int64)
+        self.sumas = np.zeros((7, 24, 12, 0, 0, len(self.MEDIDAS_SUMA)), dtype=np.float64)
+
+        self.ultimo_id = 0
+        self.version = 0
+        self._marginales: Dict[str, Tuple[list, np.ndarray, np.ndarray]] = {}
+        self._ultimo_incremental = 0.0
+        self._proximo_completo = 0.0
+        self.construido = False
+
+    # =========================================================================
+    # REFRESCO
+    # =========================================================================
+
+    def _vencido(self) -> bool:
+        ahora = time.monotonic()
+        return ahora >= self._proximo_completo or ahora - self._ultimo_incremental >= self.refresco_incremental
+
+    def asegurar_actualizado(self):
+        """Reconstruye o refresca el cubo si sus datos ya vencieron"""
+        if not self._vencido():
+            return
+        # Sin cubo construido se espera al refresco en curso; con cubo, se responde con el actual
+        if not self._lock_refresco.acquire(blocking=not self.construido):
+            return
+        try:
+            # Otro hilo pudo haber refrescado mientras se esperaba el lock
+            ahora = time.monotonic()
+            if ahora >= self._proximo_completo:
+                self.reconstruir()
+            elif ahora - self._ultimo_incremental >= self.refresco_incremental:
+                self.actualizar_incremental()
+        finally:
+            self._lock_refresco.release()
+
+    def invalidar(self):
+        """Deja de usar el cubo hasta la próxima reconstrucción (que se hace en la siguiente consulta)"""
+        with self._lock:
+            self.construido = False
+            self._proximo_completo = 0.0
+
+    def reconstruir(self):
+        """
+        Reconstruye el cubo completo desde la base de datos en un cubo aparte
+        y lo reemplaza al terminar. Si una consulta falla se conserva el cubo
+        anterior y se reintenta después de `refresco_incremental` segundos
+        """
+        inicio = time.perf_counter()
+        nuevo = CuboCitas(self.db, self.refresco_incremental, self.refresco_completo)
+        try:
+            celdas = nuevo._cargar_completo()
+        except Exception as e:
+            self._proximo_completo = time.monotonic() + self.refresco_incremental
+            logger.error(f"Error reconstruyendo el cubo de citas (se conserva el anterior): {e}")
+            return
+
+        with self._lock:
+            for campo in self.ESTADO:
+                setattr(self, campo, getattr(nuevo, campo))
+            self.version += 1
+            ahora = time.monotonic()
+            self._ultimo_incremental = ahora
+            # Sin celdas (tabla vacía) se responde con SQL y se reintenta pronto
+            self._proximo_completo = ahora + (self.refresco_completo if self.construido else self.refresco_incremental)
+
+        logger.info(f" Cubo de citas reconstruido: {celdas} celdas, "
+                    f"{int(nuevo.conteos[..., 0].sum())} citas en {time.perf_counter() - inicio:.2f}s")
+
+    def _cargar_completo(self) -> int:
+        """Carga todo en este cubo (recién creado, sin compartir); los errores de la base se propagan"""
+        for fila in self.db.consultar_filas(QUERY_SERVICIOS_CUBO, estricto=True):
+            self.info_servicios[int(fila['service_id'])] = {
+                "nombre": fila['nombre'],
+                "precio": float(fila['precio']) if fila['precio'] is not None else 0.0
+            }
+        self.mascotas_por_tipo = {
+            fila['tipo_mascota']: int(fila['total_mascotas'])
+            for fila in self.db.consultar_filas(QUERY_MASCOTAS_POR_TIPO, estricto=True)
+        }
+        self.unicos_por_hora = {
+            int(fila['hora']): (int(fila['mascotas_unicas']), int(fila['clientes_unicos']))
+            for fila in self.db.consultar_filas(QUERY_UNICOS_POR_HORA, estricto=True)
+        }
+        celdas = self._aplicar_delta(self.db.consultar_columnas(QUERY_CELDAS_CUBO, (0,), estricto=True))
+        self.construido = celdas > 0
+        return celdas
+
+    def actualizar_incremental(self):
+        """Agrega al cubo solo las citas nuevas (appointment_id > último visto)"""
+        desde = self.ultimo_id
+        cols = self.db.consultar_columnas(QUERY_CELDAS_CUBO, (desde,))
+        with self._lock:
+            # Si una reconstrucción reemplazó el cubo mientras tanto, estas celdas ya pueden estar incluidas
+            celdas = self._aplicar_delta(cols) if self.ultimo_id == desde else 0
+            self._ultimo_incremental = time.monotonic()
+        if celdas:
+            logger.info(f" Cubo de citas actualizado: {celdas} celdas nuevas")
+
+    def _aplicar_delta(self, cols: Dict[str, np.ndarray]) -> int:
+        """Suma al cubo las celdas agregadas de QUERY_CELDAS_CUBO (columnas de consultar_columnas)"""
+        if not cols or len(cols['citas']) == 0:
+            return 0
+
+        idx_servicio = np.array([self._indice_servicio(int(x)) for x in cols['service_id']], dtype=np.intp)
+        idx_tipo = np.array([self._indice_tipo(x) for x in cols['tipo_mascota']], dtype=np.intp)
+        self._ajustar_forma()
+
+        indices = (
+            cols['dia_semana'].astype(np.intp),
+            cols['hora'].astype(np.intp),
+            cols['mes'].astype(np.intp) - 1,
+            idx_servicio,
+            idx_tipo,
+        )
+        np.add.at(self.conteos, indices, np.column_stack([cols[m] for m in self.MEDIDAS_CONTEO]).astype(np.int64))
+        np.add.at(self.sumas, indices, np.column_stack([cols[m] for m in self.MEDIDAS_SUMA]).astype(np.float64))
+
+        self.ultimo_id = max(self.ultimo_id, int(cols['max_id'].max()))
+        self.version += 1
+        self._marginales = {}
+        return len(cols['citas'])
+
+    def _indice_servicio(self, service_id: int) -> int:
+        if service_id not in self._idx_servicio:
+            self._idx_servicio[service_id] = len(self.servicios)
+            self.servicios.append(service_id)
+        return self._idx_servicio[service_id]
+
+    def _indice_tipo(self, tipo) -> int:
+        if tipo not in self._idx_tipo:
+            self._idx_tipo[tipo] = len(self.tipos)
+            self.tipos.append(tipo)
+        return self._idx_tipo[tipo]
+
+    def _ajustar_forma(self):
+        """Agranda los ejes de servicio/tipo si aparecieron valores nuevos"""
+        faltan_s = len(self.servicios) - self.conteos.shape[3]
+        faltan_t = len(self.tipos) - self.conteos.shape[4]
+        if faltan_s or faltan_t:
+            relleno = ((0, 0), (0, 0), (0, 0), (0, faltan_s), (0, faltan_t), (0, 0))
+            self.conteos = np.pad(self.conteos, relleno)
+            self.sumas = np.pad(self.sumas, relleno)
+
+    # =========================================================================
+    # CONSULTAS SOBRE EL CUBO
+    # =========================================================================
+
+    def marginal(self, eje: str) -> Tuple[list, np.ndarray, np.ndarray]:
+        """
+        Totales del cubo a lo largo de un eje (el resto se suma)
+
+        Returns:
+            (etiquetas, conteos [n, 4], sumas [n, 2]) donde n es el tamaño del
+            eje y etiquetas[i] es el valor de la fila i (día, hora, mes,
+            service_id o tipo), leídos juntos aunque haya un refresco en curso.
+            El resultado se memoriza hasta el siguiente refresco.
+        """
+        with self._lock:
+            if eje not in self._marginales:
+                pos = self.EJES.index(eje)
+                otros = tuple(i for i in range(len(self.EJES)) if i != pos)
+                etiquetas = {
+                    'dia_semana': list(range(7)),
+                    'hora': list(range(24)),
+                    'mes': list(range(1, 13)),
+                    'servicio': list(self.servicios),
+                    'tipo_mascota': list(self.tipos),
+                }[eje]
+                self._marginales[eje] = (etiquetas, self.conteos.sum(axis=otros), self.sumas.sum(axis=otros))
+            return self._marginales[eje]
+
+    def total_citas(self) -> int:
+        """Total de citas activas en el cubo"""
+        _, conteos, _ = self.marginal('dia_semana')
+        return int(conteos[:, 0].sum())
+
+    def medida(self, nombre: str, conteos: np.ndarray, sumas: np.ndarray) -> np.ndarray:
+        """Extrae una medida por nombre de un resultado de marginal()"""
+        if nombre in self.MEDIDAS_CONTEO:
+            return conteos[..., self.MEDIDAS_CONTEO.index(nombre)]
+        return sumas[..., self.MEDIDAS_SUMA.index(nombre)]
+
+    def estado(self) -> Dict:
+        """Información del cubo para diagnóstico"""
+        return {
+            "construido": self.construido,
+            "version": self.version,
+            "ultimo_appointment_id": self.ultimo_id,
+            "forma": list(self.conteos.shape),
+            "memoria_bytes": int(self.conteos.nbytes + self.sumas.nbytes),
+            "total_citas": self.total_citas() if self.construido else 0
+        }
@@ -4,58 +4,604 @@ Conexión y consultas a PostgreSQL del Pet Store
 """
 
 import psycopg2
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterator, List, Tuple
 import logging
-from config import DB_CONFIG
+import threading
+import time
+from cache import CacheTTL
+from config import CACHE_CONFIG, DB_CONFIG
+from trazas import registrar_etapa
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# =============================================================================
+# REGISTRO DE SENTENCIAS PREPARADAS
+# =============================================================================
+# Cada consulta frecuente se registra con un nombre. Al registrarla se le
+# quitan los comentarios y los %s se convierten en $1..$n. La primera vez que
+# se usa en una conexión se envía un PREPARE; después solo viaja
+# EXECUTE nombre(params) y PostgreSQL reutiliza el análisis y el plan.
+# _ejecutar reconoce el texto registrado, así que los llamadores siguen
+# pasando la misma constante/string de siempre.
+
+class Sentencia:
+    """Sentencia registrada y sus contadores de uso"""
+
+    def __init__(self, nombre: str, texto: str):
+        self.nombre = nombre
+        self.texto = limpiar_sql(texto)
+        self.sql_preparado, self.num_parametros = convertir_parametros(self.texto)
+        marcadores = ', '.join(['%s'] * self.num_parametros)
+        self.sql_execute = f"EXECUTE {nombre} ({marcadores})" if marcadores else f"EXECUTE {nombre}"
+        self.llamadas = 0
+        self.errores = 0
+        self.filas = 0
+        self.tiempo_total = 0.0
+        self.tiempo_max = 0.0
+
+    def registrar_llamada(self, segundos: float, filas: int = 0, error: bool = False):
+        with _LOCK_SENTENCIAS:
+            self.llamadas += 1
+            self.errores += int(error)
+            self.filas += filas
+            self.tiempo_total += segundos
+            self.tiempo_max = max(self.tiempo_max, segundos)
+
+    def estadisticas(self) -> Dict:
+        return {
+            "sentencia": self.nombre,
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "filas": self.filas,
+            "tiempo_total_ms": round(self.tiempo_total * 1000, 3),
+            "tiempo_promedio_ms": round(self.tiempo_total * 1000 / self.llamadas, 3) if self.llamadas else 0.0,
+            "tiempo_max_ms": round(self.tiempo_max * 1000, 3)
+        }
+
+
+def limpiar_sql(texto: str) -> str:
+    """Quita comentarios (-- y /* */) fuera de literales, espacios sobrantes y el ';' final"""
+    resultado = []
+    i, n = 0, len(texto)
+    while i < n:
+        c = texto[i]
+        if c in ("'", '"'):
+            # Literal o identificador entre comillas: se copia tal cual ('' escapa la comilla)
+            fin = i + 1
+            while fin < n:
+                if texto[fin] == c:
+                    if fin + 1 < n and texto[fin + 1] == c:
+                        fin += 2
+                        continue
+                    break
+                fin += 1
+            resultado.append(texto[i:fin + 1])
+            i = fin + 1
+        elif texto.startswith('--', i):
+            fin = texto.find('\n', i)
+            i = n if fin == -1 else fin
+        elif texto.startswith('/*', i):
+            fin = texto.find('*/', i + 2)
+            i = n if fin == -1 else fin + 2
+        else:
+            resultado.append(c)
+            i += 1
+    lineas = [linea.rstrip() for linea in ''.join(resultado).strip().splitlines()]
+    return '\n'.join(linea for linea in lineas if linea.strip()).rstrip(';').rstrip()
+
+
+def convertir_parametros(texto: str) -> Tuple[str, int]:
+    """Convierte los marcadores de psycopg2 (%s, %%) al formato de PREPARE ($1..$n, %)"""
+    partes = []
+    contador = 0
+    i = 0
+    while i < len(texto):
+        if texto.startswith('%s', i):
+            contador += 1
+            partes.append(f'${contador}')
+            i += 2
+        elif texto.startswith('%%', i):
+            partes.append('%')
+            i += 2
+        else:
+            partes.append(texto[i])
+            i += 1
+    return ''.join(partes), contador
+
+
+_LOCK_SENTENCIAS = threading.Lock()
+# texto original -> Sentencia (el string constante se busca por igualdad, su hash queda en caché)
+SENTENCIAS: Dict[str, Sentencia] = {}
+# Consultas enviadas como texto sin registrar (se contabilizan juntas)
+SENTENCIA_SIN_REGISTRAR = Sentencia('sin_registrar', '')
+
+
+def registrar_sentencia(nombre: str, texto: str) -> str:
+    """
+    Registra una consulta para ejecutarla como sentencia preparada
+    
+    Returns:
+        El mismo texto, para usarlo como constante: QUERY_X = registrar_sentencia('x', "SELECT ...")
+    """
+    if texto not in SENTENCIAS:
+        with _LOCK_SENTENCIAS:
+            if any(s.nombre == nombre for s in SENTENCIAS.values()):
+                raise ValueError(f"Ya existe una sentencia registrada como '{nombre}'")
+            SENTENCIAS[texto] = Sentencia(nombre, texto)
+    return texto
+
+
+def sql_registrado(texto: str) -> str:
+    """Texto sin comentarios si la consulta está registrada (para cursores con nombre, EXPLAIN, etc.)"""
+    sentencia = SENTENCIAS.get(texto)
+    return sentencia.texto if sentencia is not None else texto
+
+
+def estadisticas_sentencias() -> List[Dict]:
+    """Llamadas y tiempos por sentencia, ordenadas por tiempo total"""
+    todas = list(SENTENCIAS.values()) + [SENTENCIA_SIN_REGISTRAR]
+    return sorted((s.estadisticas() for s in todas if s.llamadas),
+                  key=lambda x: x['tiempo_total_ms'], reverse=True)
+
+
+# Citas que cuenta la analítica de citas, tanto en SQL (obtener_dias_con_mas_atencion,
+# obtener_horas_pico, ...) como en el cubo en memoria (cubo_citas.py): activas y con
+# servicio, mascota y cliente existentes. Así /api/analisis/* da lo mismo con y sin cubo
+FROM_CITAS_ANALITICA = """FROM appointment a
+JOIN service s ON a.service_id = s.service_id
+JOIN pet p ON a.pet_id = p.pet_id
+JOIN client c ON a.client_id = c.client_id
+WHERE a.activo = true"""
+
+
+# =============================================================================
+# DATASET PARA MACHINE LEARNING
+# =============================================================================
+# Consulta que obtiene todos los datos necesarios para machine learning.
+# La usan obtener_dataset_completo (DataFrame) y la exportación por lotes.
+
+QUERY_DATASET_COMPLETO = registrar_sentencia('dataset_completo', """
+SELECT 
+    -- Selecciono los identificadores únicos de cada entidad
+    a.appointment_id,  -- ID único de la cita para rastrear cada registro
+    a.pet_id,  -- ID de la mascota para relacionar con su información
+    a.client_id,  -- ID del cliente dueño de la mascota
+    a.service_id,  -- ID del servicio contratado
+    
+    -- Extraigo características temporales que son importantes para predecir patrones
+    a.fecha_hora AS fecha_cita,  -- Fecha y hora completa de la cita
+    EXTRACT(YEAR FROM a.fecha_hora) AS año,  -- Año de la cita para análisis de tendencias anuales
+    EXTRACT(MONTH FROM a.fecha_hora) AS mes,  -- Mes (1-12) para identificar estacionalidad
+    EXTRACT(DAY FROM a.fecha_hora) AS dia,  -- Día del mes (1-31)
+    EXTRACT(DOW FROM a.fecha_hora) AS dia_semana,  -- Día de la semana (0-6) para patrones semanales
+    EXTRACT(HOUR FROM a.fecha_hora) AS hora,  -- Hora del día (0-23) para identificar horas pico
+    EXTRACT(WEEK FROM a.fecha_hora) AS semana_del_año,  -- Número de semana del año (1-52)
+    
+    -- Obtengo información del servicio que impacta en el análisis
+    s.nombre AS servicio,  -- Nombre descriptivo del servicio (baño, vacuna, consulta, etc.)
+    s.precio AS precio_servicio,  -- Precio del servicio como feature económico
+    s.duracion_minutos,  -- Duración estimada para planificación de recursos
+    
+    -- Extraigo características de la mascota que son relevantes para predicciones
+    p.tipo AS tipo_mascota,  -- Tipo de mascota (perro, gato, conejo, etc.)
+    p.raza,  -- Raza específica de la mascota
+    p.edad AS edad_mascota,  -- Edad en años, importante para tipos de servicios
+    p.sexo AS sexo_mascota,  -- Sexo de la mascota
+    
+    -- Obtengo el estado de la cita que usaremos como variable objetivo en ML
+    a.estado,  -- Estado actual de la cita (COMPLETADA, CANCELADA, PROGRAMADA, etc.)
+    CASE WHEN a.estado = 'COMPLETADA' THEN 1 ELSE 0 END AS asistio,  -- Variable binaria: 1 si asistió, 0 si no
+    CASE WHEN a.estado = 'CANCELADA' THEN 1 ELSE 0 END AS cancelo  -- Variable binaria: 1 si canceló, 0 si no
+    
+FROM appointment a  -- Tabla principal de citas
+JOIN service s ON a.service_id = s.service_id  -- Uno con servicios para obtener detalles del servicio
+JOIN pet p ON a.pet_id = p.pet_id  -- Uno con mascotas para obtener características de la mascota
+JOIN client c ON a.client_id = c.client_id  -- Uno con clientes para validar que el cliente existe
+WHERE a.activo = true  -- Solo incluyo citas activas, excluyendo registros eliminados
+ORDER BY a.fecha_hora DESC;  -- Ordeno por fecha descendente para tener las más recientes primero
+""")
+
+# =============================================================================
+# ESTADÍSTICAS GENERALES
+# =============================================================================
+# Mascotas, clientes, citas y servicios activos en un solo viaje a la base de datos
+
+QUERY_ESTADISTICAS_GENERALES = registrar_sentencia('estadisticas_generales', """
+SELECT
+    (SELECT COUNT(*) FROM pet WHERE activo = true) AS total_mascotas,
+    (SELECT COUNT(*) FROM client WHERE activo = true) AS total_clientes,
+    (SELECT COUNT(*) FROM appointment WHERE activo = true) AS total_citas,
+    (SELECT COUNT(*) FROM service WHERE activo = true) AS total_servicios;
+""")
+
+# =============================================================================
+# CONSULTAS FRECUENTES DE MÉTRICAS
+# =============================================================================
+# Los filtros de fecha usan rangos semiabiertos [inicio, fin) sobre la columna
+# sin transformar, para que PostgreSQL pueda usar los índices de
+# migraciones/001_indices_metricas.sql (DATE(col) o EXTRACT(...) lo impiden).
+# verificar_indices.py ejecuta EXPLAIN sobre estas mismas constantes.
+
+QUERY_CITAS_HOY = registrar_sentencia('citas_hoy', """
+SELECT 
+    a.appointment_id,
+    a.fecha_hora,
+    EXTRACT(HOUR FROM a.fecha_hora) AS hora,
+    p.nombre AS mascota,
+    p.tipo AS tipo_mascota,
+    c.name AS cliente,
+    c.telefono,
+    s.nombre AS servicio,
+    s.precio,
+    a.estado,
+    u.name AS veterinario
+FROM appointment a
+JOIN pet p ON a.pet_id = p.pet_id
+JOIN client c ON a.client_id = c.client_id
+JOIN service s ON a.service_id = s.service_id
+LEFT JOIN "user" u ON a.veterinarian_id = u.user_id
+WHERE a.fecha_hora >= CURRENT_DATE
+  AND a.fecha_hora < CURRENT_DATE + INTERVAL '1 day'
+  AND a.activo = true
+ORDER BY a.fecha_hora;
+""")
+
+QUERY_VENTAS_DIA = registrar_sentencia('ventas_dia', """
+SELECT 
+    COUNT(DISTINCT v.venta_id) AS total_transacciones,
+    COUNT(dv.detalle_id) AS total_items_vendidos,
+    COALESCE(SUM(dv.cantidad), 0) AS cantidad_productos,
+    COALESCE(SUM(dv.subtotal), 0) AS total_ventas,
+    COALESCE(AVG(dv.precio_unitario), 0) AS ticket_promedio
+FROM venta v
+JOIN detalle_venta dv ON v.venta_id = dv.venta_id
+WHERE v.fecha_venta >= CURRENT_DATE
+  AND v.fecha_venta < CURRENT_DATE + INTERVAL '1 day'
+  AND v.activo = true;
+""")
+
+QUERY_VENTAS_MES = registrar_sentencia('ventas_mes', """
+SELECT 
+    COUNT(DISTINCT v.venta_id) AS total_transacciones,
+    COUNT(dv.detalle_id) AS total_items_vendidos,
+    COALESCE(SUM(dv.cantidad), 0) AS cantidad_productos,
+    COALESCE(SUM(dv.subtotal), 0) AS total_ventas,
+    COALESCE(AVG(dv.precio_unitario), 0) AS ticket_promedio,
+    COUNT(DISTINCT v.client_id) AS clientes_unicos
+FROM venta v
+JOIN detalle_venta dv ON v.venta_id = dv.venta_id
+WHERE v.fecha_venta >= DATE_TRUNC('month', CURRENT_DATE)
+  AND v.fecha_venta < DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month'
+  AND v.activo = true;
+""")
+
+# Parámetro: días de anticipación (entero). El intervalo se arma en el servidor con
+# make_interval, así el texto no cambia con `dias` y la sentencia preparada se reutiliza.
+QUERY_PRODUCTOS_PROXIMOS_VENCER = registrar_sentencia('productos_proximos_vencer', """
+SELECT 
+    p.producto_id,
+    p.nombre AS producto,
+    p.categoria,
+    p.fecha_vencimiento,
+    p.stock_actual,
+    p.precio_venta,
+    (p.fecha_vencimiento - CURRENT_DATE) AS dias_hasta_vencer,
+    (p.stock_actual * p.precio_venta) AS valor_inventario
+FROM producto p
+WHERE p.fecha_vencimiento >= CURRENT_DATE
+  AND p.fecha_vencimiento <= CURRENT_DATE + make_interval(days => %s)
+  AND p.activo = true
+  AND p.stock_actual > 0
+ORDER BY p.fecha_vencimiento ASC;
+""")
+
+QUERY_BAJO_INVENTARIO = registrar_sentencia('bajo_inventario', """
+SELECT 
+    p.producto_id,
+    p.nombre AS producto,
+    p.categoria,
+    p.stock_actual,
+    p.stock_minimo,
+    p.stock_maximo,
+    (p.stock_minimo - p.stock_actual) AS unidades_faltantes,
+    ROUND((p.stock_actual::numeric / NULLIF(p.stock_minimo, 0)) * 100, 2) AS porcentaje_stock,
+    p.precio_compra,
+    ((p.stock_minimo - p.stock_actual) * p.precio_compra) AS costo_reposicion,
+    p.proveedor
+FROM producto p
+WHERE p.stock_actual < p.stock_minimo
+  AND p.activo = true
+ORDER BY porcentaje_stock ASC, p.stock_actual ASC;
+""")
+
+QUERY_COMPARATIVA_VENTAS_MENSUAL = registrar_sentencia('comparativa_ventas_mensual', """
+WITH ventas_mes_actual AS (
+    SELECT 
+        COUNT(DISTINCT v.venta_id) AS transacciones,
+        COALESCE(SUM(dv.subtotal), 0) AS total_ventas
+    FROM venta v
+    JOIN detalle_venta dv ON v.venta_id = dv.venta_id
+    WHERE v.fecha_venta >= DATE_TRUNC('month', CURRENT_DATE)
+      AND v.fecha_venta < DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month'
+      AND v.activo = true
+),
+ventas_mes_anterior AS (
+    SELECT 
+        COUNT(DISTINCT v.venta_id) AS transacciones,
+        COALESCE(SUM(dv.subtotal), 0) AS total_ventas
+    FROM venta v
+    JOIN detalle_venta dv ON v.venta_id = dv.venta_id
+    WHERE v.fecha_venta >= DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '1 month'
+      AND v.fecha_venta < DATE_TRUNC('month', CURRENT_DATE)
+      AND v.activo = true
+)
+SELECT 
+    ma.total_ventas AS ventas_mes_actual,
+    ma.transacciones AS transacciones_mes_actual,
+    mp.total_ventas AS ventas_mes_anterior,
+    mp.transacciones AS transacciones_mes_anterior,
+    (ma.total_ventas - mp.total_ventas) AS diferencia_ventas,
+    CASE 
+        WHEN mp.total_ventas > 0 THEN
+            ROUND(((ma.total_ventas - mp.total_ventas) / mp.total_ventas) * 100, 2)
+        ELSE 0
+    END AS porcentaje_cambio
+FROM ventas_mes_actual ma, ventas_mes_anterior mp;
+""")
+
+# Nombre -> (consulta, parámetros de ejemplo) para el verificador de índices
+CONSULTAS_METRICAS = {
+    'citas_hoy': (QUERY_CITAS_HOY, None),
+    'ventas_dia': (QUERY_VENTAS_DIA, None),
+    'ventas_mes': (QUERY_VENTAS_MES, None),
+    'productos_proximos_vencer': (QUERY_PRODUCTOS_PROXIMOS_VENCER, (30,)),
+    'alerta_bajo_inventario': (QUERY_BAJO_INVENTARIO, None),
+    'comparativa_ventas_mensual': (QUERY_COMPARATIVA_VENTAS_MENSUAL, None),
+}
+
+
+# OID de PostgreSQL -> dtype de NumPy para consultar_columnas
+_OID_ENTEROS = {20, 21, 23}            # bigint, smallint, integer
+_OID_FLOTANTES = {700, 701, 1700}      # real, double precision, numeric
+
+
+def _a_columna_numpy(valores: tuple, oid: int) -> np.ndarray:
+    """Convierte los valores de una columna en un arreglo NumPy según su tipo"""
+    if oid in _OID_ENTEROS and None not in valores:
+        return np.fromiter(valores, dtype=np.int64, count=len(valores))
+    if oid in _OID_ENTEROS or oid in _OID_FLOTANTES:
+        return np.fromiter((np.nan if v is None else float(v) for v in valores),
+                           dtype=np.float64, count=len(valores))
+    arreglo = np.empty(len(valores), dtype=object)
+    for i, valor in enumerate(valores):
+        arreglo[i] = valor
+    return arreglo
+
 class PetStoreDatabase:
     """Gestiona la conexión y consultas a la base de datos PostgreSQL"""
     
     def __init__(self):
         self.conn = None
+        # Una consulta a la vez sobre la conexión (psycopg2 ya las serializa): así el
+        # PREPARE de una sentencia y su registro en _preparadas no se cruzan entre hilos
+        self._lock_conexion = threading.RLock()
+        self._preparadas = set()
+        # Contadores para /metrics: consultas en ejecución, conexiones abiertas y errores
+        self._lock_uso = threading.Lock()
+        self.consultas_en_curso = 0
+        self.conexiones_abiertas = 0
+        self.errores_consulta = 0
+        # Resultados por cantidad de días (el dashboard y el chatbot piden siempre 30 o 7)
+        self.cache_vencimientos = CacheTTL('productos_proximos_vencer', CACHE_CONFIG['vencimientos_ttl'],
+                                           CACHE_CONFIG['vencimientos_max_entradas'])
         self.conectar()
     
     def conectar(self):
-        """Establece conexión con PostgreSQL"""
+        """Establece conexión con PostgreSQL (cierra la anterior si la había)"""
         try:
-            self.conn = psycopg2.connect(**DB_CONFIG)
-            logger.info(" Conexión exitosa a PostgreSQL")
+            conn = psycopg2.connect(**DB_CONFIG)
+            # Solo lecturas: en autocommit cada consulta termina su transacción
+            # y la conexión no queda "idle in transaction" entre peticiones
+            conn.autocommit = True
         except Exception as e:
             logger.error(f" Error de conexión: {e}")
             raise
+        with self._lock_conexion:
+            anterior, self.conn = self.conn, conn
+            # Las sentencias preparadas viven en la sesión: una conexión nueva empieza sin ninguna
+            self._preparadas = set()
+        with self._lock_uso:
+            self.conexiones_abiertas += 1
+        if anterior is not None and not anterior.closed:
+            try:
+                anterior.close()
+            except Exception as e:
+                logger.warning(f"  Error cerrando la conexión anterior: {e}")
+        logger.info(" Conexión exitosa a PostgreSQL")
     
-    def ejecutar_query(self, query: str, params: tuple = None) -> pd.DataFrame:
-        """Ejecuta una consulta y retorna un DataFrame"""
+    # =========================================================================
+    # EJECUCIÓN DE CONSULTAS
+    # =========================================================================
+    # Niveles de resultado, del más barato al más costoso:
+    #   consultar_valor    -> un escalar (COUNT, SUM, ...)
+    #   consultar_fila     -> dict de una fila
+    #   consultar_filas    -> lista de dicts
+    #   consultar_columnas -> dict columna -> np.ndarray (resultados grandes)
+    #   ejecutar_query     -> DataFrame, solo cuando el llamador lo necesita
+    
+    def _ejecutar(self, query: str, params: tuple = None) -> Tuple[List[str], List[int], List[tuple]]:
+        """
+        Ejecuta una consulta con el cursor de psycopg2 y retorna
+        (columnas, tipos_oid, filas). Reintenta una vez reconectando.
+        
+        Si `query` es el texto de una sentencia registrada se ejecuta por
+        nombre (PREPARE la primera vez en esta conexión, luego EXECUTE).
+        """
+        sentencia = SENTENCIAS.get(query, SENTENCIA_SIN_REGISTRAR)
+        with self._lock_uso:
+            self.consultas_en_curso += 1
         try:
-            # Verificar si la conexión está cerrada y reconectar
-            if self.conn is None or self.conn.closed:
-                logger.warning("  Conexión cerrada, reconectando...")
-                self.conectar()
-            
-            if params:
-                df = pd.read_sql(query, self.conn, params=params)
-            else:
-                df = pd.read_sql(query, self.conn)
-            return df
+            for intento in range(2):
+                inicio = time.perf_counter()
+                usada = None
+                try:
+                    with self._lock_conexion:
+                        # Verificar si la conexión está cerrada y reconectar
+                        if self.conn is None or self.conn.closed:
+                            logger.warning("  Conexión cerrada, reconectando...")
+                            self.conectar()
+                        usada = self.conn
+                    
+                        with usada.cursor() as cursor:
+                            if sentencia is SENTENCIA_SIN_REGISTRAR:
+                                cursor.execute(query, params)
+                            else:
+                                if sentencia.nombre not in self._preparadas:
+                                    cursor.execute(f"PREPARE {sentencia.nombre} AS {sentencia.sql_preparado}")
+                                    self._preparadas.add(sentencia.nombre)
+                                cursor.execute(sentencia.sql_execute, params)
+                        
+                            if cursor.description is None:
+                                resultado = [], [], []
+                            else:
+                                columnas = [col.name for col in cursor.description]
+                                tipos = [col.type_code for col in cursor.description]
+                                resultado = columnas, tipos, cursor.fetchall()
+                    duracion = time.perf_counter() - inicio
+                    sentencia.registrar_llamada(duracion, len(resultado[2]))
+                    registrar_etapa(f"db.{sentencia.nombre}", duracion)
+                    return resultado
+                except Exception as e:
+                    duracion = time.perf_counter() - inicio
+                    sentencia.registrar_llamada(duracion, error=True)
+                    with self._lock_uso:
+                        self.errores_consulta += 1
+                    registrar_etapa(f"db.{sentencia.nombre}", duracion)
+                    if intento == 1:
+                        raise
+                    logger.error(f" Error ejecutando query ({sentencia.nombre}): {e}")
+                    # Intentar reconectar una vez más (la conexión nueva vuelve a preparar las sentencias).
+                    # Si otro hilo ya reemplazó la conexión que falló, se reintenta con la suya
+                    with self._lock_conexion:
+                        if self.conn is usada:
+                            logger.info(" Intentando reconectar...")
+                            self.conectar()
+        finally:
+            with self._lock_uso:
+                self.consultas_en_curso -= 1
+    
+    def consultar_valor(self, query: str, params: tuple = None, defecto=None):
+        """Primer valor de la primera fila (o `defecto` si no hay filas o hay error)"""
+        try:
+            _, _, filas = self._ejecutar(query, params)
+            return filas[0][0] if filas and filas[0][0] is not None else defecto
         except Exception as e:
-            logger.error(f" Error ejecutando query: {e}")
-            # Intentar reconectar una vez más
-            try:
-                logger.info(" Intentando reconectar...")
-                self.conectar()
-                if params:
-                    df = pd.read_sql(query, self.conn, params=params)
-                else:
-                    df = pd.read_sql(query, self.conn)
-                return df
-            except Exception as e2:
-                logger.error(f" Error en segundo intento: {e2}")
-                return pd.DataFrame()
+            logger.error(f" Error en segundo intento: {e}")
+            return defecto
+    
+    def consultar_fila(self, query: str, params: tuple = None, estricto: bool = False) -> Optional[Dict]:
+        """Primera fila como dict (None si no hay filas o hay error; con `estricto` el error se propaga)"""
+        try:
+            columnas, _, filas = self._ejecutar(query, params)
+            return dict(zip(columnas, filas[0])) if filas else None
+        except Exception as e:
+            if estricto:
+                raise
+            logger.error(f" Error en segundo intento: {e}")
+            return None
+    
+    def consultar_filas(self, query: str, params: tuple = None, estricto: bool = False) -> List[Dict]:
+        """Todas las filas como lista de dicts (vacía si hay error; con `estricto` el error se propaga)"""
+        try:
+            columnas, _, filas = self._ejecutar(query, params)
+            return [dict(zip(columnas, fila)) for fila in filas]
+        except Exception as e:
+            if estricto:
+                raise
+            logger.error(f" Error en segundo intento: {e}")
+            return []
+    
+    def consultar_columnas(self, query: str, params: tuple = None, estricto: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Resultado por columnas en arreglos NumPy (vacío si hay error; con
+        `estricto` el error se propaga)
+        
+        Enteros -> int64 (float64 si hay nulos), numeric/real -> float64,
+        el resto queda como arreglo de objetos.
+        """
+        try:
+            columnas, tipos, filas = self._ejecutar(query, params)
+        except Exception as e:
+            if estricto:
+                raise
+            logger.error(f" Error en segundo intento: {e}")
+            return {}
+        
+        valores_por_columna = list(zip(*filas)) if filas else [()] * len(columnas)
+        return {
+            col: _a_columna_numpy(valores, oid)
+            for col, oid, valores in zip(columnas, tipos, valores_por_columna)
+        }
+    
+    def ejecutar_query(self, query: str, params: tuple = None, estricto: bool = False) -> pd.DataFrame:
+        """Ejecuta una consulta y retorna un DataFrame (vacío si hay error; con `estricto` el error se propaga)"""
+        try:
+            columnas, _, filas = self._ejecutar(query, params)
+        except Exception as e:
+            if estricto:
+                raise
+            logger.error(f" Error en segundo intento: {e}")
+            return pd.DataFrame()
+        # coerce_float convierte Decimal (numeric) a float, como hacía pd.read_sql
+        return pd.DataFrame.from_records(filas, columns=columnas, coerce_float=True)
+    
+    def ping(self) -> bool:
+        """Verifica que la conexión responde con un SELECT 1 (no toca tablas)"""
+        try:
+            self._ejecutar("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"  La base de datos no responde: {e}")
+            return False
+    
+    def iterar_consulta(self, query: str, params: tuple = None, tamano_lote: int = 5000,
+                        nombre_cursor: str = 'exportacion') -> Iterator[Tuple[List[str], List[int], List[tuple]]]:
+        """
+        Recorre una consulta por lotes con un cursor del lado del servidor
+        
+        Usa una conexión propia (el cursor con nombre mantiene una transacción
+        abierta mientras dure el recorrido), así la memoria queda acotada a
+        `tamano_lote` filas sin importar el tamaño del resultado.
+        
+        Yields:
+            (columnas, tipos_oid, filas) por cada lote. Sin filas se entrega
+            un único lote vacío con las columnas, para que la exportación
+            tenga encabezado o esquema
+        """
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            with conn.cursor(name=nombre_cursor) as cursor:
+                cursor.itersize = tamano_lote
+                cursor.execute(sql_registrado(query), params)
+                columnas = tipos = None
+                lotes = 0
+                while True:
+                    filas = cursor.fetchmany(tamano_lote)
+                    if columnas is None and cursor.description is not None:
+                        columnas = [col.name for col in cursor.description]
+                        tipos = [col.type_code for col in cursor.description]
+                    if not filas:
+                        if lotes == 0 and columnas is not None:
+                            yield columnas, tipos, []
+                        break
+                    lotes += 1
+                    yield columnas, tipos, filas
+        finally:
+            conn.close()
     
     # =========================================================================
     # CONSULTAS PARA ANÁLISIS PREDICTIVO
@@ -66,75 +612,45 @@ class PetStoreDatabase:
         Obtiene dataset completo para Machine Learning
         Incluye: citas, mascotas, servicios, clientes
         """
-        # Construyo una consulta SQL compleja que obtiene todos los datos necesarios para machine learning
-        query = """
-        SELECT 
-            -- Selecciono los identificadores únicos de cada entidad
-            a.appointment_id,  -- ID único de la cita para rastrear cada registro
-            a.pet_id,  -- ID de la mascota para relacionar con su información
-            a.client_id,  -- ID del cliente dueño de la mascota
-            a.service_id,  -- ID del servicio contratado
-            
-            -- Extraigo características temporales que son importantes para predecir patrones
-            a.fecha_hora AS fecha_cita,  -- Fecha y hora completa de la cita
-            EXTRACT(YEAR FROM a.fecha_hora) AS año,  -- Año de la cita para análisis de tendencias anuales
-            EXTRACT(MONTH FROM a.fecha_hora) AS mes,  -- Mes (1-12) para identificar estacionalidad
-            EXTRACT(DAY FROM a.fecha_hora) AS dia,  -- Día del mes (1-31)
-            EXTRACT(DOW FROM a.fecha_hora) AS dia_semana,  -- Día de la semana (0-6) para patrones semanales
-            EXTRACT(HOUR FROM a.fecha_hora) AS hora,  -- Hora del día (0-23) para identificar horas pico
-            EXTRACT(WEEK FROM a.fecha_hora) AS semana_del_año,  -- Número de semana del año (1-52)
-            
-            -- Obtengo información del servicio que impacta en el análisis
-            s.nombre AS servicio,  -- Nombre descriptivo del servicio (baño, vacuna, consulta, etc.)
-            s.precio AS precio_servicio,  -- Precio del servicio como feature económico
-            s.duracion_minutos,  -- Duración estimada para planificación de recursos
-            
-            -- Extraigo características de la mascota que son relevantes para predicciones
-            p.tipo AS tipo_mascota,  -- Tipo de mascota (perro, gato, conejo, etc.)
-            p.raza,  -- Raza específica de la mascota
-            p.edad AS edad_mascota,  -- Edad en años, importante para tipos de servicios
-            p.sexo AS sexo_mascota,  -- Sexo de la mascota
-            
-            -- Obtengo el estado de la cita que usaremos como variable objetivo en ML
-            a.estado,  -- Estado actual de la cita (COMPLETADA, CANCELADA, PROGRAMADA, etc.)
-            CASE WHEN a.estado = 'COMPLETADA' THEN 1 ELSE 0 END AS asistio,  -- Variable binaria: 1 si asistió, 0 si no
-            CASE WHEN a.estado = 'CANCELADA' THEN 1 ELSE 0 END AS cancelo  -- Variable binaria: 1 si canceló, 0 si no
-            
-        FROM appointment a  -- Tabla principal de citas
-        JOIN service s ON a.service_id = s.service_id  -- Uno con servicios para obtener detalles del servicio
-        JOIN pet p ON a.pet_id = p.pet_id  -- Uno con mascotas para obtener características de la mascota
-        JOIN client c ON a.client_id = c.client_id  -- Uno con clientes para validar que el cliente existe
-        WHERE a.activo = true  -- Solo incluyo citas activas, excluyendo registros eliminados
-        ORDER BY a.fecha_hora DESC;  -- Ordeno por fecha descendente para tener las más recientes primero
-        """
-        
         # Registro en el log que estoy obteniendo el dataset para machine learning
         logger.info(" Obteniendo dataset completo para ML...")
         # Ejecuto la consulta SQL y obtengo los resultados en un DataFrame de pandas
-        df = self.ejecutar_query(query)
+        df = self.ejecutar_query(QUERY_DATASET_COMPLETO)
         # Registro cuántos registros obtuve para validar la cantidad de datos disponibles
         logger.info(f" Dataset obtenido: {len(df)} registros")
         # Retorno el DataFrame completo listo para ser usado en modelos de machine learning
         return df
     
+    def iterar_dataset_completo(self, tamano_lote: int = 5000) -> Iterator[Tuple[List[str], List[int], List[tuple]]]:
+        """Dataset completo de ML por lotes (ver iterar_consulta)"""
+        logger.info(f" Exportando dataset completo en lotes de {tamano_lote}...")
+        return self.iterar_consulta(QUERY_DATASET_COMPLETO, tamano_lote=tamano_lote, nombre_cursor='dataset_completo')
+    
     def obtener_tipos_mascota_mas_comunes(self) -> pd.DataFrame:
         """Obtiene estadísticas de tipos de mascotas"""
         # Creo una consulta SQL compleja que analiza los diferentes tipos de mascotas
-        query = """
+        query = registrar_sentencia('tipos_mascota', f"""
         SELECT 
-            p.tipo AS tipo_mascota,  -- Extraigo el tipo de mascota (perro, gato, conejo, etc.)
-            COUNT(DISTINCT p.pet_id) AS total_mascotas,  -- Cuento cuántas mascotas únicas hay de cada tipo
-            COUNT(a.appointment_id) AS total_citas,  -- Cuento el total de citas que ha tenido este tipo de mascota
-            ROUND(COUNT(a.appointment_id)::numeric / 
-                  NULLIF(COUNT(DISTINCT p.pet_id), 0), 2) AS promedio_citas_por_mascota,  -- Calculo el promedio de citas por mascota de este tipo
-            ROUND(COUNT(DISTINCT p.pet_id)::numeric * 100.0 / 
+            mt.tipo AS tipo_mascota,  -- Extraigo el tipo de mascota (perro, gato, conejo, etc.)
+            mt.total_mascotas,  -- Cuántas mascotas activas hay de cada tipo
+            COALESCE(ct.total_citas, 0) AS total_citas,  -- Citas de la analítica (FROM_CITAS_ANALITICA) de este tipo
+            ROUND(COALESCE(ct.total_citas, 0)::numeric / 
+                  NULLIF(mt.total_mascotas, 0), 2) AS promedio_citas_por_mascota,  -- Calculo el promedio de citas por mascota de este tipo
+            ROUND(mt.total_mascotas::numeric * 100.0 / 
                   (SELECT COUNT(*) FROM pet WHERE activo = true), 2) AS porcentaje  -- Calculo qué porcentaje representa este tipo del total de mascotas
-        FROM pet p  -- Tabla principal de mascotas
-        LEFT JOIN appointment a ON p.pet_id = a.pet_id AND a.activo = true  -- Uno con las citas para obtener estadísticas de uso
-        WHERE p.activo = true  -- Solo considero mascotas activas en el sistema
-        GROUP BY p.tipo  -- Agrupo los resultados por tipo de mascota para obtener totales
+        FROM (
+            SELECT tipo, COUNT(*) AS total_mascotas  -- Mascotas activas por tipo
+            FROM pet
+            WHERE activo = true
+            GROUP BY tipo
+        ) mt
+        LEFT JOIN (
+            SELECT p.tipo, COUNT(*) AS total_citas  -- Citas por tipo, con los mismos JOIN que el cubo
+            {FROM_CITAS_ANALITICA}
+            GROUP BY p.tipo
+        ) ct ON ct.tipo IS NOT DISTINCT FROM mt.tipo
         ORDER BY total_mascotas DESC;  -- Ordeno de mayor a menor para ver los tipos más comunes primero
-        """
+        """)
         
         # Registro en el log que estoy consultando los tipos de mascotas
         logger.info(" Obteniendo tipos de mascotas...")
@@ -144,7 +660,7 @@ class PetStoreDatabase:
     def obtener_dias_con_mas_atencion(self) -> pd.DataFrame:
         """Obtiene estadísticas por día de la semana"""
         # Construyo una consulta SQL que analiza el comportamiento por día de la semana
-        query = """
+        query = registrar_sentencia('dias_atencion', f"""
         SELECT 
             CASE EXTRACT(DOW FROM a.fecha_hora)  -- Extraigo el día de la semana de la fecha (0-6)
                 WHEN 0 THEN 'Domingo'  -- Convierto el número 0 en el nombre del día
@@ -162,11 +678,10 @@ class PetStoreDatabase:
             ROUND(AVG(EXTRACT(HOUR FROM a.fecha_hora)), 2) AS hora_promedio,  -- Calculo a qué hora promedio se dan las citas ese día
             ROUND(COUNT(CASE WHEN a.estado = 'COMPLETADA' THEN 1 END)::numeric * 100.0 / 
                   NULLIF(COUNT(a.appointment_id), 0), 2) AS tasa_asistencia  -- Calculo el porcentaje de citas completadas vs totales
-        FROM appointment a  -- Consulto la tabla de citas
-        WHERE a.activo = true  -- Solo considero citas activas en el sistema
+        {FROM_CITAS_ANALITICA}  -- Citas activas con servicio, mascota y cliente (igual que el cubo)
         GROUP BY EXTRACT(DOW FROM a.fecha_hora)  -- Agrupo todos los resultados por día de la semana
         ORDER BY numero_dia;  -- Ordeno de domingo a sábado para visualización cronológica
-        """
+        """)
         
         # Registro en el log que estoy obteniendo estadísticas de días
         logger.info(" Obteniendo días con más atención...")
@@ -176,19 +691,17 @@ class PetStoreDatabase:
     def obtener_horas_pico(self) -> pd.DataFrame:
         """Obtiene estadísticas por hora del día"""
         # Creo una consulta SQL para analizar la distribución de citas por hora del día
-        query = """
+        query = registrar_sentencia('horas_pico', f"""
         SELECT 
             EXTRACT(HOUR FROM a.fecha_hora) AS hora,  -- Extraigo solo la hora (0-23) de la fecha y hora de la cita
             COUNT(a.appointment_id) AS total_citas,  -- Cuento cuántas citas hay programadas en esa hora
             COUNT(DISTINCT a.pet_id) AS mascotas_unicas,  -- Cuento cuántas mascotas diferentes han tenido citas en esa hora
             COUNT(DISTINCT a.client_id) AS clientes_unicos,  -- Cuento cuántos clientes distintos visitaron en esa hora
             ROUND(AVG(s.duracion_minutos), 2) AS duracion_promedio  -- Calculo la duración promedio de los servicios en esa hora
-        FROM appointment a  -- Consulto la tabla principal de citas
-        JOIN service s ON a.service_id = s.service_id  -- Uno con servicios para obtener información de duración
-        WHERE a.activo = true  -- Solo considero citas activas en el sistema
+        {FROM_CITAS_ANALITICA}  -- Citas activas con servicio (duración), mascota y cliente (igual que el cubo)
         GROUP BY hora  -- Agrupo todos los resultados por hora del día
         ORDER BY hora;  -- Ordeno cronológicamente de 0 (medianoche) a 23 (11pm)
-        """
+        """)
         
         # Registro en el log que estoy consultando las horas pico
         logger.info("⏰ Obteniendo horas pico...")
@@ -197,7 +710,7 @@ class PetStoreDatabase:
     
     def obtener_servicios_mas_utilizados(self) -> pd.DataFrame:
         """Obtiene ranking de servicios más solicitados"""
-        query = """
+        query = registrar_sentencia('servicios_mas_utilizados', f"""
         SELECT 
             s.service_id,
             s.nombre AS servicio,
@@ -208,19 +721,16 @@ class PetStoreDatabase:
             ROUND(COUNT(CASE WHEN a.estado = 'COMPLETADA' THEN 1 END)::numeric * 100.0 / 
                   NULLIF(COUNT(a.appointment_id), 0), 2) AS tasa_asistencia,
             ROUND(AVG(s.precio), 2) AS precio_promedio
-        FROM appointment a
-        JOIN service s ON a.service_id = s.service_id
-        WHERE a.activo = true
+        {FROM_CITAS_ANALITICA}
         GROUP BY s.service_id, s.nombre, s.precio
         ORDER BY total_citas DESC;
-        """
-        
+        """)
         logger.info(" Obteniendo servicios más utilizados...")
         return self.ejecutar_query(query)
     
     def obtener_razas_por_tipo(self, tipo_mascota: str) -> pd.DataFrame:
         """Obtiene las razas más comunes de un tipo de mascota"""
-        query = """
+        query = registrar_sentencia('razas_por_tipo', """
         SELECT 
             p.raza,
             COUNT(*) AS cantidad,
@@ -232,10 +742,24 @@ class PetStoreDatabase:
         GROUP BY p.raza
         ORDER BY cantidad DESC
         LIMIT 10;
-        """
-        
+        """)
         logger.info(f" Obteniendo razas de {tipo_mascota}...")
         return self.ejecutar_query(query, (tipo_mascota,))
+
+    def contar_citas_por_tipo_mascota(self) -> pd.DataFrame:
+        """Cuenta las citas activas por tipo de mascota (agregado en SQL)"""
+        query = registrar_sentencia('citas_por_tipo_mascota', f"""
+        SELECT
+            p.tipo AS tipo_mascota,
+            COUNT(a.appointment_id) AS total_citas
+        {FROM_CITAS_ANALITICA}
+          AND p.tipo IS NOT NULL
+        GROUP BY p.tipo
+        ORDER BY total_citas DESC;
+        """)
+
+        logger.info(" Contando citas por tipo de mascota...")
+        return self.ejecutar_query(query)
     
     # =========================================================================
     # CONSULTAS PARA CHATBOT
@@ -243,7 +767,7 @@ class PetStoreDatabase:
     
     def buscar_mascota_por_nombre(self, nombre: str) -> pd.DataFrame:
         """Busca mascotas por nombre"""
-        query = """
+        query = registrar_sentencia('buscar_mascota', """
         SELECT 
             p.pet_id,
             p.nombre,
@@ -259,13 +783,13 @@ class PetStoreDatabase:
         JOIN client c ON po.client_id = c.client_id
         WHERE LOWER(p.nombre) LIKE LOWER(%s) AND p.activo = true
         LIMIT 10;
-        """
+        """)
         
         return self.ejecutar_query(query, (f'%{nombre}%',))
     
     def obtener_historial_mascota(self, pet_id: int) -> pd.DataFrame:
         """Obtiene historial médico de una mascota"""
-        query = """
+        query = registrar_sentencia('historial_mascota', """
         SELECT 
             pmh.fecha_atencion,
             s.nombre as servicio,
@@ -279,13 +803,13 @@ class PetStoreDatabase:
         WHERE pmh.pet_id = %s AND pmh.activo = true
         ORDER BY pmh.fecha_atencion DESC
         LIMIT 20;
-        """
+        """)
         
         return self.ejecutar_query(query, (pet_id,))
     
     def obtener_proximas_citas_mascota(self, pet_id: int) -> pd.DataFrame:
         """Obtiene próximas citas de una mascota"""
-        query = """
+        query = registrar_sentencia('proximas_citas_mascota', """
         SELECT 
             a.fecha_hora,
             s.nombre as servicio,
@@ -301,13 +825,13 @@ class PetStoreDatabase:
           AND a.activo = true
         ORDER BY a.fecha_hora
         LIMIT 10;
-        """
+        """)
         
         return self.ejecutar_query(query, (pet_id,))
     
     def obtener_vacunas_mascota(self, pet_id: int) -> pd.DataFrame:
         """Obtiene historial de vacunación"""
-        query = """
+        query = registrar_sentencia('vacunas_mascota', """
         SELECT 
             v.vaccine_name as vacuna,
             v.application_date as fecha_aplicacion,
@@ -320,13 +844,13 @@ class PetStoreDatabase:
         WHERE v.pet_id = %s AND v.activo = true
         ORDER BY v.application_date DESC
         LIMIT 20;
-        """
+        """)
         
         return self.ejecutar_query(query, (pet_id,))
     
     def buscar_cliente_por_correo(self, correo: str) -> pd.DataFrame:
         """Busca cliente por correo electrónico"""
-        query = """
+        query = registrar_sentencia('buscar_cliente', """
         SELECT 
             client_id,
             name,
@@ -335,13 +859,13 @@ class PetStoreDatabase:
             direccion
         FROM client
         WHERE LOWER(correo) = LOWER(%s) AND activo = true;
-        """
+        """)
         
         return self.ejecutar_query(query, (correo,))
     
     def obtener_mascotas_cliente(self, client_id: int) -> pd.DataFrame:
         """Obtiene todas las mascotas de un cliente"""
-        query = """
+        query = registrar_sentencia('mascotas_cliente', """
         SELECT 
             p.pet_id,
             p.nombre,
@@ -354,13 +878,13 @@ class PetStoreDatabase:
         JOIN pet_owner po ON p.pet_id = po.pet_id
         WHERE po.client_id = %s AND p.activo = true
         ORDER BY p.nombre;
-        """
+        """)
         
         return self.ejecutar_query(query, (client_id,))
     
     def obtener_servicios_disponibles(self) -> pd.DataFrame:
         """Lista todos los servicios disponibles"""
-        query = """
+        query = registrar_sentencia('servicios_disponibles', """
         SELECT 
             service_id,
             nombre,
@@ -370,7 +894,7 @@ class PetStoreDatabase:
         FROM service
         WHERE activo = true
         ORDER BY nombre;
-        """
+        """)
         
         return self.ejecutar_query(query)
     
@@ -378,41 +902,19 @@ class PetStoreDatabase:
     # ESTADÍSTICAS GENERALES
     # =========================================================================
     
-    def obtener_estadisticas_generales(self) -> Dict:
-        """Obtiene estadísticas generales del sistema"""
-        # Creo un diccionario vacío donde almacenaré todas las métricas del sistema
-        stats = {}
-        
-        # Consulto cuántas mascotas activas hay registradas en la base de datos
-        query_mascotas = "SELECT COUNT(*) as total FROM pet WHERE activo = true"
-        # Ejecuto la consulta y obtengo el resultado en un DataFrame de pandas
-        df_mascotas = self.ejecutar_query(query_mascotas)
-        # Extraigo el número total de mascotas, usando 0 si no hay resultados
-        stats['total_mascotas'] = int(df_mascotas.iloc[0]['total']) if not df_mascotas.empty else 0
-        
-        # Consulto la cantidad de clientes activos registrados en el sistema
-        query_clientes = "SELECT COUNT(*) as total FROM client WHERE activo = true"
-        # Ejecuto la consulta SQL para contar clientes
-        df_clientes = self.ejecutar_query(query_clientes)
-        # Guardo el total de clientes en el diccionario de estadísticas
-        stats['total_clientes'] = int(df_clientes.iloc[0]['total']) if not df_clientes.empty else 0
-        
-        # Consulto el número total de citas programadas que están activas
-        query_citas = "SELECT COUNT(*) as total FROM appointment WHERE activo = true"
-        # Ejecuto la query para obtener el conteo de citas
-        df_citas = self.ejecutar_query(query_citas)
-        # Almaceno el total de citas en las estadísticas generales
-        stats['total_citas'] = int(df_citas.iloc[0]['total']) if not df_citas.empty else 0
+    def obtener_estadisticas_generales(self, estricto: bool = False) -> Dict:
+        """
+        Obtiene estadísticas generales del sistema (un solo viaje a la base de datos)
         
-        # Consulto cuántos servicios diferentes ofrece la veterinaria
-        query_servicios = "SELECT COUNT(*) as total FROM service WHERE activo = true"
-        # Ejecuto la consulta para contar los servicios disponibles
-        df_servicios = self.ejecutar_query(query_servicios)
-        # Guardo la cantidad de servicios disponibles en el diccionario
-        stats['total_servicios'] = int(df_servicios.iloc[0]['total']) if not df_servicios.empty else 0
+        Args:
+            estricto: propagar el error en vez de retornar ceros (para no guardar los ceros en caché)
+        """
+        # Los cuatro conteos van como subconsultas de una misma sentencia
+        fila = self.consultar_fila(QUERY_ESTADISTICAS_GENERALES, estricto=estricto)
         
-        # Retorno el diccionario completo con todas las estadísticas del sistema
-        return stats
+        # Si no hubo resultado (p. ej. error de conexión) retorno todo en 0
+        claves = ['total_mascotas', 'total_clientes', 'total_citas', 'total_servicios']
+        return {clave: int(fila[clave]) if fila else 0 for clave in claves}
     
     # =========================================================================
     # MÉTRICAS DE NEGOCIO Y VENTAS
@@ -425,31 +927,8 @@ class PetStoreDatabase:
         Returns:
             DataFrame con citas del día actual
         """
-        query = """
-        SELECT 
-            a.appointment_id,
-            a.fecha_hora,
-            EXTRACT(HOUR FROM a.fecha_hora) AS hora,
-            p.nombre AS mascota,
-            p.tipo AS tipo_mascota,
-            c.name AS cliente,
-            c.telefono,
-            s.nombre AS servicio,
-            s.precio,
-            a.estado,
-            u.name AS veterinario
-        FROM appointment a
-        JOIN pet p ON a.pet_id = p.pet_id
-        JOIN client c ON a.client_id = c.client_id
-        JOIN service s ON a.service_id = s.service_id
-        LEFT JOIN "user" u ON a.veterinarian_id = u.user_id
-        WHERE DATE(a.fecha_hora) = CURRENT_DATE
-          AND a.activo = true
-        ORDER BY a.fecha_hora;
-        """
-        
         logger.info(" Obteniendo citas de hoy...")
-        return self.ejecutar_query(query)
+        return self.ejecutar_query(QUERY_CITAS_HOY)
     
     def obtener_cantidad_productos(self) -> int:
         """
@@ -458,15 +937,13 @@ class PetStoreDatabase:
         Returns:
             Total de productos únicos
         """
-        query = """
+        query = registrar_sentencia('cantidad_productos', """
         SELECT COUNT(*) as total
         FROM producto
         WHERE activo = true;
-        """
-        
+        """)
         try:
-            df = self.ejecutar_query(query)
-            total = int(df.iloc[0]['total']) if not df.empty else 0
+            total = int(self.consultar_valor(query, defecto=0))
             logger.info(f" Total de productos: {total}")
             return total
         except Exception as e:
@@ -480,23 +957,10 @@ class PetStoreDatabase:
         Returns:
             Dict con total de ventas, cantidad de transacciones y productos vendidos
         """
-        query = """
-        SELECT 
-            COUNT(DISTINCT v.venta_id) AS total_transacciones,
-            COUNT(dv.detalle_id) AS total_items_vendidos,
-            COALESCE(SUM(dv.cantidad), 0) AS cantidad_productos,
-            COALESCE(SUM(dv.subtotal), 0) AS total_ventas,
-            COALESCE(AVG(dv.precio_unitario), 0) AS ticket_promedio
-        FROM venta v
-        JOIN detalle_venta dv ON v.venta_id = dv.venta_id
-        WHERE DATE(v.fecha_venta) = CURRENT_DATE
-          AND v.activo = true;
-        """
-        
         try:
-            df = self.ejecutar_query(query)
+            row = self.consultar_fila(QUERY_VENTAS_DIA)
             
-            if df.empty:
+            if row is None:
                 return {
                     'total_ventas': 0,
                     'total_transacciones': 0,
@@ -505,7 +969,6 @@ class PetStoreDatabase:
                     'ticket_promedio': 0
                 }
             
-            row = df.iloc[0]
             resultado = {
                 'total_ventas': float(row['total_ventas']),
                 'total_transacciones': int(row['total_transacciones']),
@@ -534,25 +997,10 @@ class PetStoreDatabase:
         Returns:
             Dict con estadísticas de ventas del mes
         """
-        query = """
-        SELECT 
-            COUNT(DISTINCT v.venta_id) AS total_transacciones,
-            COUNT(dv.detalle_id) AS total_items_vendidos,
-            COALESCE(SUM(dv.cantidad), 0) AS cantidad_productos,
-            COALESCE(SUM(dv.subtotal), 0) AS total_ventas,
-            COALESCE(AVG(dv.precio_unitario), 0) AS ticket_promedio,
-            COUNT(DISTINCT v.client_id) AS clientes_unicos
-        FROM venta v
-        JOIN detalle_venta dv ON v.venta_id = dv.venta_id
-        WHERE EXTRACT(YEAR FROM v.fecha_venta) = EXTRACT(YEAR FROM CURRENT_DATE)
-          AND EXTRACT(MONTH FROM v.fecha_venta) = EXTRACT(MONTH FROM CURRENT_DATE)
-          AND v.activo = true;
-        """
-        
         try:
-            df = self.ejecutar_query(query)
+            row = self.consultar_fila(QUERY_VENTAS_MES)
             
-            if df.empty:
+            if row is None:
                 return {
                     'total_ventas': 0,
                     'total_transacciones': 0,
@@ -562,7 +1010,6 @@ class PetStoreDatabase:
                     'clientes_unicos': 0
                 }
             
-            row = df.iloc[0]
             resultado = {
                 'total_ventas': float(row['total_ventas']),
                 'total_transacciones': int(row['total_transacciones']),
@@ -596,29 +1043,18 @@ class PetStoreDatabase:
         Returns:
             DataFrame con productos próximos a vencer
         """
-        query = """
-        SELECT 
-            p.producto_id,
-            p.nombre AS producto,
-            p.categoria,
-            p.fecha_vencimiento,
-            p.stock_actual,
-            p.precio_venta,
-            (DATE(p.fecha_vencimiento) - CURRENT_DATE) AS dias_hasta_vencer,
-            (p.stock_actual * p.precio_venta) AS valor_inventario
-        FROM producto p
-        WHERE p.fecha_vencimiento IS NOT NULL
-          AND DATE(p.fecha_vencimiento) BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '%s days'
-          AND p.activo = true
-          AND p.stock_actual > 0
-        ORDER BY p.fecha_vencimiento ASC;
-        """
+        dias = int(dias)
         
-        try:
+        def consultar():
             logger.info(f"  Buscando productos próximos a vencer (en {dias} días)...")
-            df = self.ejecutar_query(query % dias)
+            # estricto: un error no llega a la caché (se responde vacío y se reintenta en la próxima)
+            df = self.ejecutar_query(QUERY_PRODUCTOS_PROXIMOS_VENCER, (dias,), estricto=True)
             logger.info(f"   Encontrados: {len(df)} productos")
             return df
+        
+        try:
+            # Copia para que quien filtre o modifique el resultado no altere la caché
+            return self.cache_vencimientos.obtener(dias, consultar).copy()
         except Exception as e:
             logger.warning(f"  Error obteniendo productos próximos a vencer: {e}")
             return pd.DataFrame()
@@ -630,28 +1066,9 @@ class PetStoreDatabase:
         Returns:
             DataFrame con productos en alerta de bajo inventario
         """
-        query = """
-        SELECT 
-            p.producto_id,
-            p.nombre AS producto,
-            p.categoria,
-            p.stock_actual,
-            p.stock_minimo,
-            p.stock_maximo,
-            (p.stock_minimo - p.stock_actual) AS unidades_faltantes,
-            ROUND((p.stock_actual::numeric / NULLIF(p.stock_minimo, 0)) * 100, 2) AS porcentaje_stock,
-            p.precio_compra,
-            ((p.stock_minimo - p.stock_actual) * p.precio_compra) AS costo_reposicion,
-            p.proveedor
-        FROM producto p
-        WHERE p.stock_actual < p.stock_minimo
-          AND p.activo = true
-        ORDER BY porcentaje_stock ASC, p.stock_actual ASC;
-        """
-        
         try:
             logger.info(" Verificando alertas de bajo inventario...")
-            df = self.ejecutar_query(query)
+            df = self.ejecutar_query(QUERY_BAJO_INVENTARIO)
             logger.info(f"   Alertas: {len(df)} productos con bajo inventario")
             return df
         except Exception as e:
@@ -665,45 +1082,10 @@ class PetStoreDatabase:
         Returns:
             Dict con comparativa de ventas mensuales
         """
-        query = """
-        WITH ventas_mes_actual AS (
-            SELECT 
-                COUNT(DISTINCT v.venta_id) AS transacciones,
-                COALESCE(SUM(dv.subtotal), 0) AS total_ventas
-            FROM venta v
-            JOIN detalle_venta dv ON v.venta_id = dv.venta_id
-            WHERE EXTRACT(YEAR FROM v.fecha_venta) = EXTRACT(YEAR FROM CURRENT_DATE)
-              AND EXTRACT(MONTH FROM v.fecha_venta) = EXTRACT(MONTH FROM CURRENT_DATE)
-              AND v.activo = true
-        ),
-        ventas_mes_anterior AS (
-            SELECT 
-                COUNT(DISTINCT v.venta_id) AS transacciones,
-                COALESCE(SUM(dv.subtotal), 0) AS total_ventas
-            FROM venta v
-            JOIN detalle_venta dv ON v.venta_id = dv.venta_id
-            WHERE EXTRACT(YEAR FROM v.fecha_venta) = EXTRACT(YEAR FROM CURRENT_DATE - INTERVAL '1 month')
-              AND EXTRACT(MONTH FROM v.fecha_venta) = EXTRACT(MONTH FROM CURRENT_DATE - INTERVAL '1 month')
-              AND v.activo = true
-        )
-        SELECT 
-            ma.total_ventas AS ventas_mes_actual,
-            ma.transacciones AS transacciones_mes_actual,
-            mp.total_ventas AS ventas_mes_anterior,
-            mp.transacciones AS transacciones_mes_anterior,
-            (ma.total_ventas - mp.total_ventas) AS diferencia_ventas,
-            CASE 
-                WHEN mp.total_ventas > 0 THEN
-                    ROUND(((ma.total_ventas - mp.total_ventas) / mp.total_ventas) * 100, 2)
-                ELSE 0
-            END AS porcentaje_cambio
-        FROM ventas_mes_actual ma, ventas_mes_anterior mp;
-        """
-        
         try:
-            df = self.ejecutar_query(query)
+            row = self.consultar_fila(QUERY_COMPARATIVA_VENTAS_MENSUAL)
             
-            if df.empty:
+            if row is None:
                 return {
                     'ventas_mes_actual': 0,
                     'ventas_mes_anterior': 0,
@@ -714,7 +1096,6 @@ class PetStoreDatabase:
                     'tendencia': 'sin_datos'
                 }
             
-            row = df.iloc[0]
             porcentaje = float(row['porcentaje_cambio'])
             
             # Determinar tendencia
@@ -752,9 +1133,10 @@ class PetStoreDatabase:
     
     def cerrar(self):
         """Cierra la conexión a la base de datos"""
-        if self.conn and not self.conn.closed:
-            self.conn.close()
-            logger.info(" Conexión cerrada")
+        with self._lock_conexion:
+            if self.conn and not self.conn.closed:
+                self.conn.close()
+                logger.info(" Conexión cerrada")
     
     # Nota: No usar __del__ porque causa problemas con FastAPI
     # La conexión se mantendrá abierta durante toda la vida de la aplicación
@@ -268,14 +268,19 @@ def mostrar_info_sistema():
     import torch
     
     config = get_config('TRANSFORMER_CONFIG')
+    preset = get_config('TRANSFORMER_PRESETS')[config['model_size']]
     
     print("  ARQUITECTURA DEL TRANSFORMER:")
-    print(f"   • Dimensión del modelo: {config['d_model']}")
-    print(f"   • Cabezas de atención: {config['num_heads']}")
-    print(f"   • Capas transformer: {config['num_layers']}")
-    print(f"   • Dimensión feed-forward: {config['d_ff']}")
+    print(f"   • Tamaño: {config['model_size']}" + (" (embeddings compartidos)" if config['tie_embeddings'] else ""))
+    print(f"   • Dimensión del modelo: {preset['d_model']}")
+    print(f"   • Cabezas de atención: {preset['num_heads']}")
+    print(f"   • Capas transformer: {preset['num_layers']}")
+    print(f"   • Dimensión feed-forward: {preset['d_ff']}")
     print(f"   • Longitud máxima: {config['max_len']}")
-    print(f"   • Tamaño vocabulario: {config['vocab_size']}")
+    if config['tokenizer'] == 'bpe':
+        print(f"   • Tamaño vocabulario: {config['bpe_vocab_size']} piezas BPE")
+    else:
+        print(f"   • Tamaño vocabulario: {config['vocab_size']} palabras")
     
     print("\n  PARÁMETROS DE GENERACIÓN:")
     print(f"   • Temperature: {config['temperature']}")
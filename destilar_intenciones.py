@@ -0,0 +1,336 @@
+"""
+DESTILACIÓN DEL CLASIFICADOR DE INTENCIONES
+Entrena el clasificador lineal de n-gramas con hashing de intenciones.py
+con las etiquetas suaves del router actual (red LSTM y reglas de PetStoreBot)
+y lo guarda como router por defecto del chatbot, con un reporte de exactitud
+
+Uso:
+    python destilar_intenciones.py
+    python destilar_intenciones.py --mensajes data/mensajes_chat.jsonl otros.txt --epocas 400
+
+Maestros:
+    - Patrones de datos_veterinarios.json: su etiqueta, mezclada con las
+      probabilidades de la red LSTM (suavizadas con `temperatura`) si el
+      modelo está entrenado
+    - Mensajes registrados (sin etiqueta): lo que decide el router actual,
+      la LSTM si supera su umbral de confianza y si no detectar_intencion
+    - En ambos, si detectar_intencion reconoce una intención de datos
+      (INTENCIONES_DATOS: citas de hoy, ventas, estadísticas...) esa es la
+      etiqueta: el JSON y la LSTM no las distinguen, y en el chat el
+      clasificador destilado las responde sin correr las reglas antes
+
+El transformer no sirve de maestro: genera texto y no produce intenciones
+(su procesar_mensaje siempre responde 'transformer_generation')
+"""
+
+import argparse
+import glob
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from config import INTENCIONES_CONFIG
+from intenciones import INTENCIONES_DATOS, ClasificadorIntenciones
+from normalizacion import NORMALIZADOR_CHATBOT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# DATOS Y MAESTROS
+# =============================================================================
+
+def cargar_patrones(ruta: str = 'datos_veterinarios.json') -> List[Tuple[str, str]]:
+    """Pares (patrón, intención) del JSON de entrenamiento del chatbot"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return [(patron, intent['tag']) for intent in json.load(f)['intents'] for patron in intent['patterns']]
+
+
+def cargar_mensajes_registrados(rutas: Sequence[str]) -> List[str]:
+    """
+    Mensajes de producción sin repetir: .jsonl con un objeto por línea
+    (campo 'mensaje') o texto plano con un mensaje por línea. Acepta comodines
+    """
+    vistos = set()
+    mensajes = []
+    for patron in rutas:
+        for ruta in sorted(glob.glob(patron)):
+            with open(ruta, 'r', encoding='utf-8') as archivo:
+                for linea in archivo:
+                    linea = linea.strip()
+                    if not linea:
+                        continue
+                    if ruta.endswith('.jsonl'):
+                        try:
+                            linea = json.loads(linea).get('mensaje', '')
+                        except (json.JSONDecodeError, AttributeError):
+                            continue
+                    clave = NORMALIZADOR_CHATBOT.normalizar(linea)
+                    if clave and clave not in vistos:
+                        vistos.add(clave)
+                        mensajes.append(linea)
+    logger.info(f" Mensajes registrados: {len(mensajes)} distintos")
+    return mensajes
+
+
+def intencion_datos(bot, texto: str) -> Optional[str]:
+    """La intención de detectar_intencion si es de INTENCIONES_DATOS, si no None"""
+    intencion = bot.detectar_intencion(texto)
+    return intencion if intencion in INTENCIONES_DATOS else None
+
+
+def distribucion_maestro(bot, textos: Sequence[str], temperatura: float) -> List[Optional[Dict[str, float]]]:
+    """
+    Lo que decidiría el router de PetStoreBot para cada texto: la intención de
+    datos de las reglas con probabilidad 1 si la hay; si no las probabilidades
+    de la LSTM suavizadas (p^(1/T) normalizado) cuando supera su umbral de
+    confianza, o la intención de detectar_intencion con probabilidad 1
+    """
+    distribuciones: List[Optional[Dict[str, float]]] = [None] * len(textos)
+    for i, texto in enumerate(textos):
+        datos = intencion_datos(bot, texto)
+        if datos is not None:
+            distribuciones[i] = {datos: 1.0}
+    if bot.chatbot_model is not None and len(textos):
+        probabilidades = bot.chatbot_model.predict(
+            bot.secuencias_lstm([bot.normalizar_texto(t) for t in textos]), verbose=0)
+        suaves = probabilidades ** (1 / temperatura)
+        suaves /= suaves.sum(axis=1, keepdims=True)
+        clases = list(bot.label_encoder.classes_)
+        for i in np.flatnonzero(probabilidades.max(axis=1) >= bot.confidence_threshold):
+            if distribuciones[i] is None:
+                distribuciones[i] = dict(zip(clases, suaves[i].tolist()))
+    return [d if d is not None else {bot.detectar_intencion(t): 1.0} for d, t in zip(distribuciones, textos)]
+
+
+def objetivos_destilacion(bot, patrones: List[Tuple[str, str]], mensajes: List[str], temperatura: float,
+                          peso_etiqueta: float) -> Tuple[List[str], List[Dict[str, float]], List[str]]:
+    """
+    Textos, distribución objetivo de cada uno y la intención del maestro
+    (argmax del router actual; en los patrones sin LSTM, su etiqueta).
+    Los patrones deben venir con etiquetas_patrones (intención de datos de las reglas)
+    """
+    textos = [p for p, _ in patrones] + list(mensajes)
+    maestro = distribucion_maestro(bot, textos, temperatura)
+    objetivos = []
+    for i, (patron, etiqueta) in enumerate(patrones):
+        if bot.chatbot_model is None or etiqueta in INTENCIONES_DATOS:
+            objetivos.append({etiqueta: 1.0})
+            maestro[i] = {etiqueta: 1.0}
+            continue
+        mezcla = {clase: (1 - peso_etiqueta) * p for clase, p in maestro[i].items()}
+        mezcla[etiqueta] = mezcla.get(etiqueta, 0.0) + peso_etiqueta
+        objetivos.append(mezcla)
+    objetivos.extend(maestro[len(patrones):])
+    return textos, objetivos, [max(d, key=d.get) for d in maestro]
+
+
+def etiquetas_patrones(bot, patrones: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Patrones con la intención de datos de las reglas en lugar de la del JSON, si la hay"""
+    return [(patron, intencion_datos(bot, patron) or etiqueta) for patron, etiqueta in patrones]
+
+
+# =============================================================================
+# ENTRENAMIENTO Y REPORTE
+# =============================================================================
+
+def matriz_caracteristicas(clasificador: ClasificadorIntenciones, textos: Sequence[str]) -> sparse.csr_matrix:
+    """Matriz dispersa (len(textos), dimension) con los mismos valores que usa probabilidades"""
+    filas, columnas, valores = [], [], []
+    for fila, texto in enumerate(textos):
+        indices = clasificador.indices(texto)
+        filas.extend([fila] * len(indices))
+        columnas.extend(indices)
+        valores.extend([1 / np.sqrt(len(indices))] * len(indices))
+    return sparse.csr_matrix((np.asarray(valores, dtype=np.float32), (filas, columnas)),
+                             shape=(len(textos), clasificador.dimension))
+
+
+def entrenar_estudiante(textos: Sequence[str], objetivos: Sequence[Dict[str, float]], clases: Sequence[str],
+                        dimension: int, epocas: int = 300, learning_rate: float = 0.05,
+                        l2: float = 1e-4) -> ClasificadorIntenciones:
+    """
+    Entropía cruzada contra las distribuciones objetivo (etiquetas suaves),
+    Adam sobre el lote completo y regularización L2. Solo se entrenan las
+    columnas que aparecen en los textos; el resto de la tabla queda en cero
+    """
+    estudiante = ClasificadorIntenciones(clases, None, None, dimension)
+    posicion = {clase: i for i, clase in enumerate(clases)}
+    y = np.zeros((len(textos), len(clases)), dtype=np.float32)
+    for fila, distribucion in enumerate(objetivos):
+        for clase, p in distribucion.items():
+            y[fila, posicion[clase]] = p
+
+    x = matriz_caracteristicas(estudiante, textos)
+    activas = np.unique(x.indices)
+    x = x[:, activas].tocsr()
+    xt = x.T.tocsr()
+
+    w = np.zeros((len(activas), len(clases)), dtype=np.float32)
+    b = np.log(y.mean(axis=0) + 1e-6).astype(np.float32)
+    parametros = [w, b]
+    momentos = [np.zeros_like(p) for p in parametros]
+    varianzas = [np.zeros_like(p) for p in parametros]
+    beta1, beta2 = 0.9, 0.999
+    for paso in range(1, epocas + 1):
+        logits = x @ w + b
+        logits -= logits.max(axis=1, keepdims=True)
+        p = np.exp(logits)
+        p /= p.sum(axis=1, keepdims=True)
+        error = (p - y) / len(textos)
+        gradientes = [xt @ error + 2 * l2 * w, error.sum(axis=0)]
+        for parametro, gradiente, m, v in zip(parametros, gradientes, momentos, varianzas):
+            m *= beta1
+            m += (1 - beta1) * gradiente
+            v *= beta2
+            v += (1 - beta2) * gradiente ** 2
+            parametro -= learning_rate * (m / (1 - beta1 ** paso)) / (np.sqrt(v / (1 - beta2 ** paso)) + 1e-8)
+
+    estudiante.pesos = np.zeros((dimension, len(clases)), dtype=np.float32)
+    estudiante.pesos[activas] = w
+    estudiante.sesgo = b
+    return estudiante
+
+
+def latencia_us(estudiante: ClasificadorIntenciones, textos: Sequence[str], repeticiones: int = 5) -> Dict[str, float]:
+    """Percentiles 50/99 del costo de predecir un mensaje (con la caché de palabras ya caliente)"""
+    for texto in textos:
+        estudiante.predecir(texto)
+    tiempos = []
+    for _ in range(repeticiones):
+        for texto in textos:
+            inicio = time.perf_counter()
+            estudiante.predecir(texto)
+            tiempos.append((time.perf_counter() - inicio) * 1e6)
+    return {'p50': round(float(np.percentile(tiempos, 50)), 1), 'p99': round(float(np.percentile(tiempos, 99)), 1)}
+
+
+def acuerdo(estudiante: ClasificadorIntenciones, textos: Sequence[str], esperadas: Sequence[str]) -> Optional[float]:
+    if not len(textos):
+        return None
+    return round(float(np.mean([estudiante.predecir(t)[0] == e for t, e in zip(textos, esperadas)])), 4)
+
+
+def umbral_sin_errores(confianzas: Sequence[float], aciertos: Sequence[bool]) -> Optional[float]:
+    """
+    Menor umbral (a dos decimales) por encima del cual no hay respuestas
+    equivocadas: la confianza del peor error redondeada hacia arriba
+    """
+    errores = [c for c, acierto in zip(confianzas, aciertos) if not acierto]
+    if not confianzas:
+        return None
+    return round(float(np.ceil(max(errores, default=0.0) * 100 + 1e-9) / 100), 2)
+
+
+def destilar(rutas_mensajes: Optional[Sequence[str]] = None, epocas: Optional[int] = None,
+             salida: Optional[str] = None) -> Dict:
+    """
+    Arma los objetivos con los maestros, mide al estudiante en un 20% aparte
+    (estratificado por intención en los patrones), lo reentrena con todo y lo
+    guarda en INTENCIONES_CONFIG['modelo_destilado'] junto con el reporte
+
+    Returns:
+        Reporte (también en INTENCIONES_CONFIG['reporte_destilacion'])
+    """
+    from sklearn.model_selection import train_test_split
+    from chatbot import PetStoreBot
+
+    config = INTENCIONES_CONFIG
+    epocas = epocas or config['epocas']
+    salida = salida or config['modelo_destilado']
+    rutas_mensajes = config['mensajes_registrados'] if rutas_mensajes is None else rutas_mensajes
+
+    bot = PetStoreBot.solo_intenciones()
+    patrones = etiquetas_patrones(bot, cargar_patrones())
+    mensajes = cargar_mensajes_registrados(rutas_mensajes)
+    maestros = (['lstm'] if bot.chatbot_model is not None else []) + ['reglas']
+    logger.info(f" Maestros: {', '.join(maestros)}; {len(patrones)} patrones y {len(mensajes)} mensajes")
+
+    textos, objetivos, decisiones = objetivos_destilacion(bot, patrones, mensajes, config['temperatura'],
+                                                          config['peso_etiqueta'])
+    clases = sorted({clase for distribucion in objetivos for clase in distribucion})
+    etiquetas = [e for _, e in patrones]
+    parametros = dict(dimension=config['dimension_hash'], epocas=epocas, learning_rate=config['learning_rate'],
+                      l2=config['l2'])
+
+    # Evaluación: patrones estratificados por etiqueta (las que tienen al menos 2) y mensajes al azar
+    n = len(patrones)
+    indices = np.arange(len(textos))
+    conteo = {e: etiquetas.count(e) for e in etiquetas}
+    estratificables = [i for i in range(n) if conteo[etiquetas[i]] >= 2]
+    entrenamiento_p, prueba_p = train_test_split(estratificables, test_size=0.2, random_state=42,
+                                                 stratify=[etiquetas[i] for i in estratificables])
+    entrenamiento_p = sorted(set(range(n)) - set(prueba_p))
+    if len(mensajes) >= 5:
+        entrenamiento_m, prueba_m = train_test_split(indices[n:], test_size=0.2, random_state=42)
+    else:
+        entrenamiento_m, prueba_m = indices[n:], indices[:0]
+    entrenamiento = list(entrenamiento_p) + list(entrenamiento_m)
+    prueba = list(prueba_p) + list(prueba_m)
+
+    evaluado = entrenar_estudiante([textos[i] for i in entrenamiento], [objetivos[i] for i in entrenamiento],
+                                   clases, **parametros)
+    predicciones = [evaluado.predecir(textos[i]) for i in prueba]
+    confianzas = [confianza for _, confianza in predicciones]
+    aciertos = [intencion == decisiones[i] for (intencion, _), i in zip(predicciones, prueba)]
+    sobre_umbral = [a for a, c in zip(aciertos, confianzas) if c >= config['umbral_confianza']]
+    reporte = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'maestros': maestros,
+        'patrones': n,
+        'mensajes_registrados': len(mensajes),
+        'clases': len(clases),
+        'prueba': {'patrones': len(prueba_p), 'mensajes': len(prueba_m)},
+        'exactitud_vs_etiqueta': acuerdo(evaluado, [textos[i] for i in prueba_p], [etiquetas[i] for i in prueba_p]),
+        'acuerdo_vs_maestro': acuerdo(evaluado, [textos[i] for i in prueba], [decisiones[i] for i in prueba]),
+        'acuerdo_vs_maestro_mensajes': acuerdo(evaluado, [textos[i] for i in prueba_m], [decisiones[i] for i in prueba_m]),
+        'cobertura_umbral': round(float(np.mean([c >= config['umbral_confianza'] for c in confianzas])), 4)
+                            if confianzas else None,
+        'umbral_confianza': config['umbral_confianza'],
+        # Entre las respuestas que pasan el umbral, cuántas coinciden con el maestro
+        'precision_umbral': round(float(np.mean(sobre_umbral)), 4) if sobre_umbral else None,
+        'umbral_sin_errores': umbral_sin_errores(confianzas, aciertos),
+    }
+    if bot.chatbot_model is not None:
+        # La LSTM se entrenó con todos los patrones: la exactitud del maestro en la prueba es optimista
+        reporte['exactitud_maestro_vs_etiqueta'] = round(float(np.mean(
+            [decisiones[i] == etiquetas[i] for i in prueba_p])), 4)
+
+    # Modelo final con todos los datos
+    estudiante = entrenar_estudiante(textos, objetivos, clases, **parametros)
+    reporte['latencia_us'] = latencia_us(estudiante, textos)
+    estudiante.guardar(salida)
+    with open(config['reporte_destilacion'], 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+
+    logger.info(f" Clasificador destilado guardado en {salida} ({len(clases)} intenciones)")
+    logger.info(f"   Exactitud vs etiqueta: {reporte['exactitud_vs_etiqueta']}  "
+                f"acuerdo vs maestro: {reporte['acuerdo_vs_maestro']}  "
+                f"cobertura (confianza >= {config['umbral_confianza']}): {reporte['cobertura_umbral']}")
+    if reporte['umbral_sin_errores'] is not None and reporte['umbral_sin_errores'] > config['umbral_confianza']:
+        logger.warning(f"  Con umbral_confianza={config['umbral_confianza']} el estudiante contradice al maestro "
+                       f"(precisión {reporte['precision_umbral']}): sin errores en la prueba desde "
+                       f"{reporte['umbral_sin_errores']}")
+    logger.info(f"   Latencia por mensaje: p50 {reporte['latencia_us']['p50']} us, p99 {reporte['latencia_us']['p99']} us")
+    return reporte
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Destila el router de intenciones en un clasificador de n-gramas")
+    parser.add_argument('--mensajes', nargs='*',
+                        help="Mensajes registrados (.jsonl o .txt, acepta comodines; "
+                             "default: INTENCIONES_CONFIG['mensajes_registrados'])")
+    parser.add_argument('--epocas', type=int, help="Épocas de entrenamiento (default: INTENCIONES_CONFIG['epocas'])")
+    parser.add_argument('--salida', help="Archivo .npz del clasificador (default: INTENCIONES_CONFIG['modelo_destilado'])")
+    args = parser.parse_args()
+
+    print(json.dumps(destilar(args.mensajes, args.epocas, args.salida), indent=2, ensure_ascii=False))
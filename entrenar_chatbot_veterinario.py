@@ -6,7 +6,6 @@ Entrena una red neuronal LSTM para clasificar intenciones veterinarias
 import numpy as np
 import json
 import pickle
-import re
 from typing import List, Tuple
 import tensorflow as tf
 from tensorflow import keras
@@ -16,6 +15,8 @@ from tensorflow.keras.preprocessing.text import Tokenizer
 from tensorflow.keras.preprocessing.sequence import pad_sequences
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
+from normalizacion import NormalizadorTexto
+from registro_chat import leer_shards
 
 print("=" * 80)
 print(" ENTRENAMIENTO DE CHATBOT VETERINARIO CON RED NEURONAL")
@@ -32,6 +33,8 @@ LSTM_UNITS = 64         # Unidades LSTM
 EPOCHS = 150            # Épocas de entrenamiento
 BATCH_SIZE = 8          # Tamaño del batch
 VALIDATION_SPLIT = 0.2  # 20% para validación
+# Normalización de los patrones: minúsculas, con acentos y sin dígitos ni puntuación
+NORMALIZADOR_PATRONES = NormalizadorTexto(quitar_acentos=False, conservar_digitos=False)
 
 
 # =============================================================================
@@ -53,14 +56,19 @@ for intent in data['intents']:
     
     for pattern in intent['patterns']:
         # Normalizar texto
-        pattern_normalized = pattern.lower().strip()
-        pattern_normalized = re.sub(r'[^a-záéíóúñü\s]', '', pattern_normalized)
-        pattern_normalized = re.sub(r'\s+', ' ', pattern_normalized)
-        
-        patterns.append(pattern_normalized)
+        patterns.append(NORMALIZADOR_PATRONES.normalizar(pattern))
         labels.append(tag)
 
 print(f" Patrones cargados: {len(patterns)}")
+
+# Mensajes reales del chat (python registro_chat.py), solo de intenciones del JSON
+patrones_registro = 0
+for ejemplo in leer_shards('intenciones'):
+    if ejemplo['intencion'] in intents_dict:
+        patterns.append(NORMALIZADOR_PATRONES.normalizar(ejemplo['texto']))
+        labels.append(ejemplo['intencion'])
+        patrones_registro += 1
+print(f" Patrones del registro del chat: {patrones_registro}")
 print(f" Intenciones únicas: {len(set(labels))}")
 print(f" Intenciones: {', '.join(set(labels))}")
 
@@ -276,9 +284,7 @@ print("=" * 80)
 def predecir_intencion(texto, threshold=0.6):
     """Predice la intención de un texto"""
     # Normalizar
-    texto_norm = texto.lower().strip()
-    texto_norm = re.sub(r'[^a-záéíóúñü\s]', '', texto_norm)
-    texto_norm = re.sub(r'\s+', ' ', texto_norm)
+    texto_norm = NORMALIZADOR_PATRONES.normalizar(texto)
     
     # Tokenizar
     sequence = tokenizer.texts_to_sequences([texto_norm])
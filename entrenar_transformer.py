@@ -6,16 +6,24 @@ Entrena el modelo Transformer con datos de conversaciones y contexto del negocio
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+from torch.optim.lr_scheduler import LambdaLR
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, Sampler, SequentialSampler
+import argparse
+import hashlib
 import json
+import math
 import os
+import random
+import time
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from tqdm import tqdm
 import logging
 
-from transformer_chatbot import TransformerChatbot, PetStoreBotTransformer
+from modelo_transformer import guardar_atomico, mascara_causal, mascara_relleno
+from transformer_chatbot import PetStoreBotTransformer
 from config_transformer import get_config
+from registro_chat import leer_shards
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,25 +36,387 @@ logger = logging.getLogger(__name__)
 class ChatDataset(Dataset):
     """
     Dataset para entrenar el transformer
-    Contiene pares (pregunta, respuesta) del chatbot
+    Contiene pares (pregunta, respuesta) ya tokenizados en dos matrices
+    (N, max_len) de entradas y objetivos (ver tokenizar_pares_en_cache)
+    
+    Se indexa con la lista de posiciones de un lote completo (BatchSampler o
+    MuestreadorPorLongitud): cada lote sale de un solo slice de las matrices,
+    recortado a la longitud del ejemplo más largo del lote
+    
+    `posiciones` limita el dataset a esas filas de las matrices (división
+    entrenamiento/validación) sin copiarlas
+    
+    Si las matrices son las de la caché (memmap de tokenizar_pares_en_cache),
+    los workers del DataLoader reciben solo la ruta y abren el archivo otra
+    vez: el pickle de un memmap copiaría todos los datos a cada proceso
     """
     
-    def __init__(self, data_pairs: List[Tuple[str, str]], bot: PetStoreBotTransformer, max_len: int = 128):
-        self.data_pairs = data_pairs
-        self.bot = bot
-        self.max_len = max_len
+    def __init__(self, entradas: np.ndarray, objetivos: np.ndarray, pad_idx: int = 0,
+                 posiciones: Optional[np.ndarray] = None):
+        self.entradas = entradas
+        self.objetivos = objetivos
+        self.posiciones = np.arange(len(entradas)) if posiciones is None else np.sort(np.asarray(posiciones))
+        # El relleno va al final: la longitud es la cantidad de tokens distintos de <PAD>.
+        # Entrada y objetivo se recortan juntos, así que cuenta la mayor
+        self.longitudes = np.maximum((entradas[self.posiciones] != pad_idx).sum(axis=1),
+                                     (objetivos[self.posiciones] != pad_idx).sum(axis=1))
     
     def __len__(self):
-        return len(self.data_pairs)
+        return len(self.posiciones)
     
-    def __getitem__(self, idx):
-        pregunta, respuesta = self.data_pairs[idx]
-        
-        # Convertir a tensores
-        input_tensor = self.bot.texto_a_indices(pregunta, self.max_len)
-        target_tensor = self.bot.texto_a_indices(respuesta, self.max_len)
+    def __getitem__(self, indices):
+        # Ordenar las posiciones mantiene las lecturas del memmap contiguas
+        indices = np.sort(np.asarray(indices))
+        filas = self.posiciones[indices]
+        largo = int(self.longitudes[indices].max())
+        input_tensor = torch.from_numpy(self.entradas[filas, :largo].astype(np.int64))
+        target_tensor = torch.from_numpy(self.objetivos[filas, :largo].astype(np.int64))
         
         return input_tensor, target_tensor
+    
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        ruta = getattr(self.entradas, 'filename', None)
+        if ruta is not None and ruta == getattr(self.objetivos, 'filename', None):
+            estado['entradas'] = estado['objetivos'] = None
+            estado['ruta_cache'] = ruta
+        return estado
+    
+    def __setstate__(self, estado):
+        ruta = estado.pop('ruta_cache', None)
+        self.__dict__.update(estado)
+        if ruta is not None:
+            matrices = np.load(ruta, mmap_mode='r')
+            self.entradas, self.objetivos = matrices[0], matrices[1]
+
+
+class MuestreadorPorLongitud(Sampler):
+    """
+    Lotes de ejemplos de longitud parecida para rellenar poco
+    
+    En cada época baraja los ejemplos, los corta en grupos de
+    `lotes_por_grupo` lotes, ordena cada grupo por longitud, lo parte en lotes
+    y baraja el orden de los lotes. El grupo mantiene la aleatoriedad entre
+    épocas; ordenar dentro de él junta longitudes similares
+    """
+    
+    def __init__(self, longitudes: np.ndarray, batch_size: int, lotes_por_grupo: int = 50, semilla: int = 42):
+        self.longitudes = np.asarray(longitudes)
+        self.batch_size = batch_size
+        self.tamano_grupo = batch_size * lotes_por_grupo
+        self.rng = np.random.default_rng(semilla)
+    
+    def __len__(self):
+        n = len(self.longitudes)
+        completos, resto = divmod(n, self.tamano_grupo)
+        return completos * -(-self.tamano_grupo // self.batch_size) + -(-resto // self.batch_size)
+    
+    def __iter__(self):
+        orden = self.rng.permutation(len(self.longitudes))
+        lotes = []
+        for inicio in range(0, len(orden), self.tamano_grupo):
+            grupo = orden[inicio:inicio + self.tamano_grupo]
+            grupo = grupo[np.argsort(self.longitudes[grupo], kind='stable')]
+            lotes.extend(grupo[i:i + self.batch_size].tolist() for i in range(0, len(grupo), self.batch_size))
+        for i in self.rng.permutation(len(lotes)):
+            yield lotes[i]
+
+
+def iniciar_worker(_):
+    # Los workers solo cortan matrices: un hilo cada uno para no competir con el entrenamiento
+    torch.set_num_threads(1)
+
+
+def crear_dataloader(dataset: ChatDataset, batch_size: int, shuffle: bool = True,
+                     agrupar_por_longitud: bool = True, lotes_por_grupo: int = 50,
+                     semilla: int = 42, num_workers: int = 0, pin_memory: bool = False) -> DataLoader:
+    """
+    DataLoader que pide lotes completos al dataset (batch_size=None desactiva el collate)
+    
+    El muestreador corre en el proceso principal (su estado se guarda en el
+    checkpoint); los `num_workers` procesos arman los lotes desde la caché
+    mientras el modelo entrena. pin_memory solo sirve para copiar a CUDA
+    """
+    if shuffle and agrupar_por_longitud:
+        sampler = MuestreadorPorLongitud(dataset.longitudes, batch_size, lotes_por_grupo, semilla)
+    else:
+        base = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        sampler = BatchSampler(base, batch_size, drop_last=False)
+    # Generador propio: la semilla de los workers no consume el RNG global (dropout), que así
+    # sigue igual al reanudar aunque los workers persistentes no vuelvan a pedirla
+    return DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=num_workers,
+                      pin_memory=pin_memory and torch.cuda.is_available(),
+                      worker_init_fn=iniciar_worker if num_workers else None,
+                      persistent_workers=num_workers > 0,
+                      generator=torch.Generator().manual_seed(semilla))
+
+
+# =============================================================================
+# PERFIL DE CPU
+# =============================================================================
+
+def configurar_hilos(num_threads: int = 0) -> int:
+    """torch.set_num_threads; 0 = un hilo por núcleo disponible para este proceso"""
+    if not num_threads:
+        num_threads = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
+def usar_bf16(device, preferencia='auto') -> bool:
+    """
+    Si se entrena con autocast bfloat16. 'auto' lo activa solo con soporte
+    nativo (AVX512-BF16 o AMX en CPU): emulado es más lento que fp32
+    """
+    if preferencia != 'auto':
+        return bool(preferencia)
+    if device.type == 'cuda':
+        return torch.cuda.is_bf16_supported()
+    return any(getattr(torch.cpu, nombre, lambda: False)()
+               for nombre in ('_is_avx512_bf16_supported', '_is_amx_tile_supported'))
+
+
+# =============================================================================
+# CACHÉ DE DATOS TOKENIZADOS
+# =============================================================================
+
+# Subir si cambia la normalización o el formato de las matrices: invalida las cachés
+VERSION_CACHE_TOKENS = 1
+TAMANO_BLOQUE_TOKENS = 10_000
+
+
+def secuencias_causales(preguntas: np.ndarray, respuestas: np.ndarray, pad_idx: int,
+                        max_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Objetivo causal a partir de las matrices de texto_a_indices (<SOS> palabras <EOS>):
+    
+    - secuencia: palabras de la pregunta + <SOS> + respuesta + <EOS>
+    - objetivo: la secuencia corrida una posición (teacher forcing), con <PAD>
+      (ignorado por la pérdida) donde la siguiente palabra aún es de la pregunta
+    
+    Si no cabe en max_len se recortan las primeras palabras de la pregunta
+    """
+    secuencias = np.full(preguntas.shape[:1] + (max_len,), pad_idx, dtype=preguntas.dtype)
+    objetivos = np.full_like(secuencias, pad_idx)
+    largos_pregunta = (preguntas != pad_idx).sum(axis=1)
+    largos_respuesta = (respuestas != pad_idx).sum(axis=1)
+    
+    for i in range(len(preguntas)):
+        respuesta = respuestas[i, :min(largos_respuesta[i], max_len - 1)]
+        palabras = preguntas[i, 1:max(1, largos_pregunta[i] - 1)]  # sin <SOS> ni <EOS>
+        palabras = palabras[max(0, len(palabras) - (max_len - len(respuesta))):]
+        inicio = len(palabras)
+        secuencias[i, :inicio] = palabras
+        secuencias[i, inicio:inicio + len(respuesta)] = respuesta
+        objetivos[i, inicio:inicio + len(respuesta) - 1] = respuesta[1:]
+    return secuencias, objetivos
+
+
+def firma_tokenizacion(datos: List[Tuple[str, str]], bot: PetStoreBotTransformer, max_len: int,
+                       objetivo: str) -> str:
+    """Hash de los pares, el vocabulario (y fusiones BPE), max_len y el objetivo: si alguno cambia, la caché no sirve"""
+    h = hashlib.sha256()
+    encabezado = {
+        'version': VERSION_CACHE_TOKENS,
+        'max_len': max_len,
+        'objetivo': objetivo,
+        'especiales': [bot.PAD_TOKEN, bot.SOS_TOKEN, bot.EOS_TOKEN, bot.UNK_TOKEN],
+        'vocab': bot.vocab,
+        'tokenizador': bot.tokenizador.a_dict() if bot.tokenizador is not None else None,
+    }
+    h.update(json.dumps(encabezado, ensure_ascii=False).encode('utf-8'))
+    for pregunta, respuesta in datos:
+        h.update(json.dumps([pregunta, respuesta], ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()[:20]
+
+
+def tokenizar_pares_en_cache(
+    datos: List[Tuple[str, str]],
+    bot: PetStoreBotTransformer,
+    max_len: int,
+    directorio: str,
+    objetivo: str = 'posicional',
+    firma: Optional[str] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matrices int32 (N, max_len) de entradas y objetivos, guardadas como un
+    solo .npy (2, N, max_len) en `directorio` y abiertas con memmap
+    
+    - 'posicional': entradas = preguntas y objetivos = respuestas
+    - 'causal': ver secuencias_causales
+    
+    La primera corrida tokeniza por bloques directo al archivo (temporal y
+    luego os.replace, así un corte no deja una caché a medias); las siguientes
+    épocas y corridas con los mismos datos y vocabulario solo la abren.
+    `firma` evita recalcular firma_tokenizacion si el llamador ya la tiene
+    """
+    if firma is None:
+        firma = firma_tokenizacion(datos, bot, max_len, objetivo)
+    ruta = os.path.join(directorio, f"pares_{firma}.npy")
+    
+    if not os.path.exists(ruta):
+        os.makedirs(directorio, exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        matrices = np.lib.format.open_memmap(temporal, mode='w+', dtype=np.int32, shape=(2, len(datos), max_len))
+        for inicio in range(0, len(datos), TAMANO_BLOQUE_TOKENS):
+            bloque = datos[inicio:inicio + TAMANO_BLOQUE_TOKENS]
+            fin = inicio + len(bloque)
+            if objetivo == 'causal':
+                preguntas = bot.textos_a_indices([p for p, _ in bloque], max_len)
+                respuestas = bot.textos_a_indices([r for _, r in bloque], max_len)
+                matrices[0, inicio:fin], matrices[1, inicio:fin] = secuencias_causales(
+                    preguntas, respuestas, bot.word2idx[bot.PAD_TOKEN], max_len)
+            else:
+                bot.textos_a_indices([p for p, _ in bloque], max_len, salida=matrices[0, inicio:fin])
+                bot.textos_a_indices([r for _, r in bloque], max_len, salida=matrices[1, inicio:fin])
+        matrices.flush()
+        del matrices
+        os.replace(temporal, ruta)
+        logger.info(f" Pares tokenizados y guardados en caché: {ruta}")
+    else:
+        logger.info(f" Reutilizando caché de pares tokenizados: {ruta}")
+    
+    matrices = np.load(ruta, mmap_mode='r')
+    return matrices[0], matrices[1]
+
+
+# =============================================================================
+# PLANIFICACIÓN DE LA TASA DE APRENDIZAJE
+# =============================================================================
+
+PLANIFICADORES_LR = ('cosine', 'inverse_sqrt', 'constante')
+
+
+def crear_scheduler(optimizer: optim.Optimizer, tipo: str, pasos_warmup: int, pasos_totales: int,
+                    lr_minimo: float = 0.0) -> LambdaLR:
+    """
+    Calentamiento lineal de 0 a la tasa del optimizador durante
+    `pasos_warmup` pasos y después:
+    
+    - 'cosine': baja en coseno hasta `lr_minimo` (fracción de la tasa) en `pasos_totales`
+    - 'inverse_sqrt': decae como sqrt(pasos_warmup / paso) (el de "Attention Is All You Need")
+    - 'constante': se queda en la tasa del optimizador
+    
+    Se avanza un paso por cada optimizer.step(). El factor es una función
+    local: el state_dict del scheduler guarda solo el paso, así que al
+    reanudar con más épocas se usa el nuevo `pasos_totales`
+    """
+    if tipo not in PLANIFICADORES_LR:
+        raise ValueError(f"Planificador '{tipo}' desconocido; opciones: {', '.join(PLANIFICADORES_LR)}")
+    
+    def factor(paso: int) -> float:
+        if paso < pasos_warmup:
+            return (paso + 1) / pasos_warmup
+        if tipo == 'cosine':
+            progreso = min(1.0, (paso - pasos_warmup) / max(1, pasos_totales - pasos_warmup))
+            return lr_minimo + (1 - lr_minimo) * 0.5 * (1 + math.cos(math.pi * progreso))
+        if tipo == 'inverse_sqrt':
+            return math.sqrt(max(pasos_warmup, 1) / (paso + 1))
+        return 1.0
+    
+    return LambdaLR(optimizer, factor)
+
+
+# =============================================================================
+# VALIDACIÓN Y CHECKPOINTS DE ENTRENAMIENTO
+# =============================================================================
+
+def dividir_validacion(n: int, fraccion: float, semilla: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Posiciones (entrenamiento, validación) al azar; sin validación si no alcanza un ejemplo"""
+    orden = np.random.default_rng(semilla).permutation(n)
+    n_validacion = int(n * fraccion)
+    return np.sort(orden[n_validacion:]), np.sort(orden[:n_validacion])
+
+
+def estado_rng(dataloader: DataLoader) -> Dict:
+    """Estado de todos los generadores que usa el entrenamiento (dropout, barajado, muestreador)"""
+    estado = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+        'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }
+    if isinstance(dataloader.sampler, MuestreadorPorLongitud):
+        estado['muestreador'] = dataloader.sampler.rng.bit_generator.state
+    return estado
+
+
+def restaurar_rng(estado: Dict, dataloader: DataLoader):
+    random.setstate(estado['python'])
+    np.random.set_state(estado['numpy'])
+    torch.set_rng_state(estado['torch'])
+    if estado.get('cuda') is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(estado['cuda'])
+    if 'muestreador' in estado and isinstance(dataloader.sampler, MuestreadorPorLongitud):
+        dataloader.sampler.rng.bit_generator.state = estado['muestreador']
+
+
+def guardar_estado_entrenamiento(
+    ruta: str,
+    bot: PetStoreBotTransformer,
+    optimizer: optim.Optimizer,
+    scheduler,
+    epoca: int,
+    paso: int,
+    mejor_val_loss: float,
+    epocas_sin_mejora: int,
+    validacion: np.ndarray,
+    dataloader: DataLoader,
+    firma_datos: str
+):
+    """
+    Checkpoint completo para reanudar (atómico, ver guardar_atomico):
+    modelo y vocabulario, optimizador, scheduler, época y paso ya
+    completados, mejor pérdida de validación y épocas sin mejorarla (early
+    stopping), la división de validación, el estado de los generadores
+    aleatorios y la firma_tokenizacion de los datos (la validación son
+    índices: solo valen para esos mismos pares)
+    """
+    guardar_atomico({
+        'modelo': bot.estado_modelo(),
+        'optimizer_state': optimizer.state_dict(),
+        'scheduler_state': scheduler.state_dict() if scheduler is not None else None,
+        'epoca': epoca,
+        'paso': paso,
+        'mejor_val_loss': mejor_val_loss,
+        'epocas_sin_mejora': epocas_sin_mejora,
+        'validacion': validacion,
+        'rng': estado_rng(dataloader),
+        'firma_datos': firma_datos,
+    }, ruta)
+
+
+def cargar_estado_entrenamiento(ruta: str, device) -> Dict:
+    """Lee un checkpoint de guardar_estado_entrenamiento (incluye estados NumPy: weights_only=False)"""
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(f"Checkpoint de entrenamiento no encontrado en {ruta}")
+    return torch.load(ruta, map_location=device, weights_only=False)
+
+
+def calcular_mascara(bot: PetStoreBotTransformer, inputs: torch.Tensor, pad_idx: int) -> torch.Tensor:
+    """La máscara evita que la atención mire el relleno y, en modo causal, las palabras siguientes"""
+    if bot.objetivo == 'causal':
+        return mascara_causal(inputs, pad_idx)
+    return mascara_relleno(inputs, pad_idx)
+
+
+def evaluar(bot: PetStoreBotTransformer, dataloader: DataLoader, criterion: nn.Module, pad_idx: int,
+            device) -> float:
+    """Pérdida promedio por token (sin <PAD>) sobre el conjunto de validación"""
+    bot.model.eval()
+    total_loss = 0.0
+    total_tokens = 0
+    with torch.no_grad():
+        for inputs, targets in dataloader:
+            inputs = inputs.to(device)
+            targets = targets.to(device)
+            outputs = bot.model(inputs, calcular_mascara(bot, inputs, pad_idx))
+            tokens = int((targets != pad_idx).sum())
+            if tokens:
+                total_loss += criterion(outputs.view(-1, bot.vocab_size), targets.view(-1)).item() * tokens
+                total_tokens += tokens
+    bot.model.train()
+    return total_loss / total_tokens if total_tokens else float('nan')
 
 
 # =============================================================================
@@ -147,7 +517,8 @@ def guardar_datos_entrenamiento(filename='data/chatbot_training_data.json'):
 
 def cargar_datos_entrenamiento(filename='data/chatbot_training_data.json'):
     """
-    Carga los datos de entrenamiento desde un archivo JSON
+    Carga los datos de entrenamiento desde un archivo JSON más los shards del
+    registro del chat (ver registro_chat.py)
     """
     if not os.path.exists(filename):
         logger.warning(f"Archivo {filename} no encontrado, generando datos...")
@@ -156,7 +527,11 @@ def cargar_datos_entrenamiento(filename='data/chatbot_training_data.json'):
     with open(filename, 'r', encoding='utf-8') as f:
         datos = json.load(f)
     
-    logger.info(f" Datos de entrenamiento cargados: {len(datos)} ejemplos")
+    # Pares reales del chat (python registro_chat.py)
+    registro = [(ejemplo['entrada'], ejemplo['respuesta']) for ejemplo in leer_shards('respuestas')]
+    datos.extend(registro)
+    
+    logger.info(f" Datos de entrenamiento cargados: {len(datos)} ejemplos ({len(registro)} del registro del chat)")
     return datos
 
 
@@ -168,22 +543,49 @@ def entrenar_transformer(
     epochs: int = 50,
     batch_size: int = 32,
     learning_rate: float = 0.0001,
-    device: str = None
+    device: str = None,
+    directorio_cache: str = None,
+    objetivo: str = None,
+    reanudar: bool = False,
+    ruta_checkpoint: str = None
 ):
     """
     Entrena el modelo Transformer del chatbot
     
+    Al final de cada época guarda el checkpoint completo de entrenamiento en
+    `ruta_checkpoint` y, si mejoró la pérdida de validación, el modelo de
+    inferencia (bot.guardar_modelo). Se detiene antes de `epochs` si la
+    validación no mejora en TRANSFORMER_CONFIG['early_stopping_patience']
+    épocas. Al terminar, el bot queda con el mejor modelo, no con el de la
+    última época (si ninguna mejoró la validación, con el de la última y un
+    aviso en el log)
+    
     Args:
-        epochs: Número de épocas de entrenamiento
+        epochs: Número de épocas de entrenamiento (total, contando las ya hechas al reanudar)
         batch_size: Tamaño del batch
-        learning_rate: Tasa de aprendizaje
+        learning_rate: Tasa de aprendizaje máxima (al terminar el calentamiento)
         device: Dispositivo (cuda/cpu)
+        directorio_cache: Dónde guardar los pares tokenizados (default: TRANSFORMER_CONFIG['token_cache_dir'])
+        objetivo: 'causal' o 'posicional' (default: TRANSFORMER_CONFIG['objetivo'])
+        reanudar: Continuar desde `ruta_checkpoint` (vocabulario, objetivo y división de validación del checkpoint)
+        ruta_checkpoint: Checkpoint de entrenamiento (default: TRANSFORMER_CONFIG['checkpoint_path'])
     """
     
     # Determinar dispositivo
     if device is None:
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    logger.info(f" Usando dispositivo: {device}")
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    device = torch.device(device)
+    
+    config = get_config('TRANSFORMER_CONFIG')
+    config_pytorch = get_config('PYTORCH_CONFIG')
+    semilla = config_pytorch['seed']
+    hilos = configurar_hilos(config_pytorch['num_threads'])
+    bf16 = usar_bf16(device, config_pytorch['bf16'])
+    acumulacion = max(1, config['gradient_accumulation_steps'])
+    logger.info(f" Usando dispositivo: {device} ({hilos} hilos, "
+                f"{config_pytorch['num_workers']} workers, {'bf16' if bf16 else 'fp32'})")
+    if ruta_checkpoint is None:
+        ruta_checkpoint = config['checkpoint_path']
     
     # Inicializar bot
     logger.info(" Inicializando chatbot...")
@@ -193,81 +595,195 @@ def entrenar_transformer(
     logger.info(" Cargando datos de entrenamiento...")
     datos = cargar_datos_entrenamiento()
     
-    # Construir vocabulario
-    logger.info(" Construyendo vocabulario...")
-    textos = []
-    for pregunta, respuesta in datos:
-        textos.append(pregunta)
-        textos.append(respuesta)
-    bot.construir_vocabulario(textos)
-    
-    # Crear modelo
-    logger.info("  Creando modelo Transformer...")
-    bot.model = TransformerChatbot(
-        vocab_size=bot.vocab_size,
-        d_model=bot.d_model,
-        num_heads=bot.num_heads,
-        num_layers=bot.num_layers,
-        d_ff=bot.d_ff,
-        max_len=bot.max_len,
-        dropout=bot.dropout
-    ).to(device)
-    
-    # Crear dataset y dataloader
-    dataset = ChatDataset(datos, bot, bot.max_len)
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
-    
-    # Configurar optimizador y función de pérdida
+    estado = None
+    if reanudar:
+        # El vocabulario y la configuración salen del checkpoint: los índices deben coincidir
+        logger.info(f" Reanudando desde {ruta_checkpoint}...")
+        estado = cargar_estado_entrenamiento(ruta_checkpoint, device)
+        bot.aplicar_estado_modelo(estado['modelo'])
+        bot.model.to(device)
+        if objetivo is not None and objetivo != bot.objetivo:
+            logger.warning(f"  Se ignora objetivo={objetivo}: el checkpoint se entrenó con '{bot.objetivo}'")
+    else:
+        # Construir vocabulario
+        logger.info(" Construyendo vocabulario...")
+        textos = []
+        for pregunta, respuesta in datos:
+            textos.append(pregunta)
+            textos.append(respuesta)
+        tipo_vocabulario = config['tokenizer']
+        bot.construir_vocabulario(textos, tipo_vocabulario,
+                                  config['bpe_vocab_size'] if tipo_vocabulario == 'bpe' else config['vocab_size'])
+        
+        # Crear modelo. Se siembra aquí y no antes de PetStoreBotTransformer(): su __init__
+        # carga el modelo guardado (si existe) y consume números aleatorios. Al reanudar
+        # los generadores salen del checkpoint (restaurar_rng)
+        bot.objetivo = objetivo or config['objetivo']
+        logger.info(f"  Creando modelo Transformer ({bot.preset}, objetivo {bot.objetivo})...")
+        random.seed(semilla)
+        np.random.seed(semilla)
+        torch.manual_seed(semilla)
+        bot.model = bot.crear_modelo().to(device)
+    
+    # Tokenizar una sola vez (o reutilizar la caché) y dividir en entrenamiento y validación
+    if directorio_cache is None:
+        directorio_cache = config['token_cache_dir']
+    pad_idx = bot.word2idx[bot.PAD_TOKEN]
+    firma_datos = firma_tokenizacion(datos, bot, bot.max_len, bot.objetivo)
+    if estado is not None:
+        # Los shards del registro del chat que llegaron después cambian los pares: los índices de
+        # validación del checkpoint señalarían otros ejemplos y el vocabulario no los cubre
+        if 'firma_datos' not in estado:
+            logger.warning("  El checkpoint no guarda la firma de los datos: no se puede verificar que "
+                           "sean los de la corrida original")
+        elif estado['firma_datos'] != firma_datos:
+            raise ValueError(f"Los datos de entrenamiento cambiaron desde el checkpoint {ruta_checkpoint} "
+                             f"({len(datos)} pares, ¿nuevos shards del registro del chat?): no se puede "
+                             f"reanudar; entrene de nuevo sin --resume")
+    entradas, objetivos = tokenizar_pares_en_cache(datos, bot, bot.max_len, directorio_cache, bot.objetivo,
+                                                   firma_datos)
+    if estado is not None:
+        validacion = estado['validacion']
+        entrenamiento = np.setdiff1d(np.arange(len(entradas)), validacion)
+    else:
+        entrenamiento, validacion = dividir_validacion(len(entradas), config['validation_split'], semilla)
+    dataset = ChatDataset(entradas, objetivos, pad_idx, entrenamiento)
+    dataloader = crear_dataloader(dataset, batch_size, agrupar_por_longitud=config['agrupar_por_longitud'],
+                                  lotes_por_grupo=config['lotes_por_grupo'], semilla=semilla,
+                                  num_workers=config_pytorch['num_workers'],
+                                  pin_memory=config_pytorch['pin_memory'])
+    dataloader_validacion = None
+    if len(validacion):
+        dataloader_validacion = crear_dataloader(ChatDataset(entradas, objetivos, pad_idx, validacion),
+                                                 batch_size, shuffle=False)
+    else:
+        logger.warning("  Muy pocos ejemplos para validar: el mejor modelo se elige por la pérdida de entrenamiento")
+    
+    # Configurar optimizador, planificación de la tasa y función de pérdida
     optimizer = optim.Adam(bot.model.parameters(), lr=learning_rate)
-    criterion = nn.CrossEntropyLoss(ignore_index=bot.word2idx[bot.PAD_TOKEN])
+    pasos_totales = epochs * -(-len(dataloader) // acumulacion)
+    pasos_warmup = config['warmup_steps']
+    if pasos_warmup >= pasos_totales:
+        # Con pocos datos el calentamiento configurado ocuparía todo el entrenamiento
+        pasos_warmup = max(1, pasos_totales // 10)
+        logger.warning(f"  warmup_steps={config['warmup_steps']} supera los {pasos_totales} pasos del "
+                       f"entrenamiento: se calienta durante {pasos_warmup}")
+    scheduler = crear_scheduler(optimizer, config['lr_scheduler'], pasos_warmup, pasos_totales,
+                                config['min_lr_ratio'])
+    criterion = nn.CrossEntropyLoss(ignore_index=pad_idx)
+    gradient_clip = config['gradient_clip']
+    paciencia = config['early_stopping_patience']
+    
+    epoca_inicial = 0
+    paso = 0
+    mejor_val_loss = float('inf')
+    epocas_sin_mejora = 0
+    # Si el mejor modelo en disco es de este entrenamiento (o del que se reanuda)
+    mejor_guardado = False
+    if estado is not None:
+        optimizer.load_state_dict(estado['optimizer_state'])
+        if estado['scheduler_state'] is not None:
+            scheduler.load_state_dict(estado['scheduler_state'])
+        epoca_inicial = estado['epoca']
+        paso = estado['paso']
+        mejor_val_loss = estado['mejor_val_loss']
+        epocas_sin_mejora = estado.get('epocas_sin_mejora', 0)
+        mejor_guardado = math.isfinite(mejor_val_loss)
+        restaurar_rng(estado['rng'], dataloader)
+        logger.info(f" Checkpoint en época {epoca_inicial}, paso {paso}, mejor pérdida de validación {mejor_val_loss:.4f}")
     
     logger.info(f"\n{'='*80}")
     logger.info(f" INICIANDO ENTRENAMIENTO")
     logger.info(f"{'='*80}")
-    logger.info(f"Épocas: {epochs}")
-    logger.info(f"Batch size: {batch_size}")
-    logger.info(f"Learning rate: {learning_rate}")
-    logger.info(f"Vocabulario: {bot.vocab_size} palabras")
+    logger.info(f"Épocas: {epochs}" + (f" (desde la {epoca_inicial + 1})" if epoca_inicial else ""))
+    logger.info(f"Batch size: {batch_size}" + (f" x {acumulacion} lotes acumulados = {batch_size * acumulacion} por paso"
+                                               if acumulacion > 1 else ""))
+    logger.info(f"Learning rate: {learning_rate} ({config['lr_scheduler']}, {pasos_warmup} pasos de "
+                f"calentamiento de {pasos_totales})")
+    logger.info(f"Vocabulario: {bot.vocab_size} {'piezas BPE' if bot.tokenizador else 'palabras'}")
+    logger.info(f"Ejemplos: {len(entrenamiento)} de entrenamiento, {len(validacion)} de validación")
     logger.info(f"Parámetros del modelo: {sum(p.numel() for p in bot.model.parameters()):,}")
     logger.info(f"{'='*80}\n")
     
     # Entrenamiento
     bot.model.train()
-    for epoch in range(epochs):
+    for epoch in range(epoca_inicial, epochs):
         total_loss = 0
+        # Posiciones procesadas, tokens reales y posiciones que habría con relleno fijo a max_len
+        posiciones = tokens_reales = posiciones_fijas = 0
         progress_bar = tqdm(dataloader, desc=f"Época {epoch+1}/{epochs}")
+        lotes = len(dataloader)
+        inicio_epoca = time.perf_counter()
         
+        optimizer.zero_grad()
         for batch_idx, (inputs, targets) in enumerate(progress_bar):
-            inputs = inputs.to(device)
-            targets = targets.to(device)
+            inputs = inputs.to(device, non_blocking=True)
+            targets = targets.to(device, non_blocking=True)
             
-            # Forward pass
-            optimizer.zero_grad()
-            outputs = bot.model(inputs)
+            posiciones += inputs.numel()
+            tokens_reales += int(((inputs != pad_idx) | (targets != pad_idx)).sum())
+            posiciones_fijas += inputs.size(0) * bot.max_len
             
-            # Calcular pérdida
-            loss = criterion(outputs.view(-1, bot.vocab_size), targets.view(-1))
+            # Forward pass (bf16 en las matmul; la pérdida se calcula en fp32)
+            with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16):
+                outputs = bot.model(inputs, calcular_mascara(bot, inputs, pad_idx))
             
-            # Backward pass
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(bot.model.parameters(), 1.0)
-            optimizer.step()
+            # Calcular pérdida (en modo causal solo sobre la respuesta: el resto es <PAD>)
+            loss = criterion(outputs.float().view(-1, bot.vocab_size), targets.view(-1))
+            
+            # Backward pass: los gradientes se suman durante `acumulacion` lotes
+            # (el último grupo de la época puede ser más corto)
+            grupo = min(acumulacion, lotes - batch_idx // acumulacion * acumulacion)
+            (loss / grupo).backward()
+            if (batch_idx + 1) % acumulacion == 0 or batch_idx + 1 == lotes:
+                if gradient_clip:
+                    torch.nn.utils.clip_grad_norm_(bot.model.parameters(), gradient_clip)
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad()
+                paso += 1
             
             total_loss += loss.item()
-            progress_bar.set_postfix({'loss': loss.item()})
+            progress_bar.set_postfix({'loss': loss.item(), 'lr': scheduler.get_last_lr()[0]})
         
+        segundos = time.perf_counter() - inicio_epoca
         avg_loss = total_loss / len(dataloader)
-        logger.info(f"Época {epoch+1}/{epochs} - Pérdida promedio: {avg_loss:.4f}")
+        val_loss = evaluar(bot, dataloader_validacion, criterion, pad_idx, device) if dataloader_validacion else avg_loss
+        logger.info(f"Época {epoch+1}/{epochs} - Pérdida promedio: {avg_loss:.4f} - Validación: {val_loss:.4f} "
+                    f"- LR: {scheduler.get_last_lr()[0]:.2e}")
+        relleno_fijo = posiciones_fijas - tokens_reales
+        logger.info(f"   Relleno: {(posiciones - tokens_reales) / posiciones:.1%} de las posiciones "
+                    f"(con max_len fijo: {relleno_fijo / posiciones_fijas:.1%}); "
+                    f"eliminado {(posiciones_fijas - posiciones) / relleno_fijo if relleno_fijo else 0:.1%} del relleno")
+        logger.info(f"   Throughput: {tokens_reales / segundos:,.0f} tokens/s "
+                    f"({posiciones / segundos:,.0f} posiciones/s, {segundos:.1f} s)")
         
-        # Guardar checkpoint cada 10 épocas
-        if (epoch + 1) % 10 == 0:
+        # El modelo de inferencia es el mejor por validación; el checkpoint completo, el de cada época
+        if val_loss < mejor_val_loss - config['early_stopping_min_delta']:
+            mejor_val_loss = val_loss
+            epocas_sin_mejora = 0
             bot.guardar_modelo()
-            logger.info(f" Checkpoint guardado en época {epoch+1}")
+            mejor_guardado = True
+            logger.info(f" Mejor modelo hasta ahora (validación {val_loss:.4f}) guardado")
+        else:
+            epocas_sin_mejora += 1
+        guardar_estado_entrenamiento(ruta_checkpoint, bot, optimizer, scheduler, epoch + 1, paso,
+                                     mejor_val_loss, epocas_sin_mejora, validacion, dataloader, firma_datos)
+        
+        if paciencia and epocas_sin_mejora >= paciencia:
+            logger.info(f" Early stopping: {epocas_sin_mejora} épocas sin mejorar la validación "
+                        f"(mejor {mejor_val_loss:.4f})")
+            break
     
-    # Guardar modelo final
-    logger.info("\n Guardando modelo final...")
+    # Quedarse con el mejor modelo guardado; si ninguna época mejoró (p. ej. pérdida NaN),
+    # el archivo en disco es de otro entrenamiento y no se carga
+    if mejor_guardado:
+        logger.info(f"\n Cargando el mejor modelo (validación {mejor_val_loss:.4f})...")
+        bot.cargar_modelo(os.path.join('models', 'transformer_chatbot.pth'))
+    else:
+        logger.warning(" Ninguna época mejoró la pérdida de validación: se conservan los pesos de la "
+                       "última época y no se guardó un modelo de inferencia")
     bot.model_trained = True
-    bot.guardar_modelo()
     
     logger.info(f"\n{'='*80}")
     logger.info(" ENTRENAMIENTO COMPLETADO")
@@ -303,6 +819,13 @@ def probar_modelo(bot: PetStoreBotTransformer):
 # =============================================================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entrenamiento del chatbot Transformer")
+    parser.add_argument('--resume', nargs='?', const='', metavar='RUTA',
+                        help="Reanudar desde el checkpoint de entrenamiento "
+                             "(default: TRANSFORMER_CONFIG['checkpoint_path'])")
+    parser.add_argument('--epocas', type=int, help="Épocas totales (default: TRANSFORMER_CONFIG['num_epochs'])")
+    args = parser.parse_args()
+    
     print("\n" + "="*80)
     print(" ENTRENAMIENTO DEL CHATBOT TRANSFORMER")
     print("="*80 + "\n")
@@ -310,16 +833,20 @@ if __name__ == "__main__":
     # Configuración
     config = get_config('TRANSFORMER_CONFIG')
     
-    # Generar y guardar datos de entrenamiento
-    logger.info("Preparando datos de entrenamiento...")
-    guardar_datos_entrenamiento()
+    # Generar y guardar datos de entrenamiento. Al reanudar no se regeneran, y entrenar_transformer
+    # rechaza el checkpoint si los datos (JSON más shards del registro) ya no son los de la corrida original
+    if args.resume is None:
+        logger.info("Preparando datos de entrenamiento...")
+        guardar_datos_entrenamiento()
     
     # Entrenar modelo
     try:
         bot = entrenar_transformer(
-            epochs=config['num_epochs'],
+            epochs=args.epocas or config['num_epochs'],
             batch_size=config['batch_size'],
-            learning_rate=config['learning_rate']
+            learning_rate=config['learning_rate'],
+            reanudar=args.resume is not None,
+            ruta_checkpoint=args.resume or None
         )
         
         print("\n ¡Modelo entrenado exitosamente!")
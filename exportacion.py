@@ -0,0 +1,164 @@
+"""
+MÓDULO DE EXPORTACIÓN POR LOTES
+Convierte lotes de filas (cursor del servidor) en NDJSON, CSV o Parquet
+sin materializar el dataset completo en memoria
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Lote tal como lo entrega PetStoreDatabase.iterar_consulta
+Lote = Tuple[List[str], List[int], List[tuple]]
+
+
+def valor_exportable(valor: Any) -> Any:
+    """Convierte tipos de psycopg2 a tipos simples (Decimal -> float, fechas -> str)"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return str(valor)
+    return valor
+
+
+# =============================================================================
+# NDJSON
+# =============================================================================
+
+def generar_ndjson(lotes: Iterable[Lote]) -> Iterator[bytes]:
+    """Una línea JSON por fila; un bloque de bytes por lote (sin filas, cuerpo vacío)"""
+    for columnas, _, filas in lotes:
+        if not filas:
+            continue
+        bloque = []
+        for fila in filas:
+            registro = {col: valor_exportable(v) for col, v in zip(columnas, fila)}
+            bloque.append(json.dumps(registro, ensure_ascii=False))
+        yield ('\n'.join(bloque) + '\n').encode('utf-8')
+
+
+# =============================================================================
+# CSV
+# =============================================================================
+
+def generar_csv(lotes: Iterable[Lote]) -> Iterator[bytes]:
+    """CSV con encabezado en el primer lote (también si viene vacío: el resultado sin filas es solo el encabezado)"""
+    encabezado_escrito = False
+    for columnas, _, filas in lotes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not encabezado_escrito:
+            writer.writerow(columnas)
+            encabezado_escrito = True
+        writer.writerows([valor_exportable(v) for v in fila] for fila in filas)
+        yield buffer.getvalue().encode('utf-8')
+
+
+# =============================================================================
+# PARQUET
+# =============================================================================
+
+class _SalidaEnMemoria(io.RawIOBase):
+    """Archivo de solo escritura que acumula bytes hasta que se vacía con `extraer()`"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicion = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, datos) -> int:
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def extraer(self) -> bytes:
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _esquema_parquet(pa, columnas: List[str], tipos_oid: List[int]):
+    """Esquema Arrow a partir de los OID de PostgreSQL (texto si no se reconoce)"""
+    tipos_arrow = {
+        16: pa.bool_(),                       # boolean
+        20: pa.int64(), 21: pa.int64(), 23: pa.int64(),   # bigint, smallint, integer
+        700: pa.float64(), 701: pa.float64(), 1700: pa.float64(),  # real, double, numeric
+        1082: pa.date32(),                    # date
+        1114: pa.timestamp('us'),             # timestamp
+        1184: pa.timestamp('us', tz='UTC'),   # timestamptz
+    }
+    return pa.schema([(col, tipos_arrow.get(oid, pa.string())) for col, oid in zip(columnas, tipos_oid)])
+
+
+def generar_parquet(lotes: Iterable[Lote]) -> Iterator[bytes]:
+    """
+    Un row group de Parquet por lote. Un lote vacío solo fija el esquema: sin
+    filas el resultado es un archivo válido con las columnas y ningún row group
+
+    Requiere pyarrow (se importa aquí para que sea una dependencia opcional).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    salida = _SalidaEnMemoria()
+    writer = None
+    esquema = None
+    try:
+        for columnas, tipos_oid, filas in lotes:
+            if writer is None:
+                esquema = _esquema_parquet(pa, columnas, tipos_oid)
+                writer = pq.ParquetWriter(salida, esquema)
+            if not filas:
+                continue
+
+            datos = {}
+            for i, campo in enumerate(esquema):
+                valores = [fila[i] for fila in filas]
+                if pa.types.is_floating(campo.type):
+                    valores = [float(v) if v is not None else None for v in valores]
+                elif pa.types.is_string(campo.type):
+                    valores = [str(v) if v is not None else None for v in valores]
+                datos[campo.name] = valores
+
+            writer.write_table(pa.Table.from_pydict(datos, schema=esquema))
+            yield salida.extraer()
+    finally:
+        if writer is not None:
+            writer.close()
+    # El pie del archivo (metadatos) se escribe al cerrar
+    yield salida.extraer()
+
+
+# =============================================================================
+# FORMATOS DISPONIBLES
+# =============================================================================
+
+# formato -> (generador, media_type, extensión)
+FORMATOS_EXPORTACION: Dict[str, Tuple[Callable[[Iterable[Lote]], Iterator[bytes]], str, str]] = {
+    'ndjson': (generar_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (generar_csv, 'text/csv; charset=utf-8', 'csv'),
+    'parquet': (generar_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def parquet_disponible() -> bool:
+    """True si pyarrow está instalado"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
@@ -0,0 +1,121 @@
+"""
+CLASIFICADOR DE INTENCIONES DESTILADO
+Lo que el chatbot necesita en ejecución para el router destilado (solo
+NumPy): el clasificador lineal de n-gramas con hashing, las intenciones de
+datos y las respuestas del JSON. El entrenamiento está en
+destilar_intenciones.py
+"""
+
+import json
+import logging
+import os
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from normalizacion import NORMALIZADOR_CHATBOT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+VERSION_DESTILADO = 1
+# Palabras cuyas características ya se calcularon (los mensajes repiten casi siempre las mismas)
+TAMANO_CACHE_PALABRAS = 50_000
+# Intenciones de detectar_intencion que consultan la base de datos o el sistema (no están en el JSON)
+INTENCIONES_DATOS = frozenset([
+    'estadisticas', 'citas_hoy', 'ventas', 'productos', 'alertas', 'tipo_mas_comun', 'dia_mas_atencion',
+    'buscar_mascota', 'historial', 'servicios', 'prediccion', 'clustering', 'entrenar',
+])
+
+
+# =============================================================================
+# CARACTERÍSTICAS: N-GRAMAS CON HASHING
+# =============================================================================
+
+def hash_caracteristica(caracteristica: str, dimension: int) -> int:
+    """crc32 (estable entre procesos, a diferencia de hash()) módulo la dimensión"""
+    return zlib.crc32(caracteristica.encode('utf-8')) % dimension
+
+
+def caracteristicas_palabra(palabra: str, dimension: int) -> List[int]:
+    """La palabra completa y sus trigramas de caracteres (con bordes: tolera errores de tipeo)"""
+    indices = [hash_caracteristica('p:' + palabra, dimension)]
+    marcada = f'<{palabra}>'
+    indices.extend(hash_caracteristica('c:' + marcada[i:i + 3], dimension) for i in range(len(marcada) - 2))
+    return indices
+
+
+# =============================================================================
+# CLASIFICADOR ESTUDIANTE
+# =============================================================================
+
+class ClasificadorIntenciones:
+    """
+    Regresión softmax sobre una bolsa de n-gramas con hashing
+
+    Características (texto normalizado como normalizar_texto del chatbot):
+    palabras, pares de palabras seguidas y trigramas de caracteres, cada uno
+    a una de `dimension` columnas por crc32. Cada aparición vale
+    1/sqrt(cantidad de características): un mensaje largo no es más seguro
+    que uno corto. La predicción es sumar las filas de `pesos` de esas
+    columnas (unas decenas de microsegundos por mensaje)
+    """
+
+    def __init__(self, clases: Sequence[str], pesos: np.ndarray, sesgo: np.ndarray, dimension: int):
+        self.clases = list(clases)
+        self.pesos = pesos
+        self.sesgo = sesgo
+        self.dimension = dimension
+        self._cache: Dict[str, List[int]] = {}
+
+    def indices(self, texto: str) -> List[int]:
+        """Columnas de las características del texto (con repeticiones)"""
+        palabras = NORMALIZADOR_CHATBOT.normalizar(texto).split()
+        indices = []
+        for palabra in palabras:
+            propias = self._cache.get(palabra)
+            if propias is None:
+                propias = caracteristicas_palabra(palabra, self.dimension)
+                if len(self._cache) < TAMANO_CACHE_PALABRAS:
+                    self._cache[palabra] = propias
+            indices.extend(propias)
+        indices.extend(hash_caracteristica(f'b:{a} {b}', self.dimension) for a, b in zip(palabras, palabras[1:]))
+        return indices
+
+    def probabilidades(self, texto: str) -> np.ndarray:
+        indices = self.indices(texto)
+        logits = self.sesgo.copy()
+        if indices:
+            logits += self.pesos[indices].sum(axis=0) / np.sqrt(len(indices))
+        logits = np.exp(logits - logits.max())
+        return logits / logits.sum()
+
+    def predecir(self, texto: str) -> Tuple[str, float]:
+        """(intención, confianza) más probable"""
+        probabilidades = self.probabilidades(texto)
+        mejor = int(probabilidades.argmax())
+        return self.clases[mejor], float(probabilidades[mejor])
+
+    def guardar(self, ruta: str):
+        """npz comprimido (las columnas sin usar son ceros), escrito a un temporal y os.replace"""
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        temporal = f"{ruta}.tmp{os.getpid()}"
+        with open(temporal, 'wb') as archivo:
+            np.savez_compressed(archivo, version=VERSION_DESTILADO, clases=np.array(self.clases),
+                                pesos=self.pesos, sesgo=self.sesgo, dimension=self.dimension)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'ClasificadorIntenciones':
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"Clasificador destilado no encontrado en {ruta}")
+        with np.load(ruta) as datos:
+            return cls([str(c) for c in datos['clases']], datos['pesos'], datos['sesgo'], int(datos['dimension']))
+
+
+def respuestas_por_intencion(ruta: str = 'datos_veterinarios.json') -> Dict[str, List[str]]:
+    """Respuestas de cada intención del JSON (las mismas que guarda entrenar_chatbot_veterinario.py)"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return {intent['tag']: intent['responses'] for intent in json.load(f)['intents']}
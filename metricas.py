@@ -0,0 +1,228 @@
+"""
+MÓDULO DE MÉTRICAS PARA PROMETHEUS
+Peticiones y latencia por ruta, uso de la base de datos, sentencias preparadas,
+etapas del chatbot, cachés y retraso del event loop en formato de texto de Prometheus
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from cache import CACHES_REGISTRADAS
+from database import SENTENCIAS, SENTENCIA_SIN_REGISTRAR
+from trazas import HISTOGRAMAS, HistogramaLatencias
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Ruta usada para las peticiones que no coinciden con ningún endpoint (evita
+# una serie por cada URL inventada)
+RUTA_DESCONOCIDA = 'sin_ruta'
+
+
+# =============================================================================
+# FORMATO DE EXPOSICIÓN
+# =============================================================================
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _serie(nombre: str, etiquetas: Dict[str, str], valor: float) -> str:
+    if etiquetas:
+        texto = ','.join(f'{k}="{_escapar(v)}"' for k, v in etiquetas.items())
+        return f'{nombre}{{{texto}}} {valor}'
+    return f'{nombre} {valor}'
+
+
+def _encabezado(nombre: str, tipo: str, ayuda: str) -> List[str]:
+    return [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+
+
+def _histograma(nombre: str, etiquetas: Dict[str, str], hist: HistogramaLatencias) -> List[str]:
+    """Series _bucket/_sum/_count (en segundos) de un HistogramaLatencias (en ms)"""
+    conteos, total, suma_ms = hist.instantanea()
+    lineas = []
+    acumulado = 0
+    for limite, conteo in zip(hist.limites, conteos):
+        acumulado += conteo
+        le = '+Inf' if limite == float('inf') else repr(limite / 1000)
+        lineas.append(_serie(f'{nombre}_bucket', dict(etiquetas, le=le), acumulado))
+    lineas.append(_serie(f'{nombre}_sum', etiquetas, round(suma_ms / 1000, 6)))
+    lineas.append(_serie(f'{nombre}_count', etiquetas, total))
+    return lineas
+
+
+# =============================================================================
+# PETICIONES HTTP
+# =============================================================================
+
+class MetricasHTTP:
+    """Conteo de peticiones por (método, ruta, estado) y latencia por (método, ruta)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones: Dict[Tuple[str, str, int], int] = {}
+        self.latencias: Dict[Tuple[str, str], HistogramaLatencias] = {}
+        self.en_curso = 0
+
+    def iniciar(self):
+        with self._lock:
+            self.en_curso += 1
+
+    def observar(self, metodo: str, ruta: str, estado: int, segundos: float):
+        with self._lock:
+            self.en_curso -= 1
+            clave = (metodo, ruta, estado)
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            hist = self.latencias.get((metodo, ruta))
+            if hist is None:
+                hist = self.latencias[(metodo, ruta)] = HistogramaLatencias(f'{metodo} {ruta}')
+        hist.observar(segundos * 1000)
+
+    def exponer(self) -> List[str]:
+        with self._lock:
+            peticiones = dict(self.peticiones)
+            latencias = dict(self.latencias)
+            en_curso = self.en_curso
+
+        lineas = _encabezado('petstore_http_peticiones_total', 'counter', 'Peticiones atendidas por ruta y estado')
+        for (metodo, ruta, estado), total in sorted(peticiones.items()):
+            lineas.append(_serie('petstore_http_peticiones_total',
+                                 {'metodo': metodo, 'ruta': ruta, 'estado': str(estado)}, total))
+
+        lineas += _encabezado('petstore_http_duracion_segundos', 'histogram', 'Latencia de las peticiones por ruta')
+        for (metodo, ruta), hist in sorted(latencias.items()):
+            lineas += _histograma('petstore_http_duracion_segundos', {'metodo': metodo, 'ruta': ruta}, hist)
+
+        lineas += _encabezado('petstore_http_peticiones_en_curso', 'gauge', 'Peticiones en proceso')
+        lineas.append(_serie('petstore_http_peticiones_en_curso', {}, en_curso))
+        return lineas
+
+
+# =============================================================================
+# RETRASO DEL EVENT LOOP
+# =============================================================================
+
+class MonitorEventLoop:
+    """
+    Tarea de fondo que duerme `intervalo` segundos y mide cuánto tarde despierta:
+    el exceso es el tiempo que el loop estuvo bloqueado (p. ej. un endpoint
+    async haciendo trabajo síncrono)
+    """
+
+    def __init__(self, intervalo: float = 0.5):
+        self.intervalo = intervalo
+        self.ultimo_retraso = 0.0
+        self.histograma = HistogramaLatencias('event_loop')
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._medir())
+
+    def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _medir(self):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            self.ultimo_retraso = max(0.0, time.perf_counter() - inicio - self.intervalo)
+            self.histograma.observar(self.ultimo_retraso * 1000)
+
+    def exponer(self) -> List[str]:
+        lineas = _encabezado('petstore_event_loop_retraso_segundos', 'gauge', 'Último retraso medido del event loop')
+        lineas.append(_serie('petstore_event_loop_retraso_segundos', {}, round(self.ultimo_retraso, 6)))
+        lineas += _encabezado('petstore_event_loop_retraso_hist_segundos', 'histogram', 'Retrasos del event loop')
+        lineas += _histograma('petstore_event_loop_retraso_hist_segundos', {}, self.histograma)
+        return lineas
+
+
+# =============================================================================
+# BASE DE DATOS, CHATBOT Y CACHÉS
+# =============================================================================
+
+def _metricas_db(bases: Dict[str, object]) -> List[str]:
+    """`bases`: nombre del componente -> PetStoreDatabase (una serie por conexión distinta)"""
+    series = [
+        ('petstore_db_consultas_en_curso', 'gauge', 'Consultas ejecutándose en la conexión',
+         lambda db: db.consultas_en_curso),
+        ('petstore_db_conexion_abierta', 'gauge', '1 si la conexión a PostgreSQL está abierta',
+         lambda db: int(db.conn is not None and not db.conn.closed)),
+        ('petstore_db_conexiones_total', 'counter', 'Conexiones abiertas (la primera y las reconexiones)',
+         lambda db: db.conexiones_abiertas),
+        ('petstore_db_errores_total', 'counter', 'Intentos de consulta fallidos',
+         lambda db: db.errores_consulta),
+    ]
+    lineas = []
+    for nombre, tipo, ayuda, valor in series:
+        lineas += _encabezado(nombre, tipo, ayuda)
+        lineas += [_serie(nombre, {'componente': componente}, valor(db)) for componente, db in bases.items()]
+    return lineas
+
+
+def _metricas_sentencias() -> List[str]:
+    sentencias = [s for s in list(SENTENCIAS.values()) + [SENTENCIA_SIN_REGISTRAR] if s.llamadas]
+    series = [
+        ('petstore_db_sentencia_llamadas_total', 'Ejecuciones por sentencia', lambda s: s.llamadas),
+        ('petstore_db_sentencia_errores_total', 'Ejecuciones fallidas por sentencia', lambda s: s.errores),
+        ('petstore_db_sentencia_filas_total', 'Filas devueltas por sentencia', lambda s: s.filas),
+        ('petstore_db_sentencia_segundos_total', 'Tiempo acumulado por sentencia', lambda s: round(s.tiempo_total, 6)),
+    ]
+    lineas = []
+    for nombre, ayuda, valor in series:
+        lineas += _encabezado(nombre, 'counter', ayuda)
+        lineas += [_serie(nombre, {'sentencia': s.nombre}, valor(s)) for s in sentencias]
+    return lineas
+
+
+def _metricas_chat() -> List[str]:
+    """Histogramas de trazas.py: 'lstm.modelo' -> origen=lstm, etapa=modelo"""
+    lineas = _encabezado('petstore_chat_etapa_segundos', 'histogram',
+                         'Latencia por etapa del chatbot (modelo, intención, db.*, total)')
+    for nombre in sorted(HISTOGRAMAS):
+        origen, _, etapa = nombre.partition('.')
+        lineas += _histograma('petstore_chat_etapa_segundos', {'origen': origen, 'etapa': etapa}, HISTOGRAMAS[nombre])
+    return lineas
+
+
+def _metricas_cache(caches: Iterable) -> List[str]:
+    """Aciertos y fallos por nombre de caché (cada bot crea sus propias instancias: se suman)"""
+    por_nombre: Dict[str, Dict[str, int]] = {}
+    for cache in caches:
+        estadisticas = cache.estadisticas()
+        total = por_nombre.setdefault(estadisticas['nombre'], {'aciertos': 0, 'fallos': 0, 'entradas': 0})
+        for campo in total:
+            total[campo] += estadisticas[campo]
+    for total in por_nombre.values():
+        lecturas = total['aciertos'] + total['fallos']
+        total['tasa_aciertos'] = round(total['aciertos'] / lecturas, 4) if lecturas else 0.0
+
+    lineas = []
+    for nombre, tipo, ayuda, campo in [
+        ('petstore_cache_aciertos_total', 'counter', 'Lecturas servidas desde la caché', 'aciertos'),
+        ('petstore_cache_fallos_total', 'counter', 'Lecturas que tuvieron que recalcularse', 'fallos'),
+        ('petstore_cache_tasa_aciertos', 'gauge', 'Aciertos / lecturas', 'tasa_aciertos'),
+        ('petstore_cache_entradas', 'gauge', 'Entradas guardadas', 'entradas'),
+    ]:
+        lineas += _encabezado(nombre, tipo, ayuda)
+        lineas += [_serie(nombre, {'cache': cache}, total[campo]) for cache, total in sorted(por_nombre.items())]
+    return lineas
+
+
+def generar_exposicion(bases: Dict[str, object], http: MetricasHTTP, monitor: MonitorEventLoop) -> str:
+    """Todas las métricas en el formato de texto de Prometheus"""
+    lineas = http.exponer()
+    lineas += monitor.exponer()
+    lineas += _metricas_db(bases)
+    lineas += _metricas_sentencias()
+    lineas += _metricas_chat()
+    lineas += _metricas_cache(CACHES_REGISTRADAS)
+    return '\n'.join(lineas) + '\n'
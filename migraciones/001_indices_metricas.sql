@@ -0,0 +1,56 @@
+-- ============================================================================
+-- MIGRACIÓN 001: ÍNDICES PARA LAS CONSULTAS DE MÉTRICAS
+-- Pet Store - Soporte de índices para database.CONSULTAS_METRICAS
+-- ============================================================================
+-- Las consultas filtran por rangos semiabiertos sobre la columna de fecha
+-- (col >= inicio AND col < fin), por lo que un btree sobre la columna sirve
+-- directamente. Los índices parciales replican el WHERE de cada consulta
+-- para quedar pequeños y ser elegidos por el planificador.
+--
+-- Ejecutar:   psql -d <base> -f migraciones/001_indices_metricas.sql
+-- Verificar:  python verificar_indices.py
+-- ============================================================================
+
+
+-- ----------------------------------------------------------------------------
+-- appointment: citas de hoy (obtener_citas_hoy) y cubo de citas
+-- ----------------------------------------------------------------------------
+CREATE INDEX IF NOT EXISTS idx_appointment_fecha_hora_activo
+    ON appointment (fecha_hora)
+    WHERE activo = true;
+
+-- Refresco incremental del cubo de citas (appointment_id > último visto)
+CREATE INDEX IF NOT EXISTS idx_appointment_id_activo
+    ON appointment (appointment_id)
+    WHERE activo = true;
+
+
+-- ----------------------------------------------------------------------------
+-- venta / detalle_venta: ventas del día, del mes y comparativa mensual
+-- ----------------------------------------------------------------------------
+CREATE INDEX IF NOT EXISTS idx_venta_fecha_activo
+    ON venta (fecha_venta)
+    WHERE activo = true;
+
+CREATE INDEX IF NOT EXISTS idx_detalle_venta
+    ON detalle_venta (venta_id);
+
+
+-- ----------------------------------------------------------------------------
+-- producto: próximos a vencer y alerta de bajo inventario
+-- ----------------------------------------------------------------------------
+CREATE INDEX IF NOT EXISTS idx_producto_vencimiento_con_stock
+    ON producto (fecha_vencimiento)
+    WHERE activo = true AND stock_actual > 0;
+
+-- Solo contiene los productos en alerta: se mantiene casi vacío
+CREATE INDEX IF NOT EXISTS idx_producto_bajo_stock
+    ON producto (stock_actual)
+    WHERE activo = true AND stock_actual < stock_minimo;
+
+
+-- Actualizar estadísticas para que el planificador considere los índices nuevos
+ANALYZE appointment;
+ANALYZE venta;
+ANALYZE detalle_venta;
+ANALYZE producto;
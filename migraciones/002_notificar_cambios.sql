@@ -0,0 +1,40 @@
+-- ============================================================================
+-- MIGRACIÓN 002: NOTIFICACIÓN DE CAMBIOS PARA LOS CONTADORES
+-- Pet Store - Triggers LISTEN/NOTIFY usados por contadores.ContadorEstadisticas
+-- ============================================================================
+-- Cada INSERT/UPDATE/DELETE sobre pet, client, appointment o service envía
+-- un NOTIFY en el canal 'petstore_cambios' con el nombre de la tabla.
+-- Los triggers son FOR EACH STATEMENT: una carga masiva genera un solo aviso.
+--
+-- Ejecutar:   psql -d <base> -f migraciones/002_notificar_cambios.sql
+-- Activar:    CACHE_CONFIG['estadisticas_escuchar'] = True (config.py)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION notificar_cambio_petstore()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('petstore_cambios', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+DROP TRIGGER IF EXISTS trigger_notificar_pet ON pet;
+CREATE TRIGGER trigger_notificar_pet
+    AFTER INSERT OR UPDATE OR DELETE ON pet
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_petstore();
+
+DROP TRIGGER IF EXISTS trigger_notificar_client ON client;
+CREATE TRIGGER trigger_notificar_client
+    AFTER INSERT OR UPDATE OR DELETE ON client
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_petstore();
+
+DROP TRIGGER IF EXISTS trigger_notificar_appointment ON appointment;
+CREATE TRIGGER trigger_notificar_appointment
+    AFTER INSERT OR UPDATE OR DELETE ON appointment
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_petstore();
+
+DROP TRIGGER IF EXISTS trigger_notificar_service ON service;
+CREATE TRIGGER trigger_notificar_service
+    AFTER INSERT OR UPDATE OR DELETE ON service
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_petstore();
@@ -0,0 +1,308 @@
+"""
+ARQUITECTURA TRANSFORMER DEL CHATBOT
+Capas, máscaras de atención y guardado atómico de checkpoints; solo depende de
+torch y numpy, así que se puede importar sin la base de datos ni los bots
+"""
+
+import logging
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# ARQUITECTURA TRANSFORMER
+# =============================================================================
+
+class MultiHeadAttention(nn.Module):
+    """
+    Mecanismo de Multi-Head Attention para Transformer
+    """
+    def __init__(self, d_model: int, num_heads: int, dropout: float = 0.1):
+        super().__init__()
+        assert d_model % num_heads == 0, "d_model debe ser divisible por num_heads"
+        
+        self.d_model = d_model
+        self.num_heads = num_heads
+        self.d_k = d_model // num_heads
+        
+        # Proyecciones lineales para Q, K, V
+        self.W_q = nn.Linear(d_model, d_model)
+        self.W_k = nn.Linear(d_model, d_model)
+        self.W_v = nn.Linear(d_model, d_model)
+        self.W_o = nn.Linear(d_model, d_model)
+        
+        self.dropout = nn.Dropout(dropout)
+        self.scale = torch.sqrt(torch.FloatTensor([self.d_k]))
+    
+    def forward(self, query, key, value, mask=None):
+        batch_size = query.shape[0]
+        
+        # Proyecciones lineales
+        Q = self.W_q(query)
+        K = self.W_k(key)
+        V = self.W_v(value)
+        
+        # Dividir en múltiples heads
+        Q = Q.view(batch_size, -1, self.num_heads, self.d_k).permute(0, 2, 1, 3)
+        K = K.view(batch_size, -1, self.num_heads, self.d_k).permute(0, 2, 1, 3)
+        V = V.view(batch_size, -1, self.num_heads, self.d_k).permute(0, 2, 1, 3)
+        
+        # Calcular attention scores
+        scores = torch.matmul(Q, K.permute(0, 1, 3, 2)) / self.scale.to(query.device)
+        
+        if mask is not None:
+            scores = scores.masked_fill(mask == 0, -1e9)
+        
+        # Aplicar softmax
+        attention = torch.softmax(scores, dim=-1)
+        attention = self.dropout(attention)
+        
+        # Aplicar attention a valores
+        x = torch.matmul(attention, V)
+        
+        # Concatenar heads
+        x = x.permute(0, 2, 1, 3).contiguous()
+        x = x.view(batch_size, -1, self.d_model)
+        
+        # Proyección final
+        x = self.W_o(x)
+        
+        return x, attention
+
+
+class PositionwiseFeedForward(nn.Module):
+    """
+    Feed-Forward Network para cada posición
+    """
+    def __init__(self, d_model: int, d_ff: int, dropout: float = 0.1):
+        super().__init__()
+        self.fc1 = nn.Linear(d_model, d_ff)
+        self.fc2 = nn.Linear(d_ff, d_model)
+        self.dropout = nn.Dropout(dropout)
+        self.gelu = nn.GELU()
+    
+    def forward(self, x):
+        x = self.fc1(x)
+        x = self.gelu(x)
+        x = self.dropout(x)
+        x = self.fc2(x)
+        return x
+
+
+class TransformerBlock(nn.Module):
+    """
+    Bloque Transformer completo (Attention + FFN + Normalization)
+    """
+    def __init__(self, d_model: int, num_heads: int, d_ff: int, dropout: float = 0.1):
+        super().__init__()
+        self.attention = MultiHeadAttention(d_model, num_heads, dropout)
+        self.norm1 = nn.LayerNorm(d_model)
+        self.ff = PositionwiseFeedForward(d_model, d_ff, dropout)
+        self.norm2 = nn.LayerNorm(d_model)
+        self.dropout = nn.Dropout(dropout)
+    
+    def forward(self, x, mask=None):
+        # Multi-Head Attention con residual connection
+        attn_output, _ = self.attention(x, x, x, mask)
+        x = self.norm1(x + self.dropout(attn_output))
+        
+        # Feed-Forward con residual connection
+        ff_output = self.ff(x)
+        x = self.norm2(x + self.dropout(ff_output))
+        
+        return x
+
+
+class PositionalEncoding(nn.Module):
+    """
+    Codificación posicional para Transformer
+    """
+    def __init__(self, d_model: int, max_len: int = 512, dropout: float = 0.1):
+        super().__init__()
+        self.dropout = nn.Dropout(dropout)
+        
+        # Crear matriz de codificación posicional
+        pe = torch.zeros(max_len, d_model)
+        position = torch.arange(0, max_len, dtype=torch.float).unsqueeze(1)
+        div_term = torch.exp(torch.arange(0, d_model, 2).float() * (-np.log(10000.0) / d_model))
+        
+        pe[:, 0::2] = torch.sin(position * div_term)
+        pe[:, 1::2] = torch.cos(position * div_term)
+        
+        pe = pe.unsqueeze(0)
+        self.register_buffer('pe', pe)
+    
+    def forward(self, x):
+        x = x + self.pe[:, :x.size(1), :]
+        return self.dropout(x)
+
+
+def mascara_relleno(indices: torch.Tensor, pad_idx: int = 0) -> torch.Tensor:
+    """
+    Máscara (batch, 1, 1, seq_len) para MultiHeadAttention: 1 en los tokens
+    reales y 0 en <PAD>, así ninguna posición atiende al relleno
+    """
+    return (indices != pad_idx).unsqueeze(1).unsqueeze(2)
+
+
+def mascara_causal(indices: torch.Tensor, pad_idx: int = 0) -> torch.Tensor:
+    """
+    Máscara (batch, 1, seq_len, seq_len): cada posición atiende solo a las
+    anteriores (y a sí misma) que no sean <PAD>
+    """
+    largo = indices.size(1)
+    triangular = torch.tril(torch.ones(largo, largo, dtype=torch.bool, device=indices.device))
+    return triangular.unsqueeze(0).unsqueeze(0) & mascara_relleno(indices, pad_idx)
+
+
+def guardar_atomico(objeto, ruta: str):
+    """
+    torch.save a un temporal en el mismo directorio y os.replace sobre `ruta`:
+    quien lea el archivo (la API, una reanudación) ve el checkpoint anterior o
+    el nuevo completo, nunca uno a medio escribir si el proceso se interrumpe
+    """
+    directorio = os.path.dirname(ruta) or '.'
+    os.makedirs(directorio, exist_ok=True)
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    try:
+        with open(temporal, 'wb') as archivo:
+            torch.save(objeto, archivo)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+class TransformerChatbot(nn.Module):
+    """
+    Modelo Transformer completo para generación de respuestas
+    
+    Arquitectura:
+    - Embedding Layer (convierte palabras a vectores)
+    - Positional Encoding (agrega información de posición)
+    - N capas de Transformer Blocks
+    - Capa de salida (genera siguiente palabra)
+    
+    Con causal=True (entrenado con objetivo 'causal') generate aplica la
+    máscara causal, igual que en el entrenamiento. Con tie_embeddings=True
+    la capa de salida usa la misma matriz que el embedding
+    """
+    def __init__(
+        self,
+        vocab_size: int,
+        d_model: int = 256,
+        num_heads: int = 8,
+        num_layers: int = 6,
+        d_ff: int = 1024,
+        max_len: int = 128,
+        dropout: float = 0.1,
+        causal: bool = False,
+        tie_embeddings: bool = False
+    ):
+        super().__init__()
+        
+        self.d_model = d_model
+        self.vocab_size = vocab_size
+        self.max_len = max_len
+        self.causal = causal
+        
+        # Embedding de palabras
+        self.embedding = nn.Embedding(vocab_size, d_model)
+        self.pos_encoding = PositionalEncoding(d_model, max_len, dropout)
+        
+        # Stack de Transformer Blocks
+        self.transformer_blocks = nn.ModuleList([
+            TransformerBlock(d_model, num_heads, d_ff, dropout)
+            for _ in range(num_layers)
+        ])
+        
+        # Capa de salida
+        self.fc_out = nn.Linear(d_model, vocab_size)
+        if tie_embeddings:
+            self.fc_out.weight = self.embedding.weight
+        self.dropout = nn.Dropout(dropout)
+        
+        # Inicializar pesos
+        self._init_weights()
+    
+    def _init_weights(self):
+        """Inicialización de pesos"""
+        for p in self.parameters():
+            if p.dim() > 1:
+                nn.init.xavier_uniform_(p)
+    
+    def forward(self, x, mask=None):
+        """
+        Forward pass del transformer
+        
+        Args:
+            x: tensor de entrada (batch_size, seq_len) con índices de palabras
+            mask: máscara opcional para atención
+        
+        Returns:
+            logits de salida (batch_size, seq_len, vocab_size)
+        """
+        # Embedding y escalado
+        x = self.embedding(x) * np.sqrt(self.d_model)
+        
+        # Agregar codificación posicional
+        x = self.pos_encoding(x)
+        
+        # Pasar por bloques transformer
+        for transformer_block in self.transformer_blocks:
+            x = transformer_block(x, mask)
+        
+        # Capa de salida
+        output = self.fc_out(x)
+        
+        return output
+    
+    def generate(self, input_ids, max_length=100, temperature=0.8, top_k=50):
+        """
+        Genera texto autoregresivamente
+        
+        Args:
+            input_ids: secuencia de entrada
+            max_length: longitud máxima de generación
+            temperature: controla aleatoriedad (mayor = más aleatorio)
+            top_k: considera solo las top-k palabras más probables
+        
+        Returns:
+            secuencia generada
+        """
+        self.eval()
+        generated = input_ids.clone()
+        
+        with torch.no_grad():
+            for _ in range(max_length):
+                # Predecir siguiente token (la codificación posicional llega hasta max_len)
+                ventana = generated[:, -self.max_len:]
+                outputs = self.forward(ventana, mascara_causal(ventana) if self.causal else None)
+                
+                # Obtener logits de la última posición
+                next_token_logits = outputs[:, -1, :] / temperature
+                
+                # Aplicar top-k filtering
+                if top_k > 0:
+                    indices_to_remove = next_token_logits < torch.topk(next_token_logits, top_k)[0][..., -1, None]
+                    next_token_logits[indices_to_remove] = -float('Inf')
+                
+                # Muestrear siguiente token
+                probs = torch.softmax(next_token_logits, dim=-1)
+                next_token = torch.multinomial(probs, num_samples=1)
+                
+                # Agregar a secuencia generada
+                generated = torch.cat([generated, next_token], dim=1)
+                
+                # Detener si generamos token de fin
+                if next_token.item() == 2:  # <EOS> token
+                    break
+        
+        return generated
@@ -0,0 +1,145 @@
+"""
+MÓDULO DE NORMALIZACIÓN Y TOKENIZACIÓN DE TEXTO
+Normalizadores precompilados compartidos por el chatbot LSTM y el transformer,
+y conversión por lotes a matrices de índices
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+SIN_ACENTOS = (('á', 'a'), ('é', 'e'), ('í', 'i'), ('ó', 'o'), ('ú', 'u'), ('ü', 'u'))
+
+
+# =============================================================================
+# NORMALIZADOR
+# =============================================================================
+
+def colapsar_espacios(texto: str) -> str:
+    """Igual que re.sub(r'\\s+', ' ', texto) con split/join (una sola pasada en C)"""
+    palabras = texto.split()
+    if not palabras:
+        return ' ' if texto else ''
+    resultado = ' '.join(palabras)
+    if texto[0].isspace():
+        resultado = ' ' + resultado
+    if texto[-1].isspace():
+        resultado += ' '
+    return resultado
+
+
+class NormalizadorTexto:
+    """
+    Minúsculas, borra lo que no sea letra (a-z, acentos, ñ, ü), dígito
+    opcional o espacio, quita acentos opcionalmente y colapsa espacios.
+    Mismo resultado que la cadena de re.sub que usaba cada bot, precompilado:
+
+    - Texto ASCII (lo más común): una pasada de str.translate, que para
+      entradas ASCII usa el camino rápido de CPython con la tabla en caché
+    - Texto con acentos o símbolos: la expresión compilada borra y los acentos
+      se cambian con str.replace (str.translate fuera de ASCII consulta la
+      tabla carácter por carácter y es más lento en mensajes largos)
+    """
+
+    def __init__(self, quitar_acentos: bool, conservar_digitos: bool):
+        self.quitar_acentos = quitar_acentos
+        self.conservar_digitos = conservar_digitos
+        permitidos = 'a-záéíóúñü' + ('0-9' if conservar_digitos else '')
+        self._no_permitidos = re.compile(f'[^{permitidos}\\s]')
+        # Los caracteres ASCII que borraría la expresión, precalculados
+        self._tabla_ascii = str.maketrans({
+            chr(codigo): None for codigo in range(128) if self._no_permitidos.fullmatch(chr(codigo))
+        })
+        self._acentos = SIN_ACENTOS if quitar_acentos else ()
+
+    def limpiar(self, texto: str) -> str:
+        """Minúsculas, sin caracteres no permitidos y sin acentos (sin tocar los espacios)"""
+        texto = texto.lower()
+        if texto.isascii():
+            return texto.translate(self._tabla_ascii)
+        texto = self._no_permitidos.sub('', texto)
+        for acento, sin_acento in self._acentos:
+            texto = texto.replace(acento, sin_acento)
+        return texto
+
+    def normalizar(self, texto: str) -> str:
+        return colapsar_espacios(self.limpiar(texto.strip()))
+
+    def tokens(self, texto: str) -> List[str]:
+        return self.limpiar(texto).split()
+
+    def indices_lote(self, textos: Sequence[str], vocabulario: Dict[str, int], max_len: int,
+                     **opciones) -> np.ndarray:
+        """Normaliza y tokeniza `textos` directo a una matriz (len(textos), max_len); ver matriz_indices"""
+        return matriz_indices([self.tokens(texto) for texto in textos], vocabulario, max_len, **opciones)
+
+
+# LSTM (PetStoreBot.normalizar_texto): sin acentos y con dígitos
+NORMALIZADOR_CHATBOT = NormalizadorTexto(quitar_acentos=True, conservar_digitos=True)
+# Vocabulario del transformer: con acentos y sin dígitos
+NORMALIZADOR_TRANSFORMER = NormalizadorTexto(quitar_acentos=False, conservar_digitos=False)
+# Reglas de la respuesta híbrida del transformer: con acentos y con dígitos
+NORMALIZADOR_HIBRIDO = NormalizadorTexto(quitar_acentos=False, conservar_digitos=True)
+
+
+# =============================================================================
+# MATRICES DE ÍNDICES
+# =============================================================================
+
+def matriz_indices(
+    lista_tokens: Sequence[List[str]],
+    vocabulario: Dict[str, int],
+    max_len: int,
+    desconocido: Optional[int] = None,
+    inicio: Optional[int] = None,
+    fin: Optional[int] = None,
+    relleno: int = 0,
+    limite_vocabulario: Optional[int] = None,
+    truncar: str = 'post',
+    salida: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Convierte cada lista de tokens en una fila [inicio] + índices + [fin]
+    rellena con `relleno` hasta max_len
+
+    Args:
+        desconocido: índice para palabras fuera del vocabulario (None = se descartan)
+        limite_vocabulario: índices >= límite cuentan como desconocidos (num_words de Keras)
+        truncar: 'post' conserva las primeras palabras, 'pre' las últimas (como pad_sequences)
+        salida: matriz preasignada de forma (len(lista_tokens), max_len) a reutilizar;
+                puede ser la vista NumPy de un tensor de torch (torch.from_numpy no copia)
+
+    Returns:
+        Matriz int64 (o la de `salida`) con una fila por texto
+    """
+    if salida is None:
+        salida = np.empty((len(lista_tokens), max_len), dtype=np.int64)
+    salida.fill(relleno)
+    especiales = (inicio is not None) + (fin is not None)
+    capacidad = max_len - especiales
+
+    for fila, tokens in enumerate(lista_tokens):
+        if limite_vocabulario is None and desconocido is not None:
+            indices = [vocabulario.get(token, desconocido) for token in tokens]
+        else:
+            indices = []
+            for token in tokens:
+                indice = vocabulario.get(token)
+                if indice is None or (limite_vocabulario is not None and indice >= limite_vocabulario):
+                    indice = desconocido
+                if indice is not None:
+                    indices.append(indice)
+
+        if len(indices) > capacidad:
+            indices = indices[-capacidad:] if truncar == 'pre' else indices[:capacidad]
+        if inicio is not None:
+            indices.insert(0, inicio)
+        if fin is not None:
+            indices.append(fin)
+        salida[fila, :len(indices)] = indices
+    return salida
@@ -1,6 +1,9 @@
 """
 MÓDULO DE ANÁLISIS PREDICTIVO CON REDES NEURONALES
 Predice patrones y tendencias en los datos del Pet Store
+
+TensorFlow se importa dentro de los métodos que construyen, entrenan o
+cargan los modelos Keras: el clustering sólo necesita scikit-learn y scipy.
 """
 
 import numpy as np
@@ -14,11 +17,8 @@ from sklearn.metrics import classification_report, accuracy_score, silhouette_sc
 from sklearn.cluster import AgglomerativeClustering
 from scipy.cluster.hierarchy import dendrogram, linkage
 from scipy.spatial.distance import pdist
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import Dense, Dropout, LSTM, Embedding
 from config import PREDICTOR_CONFIG, PATHS
+from analitica import formatear_tipos_mascota, formatear_dias, formatear_horas
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -99,6 +99,7 @@ class PetStorePredictor:
         X_test = self.scaler.transform(X_test)
         
         # Convertir a categorical
+        from tensorflow import keras
         y_train_cat = keras.utils.to_categorical(y_train)
         y_test_cat = keras.utils.to_categorical(y_test)
         
@@ -167,6 +168,9 @@ class PetStorePredictor:
         Red neuronal para clasificar tipo de mascota
         Arquitectura: Dense  Dropout  Dense  Softmax
         """
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, Dropout
+        
         logger.info("Construyendo modelo de predicción de tipo de mascota...")
         
         model = Sequential([
@@ -193,6 +197,10 @@ class PetStorePredictor:
         Red neuronal para predecir asistencia (clasificación binaria)
         Arquitectura: Dense  Dropout  Dense  Sigmoid
         """
+        from tensorflow import keras
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, Dropout
+        
         logger.info("Construyendo modelo de predicción de asistencia...")
         
         model = Sequential([
@@ -207,7 +215,7 @@ class PetStorePredictor:
         model.compile(
             optimizer='adam',
             loss='binary_crossentropy',
-            metrics=['accuracy', tf.keras.metrics.AUC()]
+            metrics=['accuracy', keras.metrics.AUC()]
         )
         
         logger.info("Modelo construido")
@@ -237,6 +245,7 @@ class PetStorePredictor:
         )
         
         # Callbacks
+        from tensorflow import keras
         early_stop = keras.callbacks.EarlyStopping(
             monitor='val_loss',
             patience=10,
@@ -291,6 +300,7 @@ class PetStorePredictor:
         self.model_asistencia = self.construir_modelo_asistencia(X_train.shape[1])
         
         # Callbacks
+        from tensorflow import keras
         early_stop = keras.callbacks.EarlyStopping(
             monitor='val_loss',
             patience=10,
@@ -390,66 +400,24 @@ class PetStorePredictor:
     # =========================================================================
     
     def analizar_tipo_mascota_mas_comun(self, df: pd.DataFrame) -> Dict:
-        """Analiza qué tipo de mascota es más común"""
+        """
+        Analiza qué tipo de mascota es más común a partir de un DataFrame
+
+        Nota: el chatbot y la API usan AnaliticaCitas (analitica.py), que hace
+        este mismo conteo en SQL sin traer el dataset completo
+        """
         tipo_counts = df['tipo_mascota'].value_counts()
-        total = len(df)
-        
-        resultados = []
-        for tipo, count in tipo_counts.items():
-            resultados.append({
-                "tipo": str(tipo),
-                "cantidad": int(count),
-                "porcentaje": round(count / total * 100, 2)
-            })
-        
-        return {
-            "tipo_mas_comun": resultados[0]["tipo"],
-            "estadisticas": resultados
-        }
+        return formatear_tipos_mascota(list(tipo_counts.items()), total=len(df))
     
     def analizar_dia_mas_atencion(self, df: pd.DataFrame) -> Dict:
-        """Analiza qué día tiene más atención"""
-        dias_nombre = {
-            0: "Domingo", 1: "Lunes", 2: "Martes", 3: "Miércoles",
-            4: "Jueves", 5: "Viernes", 6: "Sábado"
-        }
-        
-        dia_counts = df['dia_semana'].value_counts().sort_index()
-        
-        resultados = []
-        for dia, count in dia_counts.items():
-            resultados.append({
-                "dia": dias_nombre.get(int(dia), str(dia)),
-                "numero_dia": int(dia),
-                "cantidad_citas": int(count)
-            })
-        
-        # Ordenar por cantidad
-        resultados_ordenados = sorted(resultados, key=lambda x: x['cantidad_citas'], reverse=True)
-        
-        return {
-            "dia_con_mas_atencion": resultados_ordenados[0]["dia"],
-            "estadisticas": resultados_ordenados
-        }
+        """Analiza qué día tiene más atención a partir de un DataFrame"""
+        dia_counts = df['dia_semana'].value_counts()
+        return formatear_dias(list(dia_counts.items()))
     
     def analizar_hora_pico(self, df: pd.DataFrame) -> Dict:
-        """Analiza la hora con más demanda"""
-        hora_counts = df['hora'].value_counts().sort_index()
-        
-        resultados = []
-        for hora, count in hora_counts.items():
-            resultados.append({
-                "hora": int(hora),
-                "cantidad_citas": int(count)
-            })
-        
-        # Ordenar por cantidad
-        resultados_ordenados = sorted(resultados, key=lambda x: x['cantidad_citas'], reverse=True)
-        
-        return {
-            "hora_pico": resultados_ordenados[0]["hora"],
-            "estadisticas": resultados_ordenados[:5]  # Top 5
-        }
+        """Analiza la hora con más demanda a partir de un DataFrame"""
+        hora_counts = df['hora'].value_counts()
+        return formatear_horas(list(hora_counts.items()))
     
     # =========================================================================
     # HIERARCHICAL CLUSTERING
@@ -872,6 +840,7 @@ class PetStorePredictor:
         try:
             logger.info("Cargando modelos...")
             
+            from tensorflow.keras.models import load_model
             self.model_tipo_mascota = load_model(PATHS['predictor_model'])
             
             with open(PATHS['scaler'], 'rb') as f:
@@ -0,0 +1,361 @@
+"""
+REGISTRO DE CONVERSACIONES Y SHARDS DE ENTRENAMIENTO
+Log JSONL de cada mensaje del chat (escrito por un hilo aparte, fuera de la
+petición) y armado de shards deduplicados para reentrenar los modelos
+
+Uso:
+    # La API registra sola (REGISTRO_CHAT_CONFIG['activo']); para armar los shards:
+    python registro_chat.py
+    python registro_chat.py --registros data/registro_chat/*.jsonl otro_servidor/*.jsonl
+
+Cada línea del log:
+    {"ts": ..., "mensaje": ..., "intencion": ..., "confianza": ..., "modelo": ...,
+     "latencia_ms": ..., "respuesta": ...}
+
+El archivo activo (chat.jsonl) se rota por tamaño a chat-<fecha>.jsonl: los
+rotados no se vuelven a tocar y se pueden copiar o borrar en cualquier
+momento. Un solo proceso debe escribir en cada directorio.
+
+Shards (JSONL, REGISTRO_CHAT_CONFIG['directorio_shards']):
+    - intenciones-NNNNN.jsonl {"texto", "intencion"}: para entrenar_chatbot_veterinario.py
+    - respuestas-NNNNN.jsonl {"entrada", "respuesta"}: para entrenar_transformer.py
+
+Solo el tráfico de /api/chat?use_transformer=false alimenta los shards: el
+camino del transformer (el default de la API) no clasifica intenciones,
+registra siempre 'transformer_generation' y esos registros se filtran.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from config import REGISTRO_CHAT_CONFIG
+from normalizacion import NORMALIZADOR_CHATBOT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+ARCHIVO_ACTIVO = 'chat.jsonl'
+TIPOS_SHARD = ('intenciones', 'respuestas')
+# Marca de fin para el hilo escritor
+_FIN = object()
+
+
+# =============================================================================
+# REGISTRO ASÍNCRONO
+# =============================================================================
+
+class RegistroChat:
+    """
+    Cola acotada + hilo escritor: registrar() solo arma un dict y lo encola
+    (microsegundos, nunca bloquea); el hilo serializa, escribe por lotes y
+    rota el archivo. Con la cola llena el registro se descarta y se cuenta en
+    `descartados` en vez de frenar el chat
+    """
+
+    def __init__(self, directorio: Optional[str] = None, max_bytes: Optional[int] = None,
+                 tamano_cola: Optional[int] = None):
+        self.directorio = directorio or REGISTRO_CHAT_CONFIG['directorio']
+        self.max_bytes = max_bytes or REGISTRO_CHAT_CONFIG['max_bytes']
+        self.cola: queue.Queue = queue.Queue(maxsize=tamano_cola or REGISTRO_CHAT_CONFIG['tamano_cola'])
+        self.escritos = 0
+        self.descartados = 0
+        # Último error al abrir el archivo activo (None si está abierto)
+        self.error_apertura: Optional[str] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+
+    @property
+    def ruta_activa(self) -> str:
+        return os.path.join(self.directorio, ARCHIVO_ACTIVO)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._escribir, name='registro_chat', daemon=True)
+            self._hilo.start()
+
+    def detener(self, timeout: float = 5.0):
+        """Escribe lo que quede en la cola y termina el hilo"""
+        if self._hilo is not None:
+            self._parar.set()
+            try:
+                self.cola.put(_FIN, timeout=timeout)
+            except queue.Full:
+                logger.warning(" Registro de chat: cola llena al cerrar, se pierden los pendientes")
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def registrar(self, mensaje: str, intencion: str, confianza: float, modelo: str, latencia_ms: float,
+                  respuesta: Optional[str] = None):
+        """Encola un mensaje (no hace nada si el hilo no está iniciado)"""
+        if self._hilo is None:
+            return
+        registro = {
+            'ts': time.time(),
+            'mensaje': mensaje,
+            'intencion': intencion,
+            'confianza': float(confianza),
+            'modelo': modelo,
+            'latencia_ms': round(latencia_ms, 3),
+            'respuesta': respuesta,
+        }
+        try:
+            self.cola.put_nowait(registro)
+        except queue.Full:
+            self.descartados += 1
+
+    def _rotar(self):
+        """chat.jsonl -> chat-<fecha>.jsonl (microsegundos: dos rotaciones seguidas no chocan)"""
+        destino = os.path.join(self.directorio, f"chat-{datetime.now():%Y%m%d-%H%M%S-%f}.jsonl")
+        os.replace(self.ruta_activa, destino)
+        logger.info(f" Registro de chat rotado a {destino}")
+
+    def _abrir(self):
+        """
+        Abre el archivo activo. Si no se puede (permisos, disco) lo registra y
+        lo reintenta con espera exponencial (hasta reintento_max_segundos);
+        mientras tanto registrar() sigue encolando y, con la cola llena,
+        descarta. None solo si se pidió detener
+        """
+        espera = 1.0
+        while True:
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                archivo = open(self.ruta_activa, 'a', encoding='utf-8')
+            except OSError as e:
+                if self.error_apertura is None:
+                    logger.error(f" No se pudo abrir el registro de chat {self.ruta_activa}: {e}; se reintenta")
+                self.error_apertura = str(e)
+                if self._parar.wait(espera):
+                    return None
+                espera = min(espera * 2, REGISTRO_CHAT_CONFIG['reintento_max_segundos'])
+                continue
+            if self.error_apertura is not None:
+                logger.info(f" Registro de chat reabierto en {self.ruta_activa}")
+                self.error_apertura = None
+            return archivo
+
+    def _escribir(self):
+        lote_max = REGISTRO_CHAT_CONFIG['lote']
+        archivo = self._abrir()
+        if archivo is None:
+            return
+        terminar = False
+        try:
+            while not terminar:
+                lote = [self.cola.get()]
+                while len(lote) < lote_max:
+                    try:
+                        lote.append(self.cola.get_nowait())
+                    except queue.Empty:
+                        break
+                if _FIN in lote:
+                    terminar = True
+                    lote = [registro for registro in lote if registro is not _FIN]
+                if not lote:
+                    continue
+                try:
+                    archivo.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in lote))
+                    archivo.flush()
+                    self.escritos += len(lote)
+                except (OSError, TypeError, ValueError) as e:
+                    # Un disco lleno o un registro raro no debe matar el hilo: se pierde ese lote
+                    logger.error(f" Error escribiendo el registro de chat: {e}")
+                if archivo.tell() >= self.max_bytes:
+                    archivo.close()
+                    archivo = None
+                    try:
+                        self._rotar()
+                    except OSError as e:
+                        # Se sigue escribiendo en el mismo archivo; se rota en el próximo lote
+                        logger.error(f" Error rotando el registro de chat: {e}")
+                    archivo = self._abrir()
+                    if archivo is None:
+                        return
+        finally:
+            if archivo is not None:
+                archivo.close()
+
+    def resumen(self) -> Dict:
+        return {
+            'activo': self._hilo is not None,
+            'en_cola': self.cola.qsize(),
+            'escritos': self.escritos,
+            'descartados': self.descartados,
+            'error_apertura': self.error_apertura,
+        }
+
+
+# =============================================================================
+# LECTURA DE REGISTROS
+# =============================================================================
+
+def archivos_registro(directorio: Optional[str] = None) -> List[str]:
+    """Rotados en orden cronológico y al final el activo"""
+    directorio = directorio or REGISTRO_CHAT_CONFIG['directorio']
+    rotados = sorted(glob.glob(os.path.join(directorio, 'chat-*.jsonl')))
+    activo = os.path.join(directorio, ARCHIVO_ACTIVO)
+    return rotados + ([activo] if os.path.exists(activo) else [])
+
+
+def leer_registros(rutas: Iterable[str]) -> Iterator[Dict]:
+    """Registros línea a línea (sin cargar los archivos); las líneas rotas se saltan"""
+    for ruta in rutas:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue  # p. ej. la última línea de un archivo que se estaba escribiendo
+                if isinstance(registro, dict) and registro.get('mensaje'):
+                    yield registro
+
+
+# =============================================================================
+# SHARDS DE ENTRENAMIENTO
+# =============================================================================
+
+def clave_texto(texto: str) -> bytes:
+    """Huella de 8 bytes del texto normalizado: la deduplicación guarda solo esto por mensaje"""
+    return hashlib.blake2b(NORMALIZADOR_CHATBOT.normalizar(texto).encode('utf-8'), digest_size=8).digest()
+
+
+class EscritorShards:
+    """Escribe ejemplos en <tipo>-00000.jsonl, <tipo>-00001.jsonl, ... de `por_shard` líneas cada uno"""
+
+    def __init__(self, directorio: str, tipo: str, por_shard: int):
+        self.directorio = directorio
+        self.tipo = tipo
+        self.por_shard = por_shard
+        self.total = 0
+        self.shards = 0
+        self._archivo = None
+        self._temporal = None
+
+    def agregar(self, ejemplo: Dict):
+        if self._archivo is None:
+            self._temporal = os.path.join(self.directorio, f".{self.tipo}-{self.shards:05d}.jsonl.tmp")
+            self._archivo = open(self._temporal, 'w', encoding='utf-8')
+        self._archivo.write(json.dumps(ejemplo, ensure_ascii=False) + '\n')
+        self.total += 1
+        if self.total % self.por_shard == 0:
+            self._cerrar_shard()
+
+    def _cerrar_shard(self):
+        """Un shard aparece completo o no aparece (temporal + os.replace)"""
+        self._archivo.close()
+        os.replace(self._temporal, os.path.join(self.directorio, f"{self.tipo}-{self.shards:05d}.jsonl"))
+        self._archivo = None
+        self.shards += 1
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._cerrar_shard()
+
+
+def construir_shards(rutas: Optional[Sequence[str]] = None, directorio_salida: Optional[str] = None,
+                     ruta_patrones: str = 'datos_veterinarios.json') -> Dict:
+    """
+    Recorre los registros una sola vez y arma los dos tipos de shard
+
+    - Solo mensajes cuya intención está en datos_veterinarios.json (los del
+      transformer, 'transformer_generation', nunca lo están) y con
+      confianza >= confianza_minima (las reglas de respaldo dan 0.5: quedan
+      fuera con el mínimo por defecto). Las intenciones de la base de datos
+      no entran: sus respuestas traen cifras del momento
+    - Las respuestas del transformer no se usan como objetivo (se entrenaría
+      con lo que él mismo generó)
+    - Deduplica por texto normalizado contra los patrones del JSON y entre
+      registros (se queda el primero)
+
+    Los shards anteriores se reemplazan: el armado es completo cada vez. Se
+    arma en un directorio temporal al lado de la salida y los anteriores se
+    borran solo si termina bien (si falla, quedan los que había).
+
+    Returns:
+        Resumen con los conteos
+    """
+    config = REGISTRO_CHAT_CONFIG
+    rutas = archivos_registro() if rutas is None else [r for patron in rutas for r in sorted(glob.glob(patron))]
+    directorio_salida = directorio_salida or config['directorio_shards']
+    os.makedirs(directorio_salida, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix='.shards-', dir=os.path.dirname(os.path.abspath(directorio_salida)))
+    try:
+        with open(ruta_patrones, 'r', encoding='utf-8') as f:
+            intents = json.load(f)['intents']
+        tags = {intent['tag'] for intent in intents}
+        vistos = {tipo: {clave_texto(p) for intent in intents for p in intent['patterns']} for tipo in TIPOS_SHARD}
+
+        escritores = {tipo: EscritorShards(temporal, tipo, config['ejemplos_por_shard']) for tipo in TIPOS_SHARD}
+        conteo = {'registros': 0, 'filtrados': 0, 'duplicados': 0}
+        try:
+            for registro in leer_registros(rutas):
+                conteo['registros'] += 1
+                intencion = registro.get('intencion')
+                if intencion not in tags or (registro.get('confianza') or 0) < config['confianza_minima']:
+                    conteo['filtrados'] += 1
+                    continue
+                clave = clave_texto(registro['mensaje'])
+
+                if clave in vistos['intenciones']:
+                    conteo['duplicados'] += 1
+                else:
+                    vistos['intenciones'].add(clave)
+                    escritores['intenciones'].agregar({'texto': registro['mensaje'], 'intencion': intencion})
+
+                if registro.get('respuesta') and registro.get('modelo') != 'Transformer' \
+                        and clave not in vistos['respuestas']:
+                    vistos['respuestas'].add(clave)
+                    escritores['respuestas'].agregar({'entrada': registro['mensaje'], 'respuesta': registro['respuesta']})
+        finally:
+            for escritor in escritores.values():
+                escritor.cerrar()
+
+        # Armado completo: recién ahora se reemplazan los shards anteriores
+        for anterior in glob.glob(os.path.join(directorio_salida, '*.jsonl')):
+            os.remove(anterior)
+        for nuevo in sorted(glob.glob(os.path.join(temporal, '*.jsonl'))):
+            os.replace(nuevo, os.path.join(directorio_salida, os.path.basename(nuevo)))
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    resumen = {**conteo, 'archivos': len(rutas)}
+    for tipo, escritor in escritores.items():
+        resumen[tipo] = {'ejemplos': escritor.total, 'shards': escritor.shards}
+    logger.info(f" Shards en {directorio_salida}: {resumen}")
+    return resumen
+
+
+def leer_shards(tipo: str, directorio: Optional[str] = None) -> Iterator[Dict]:
+    """Ejemplos de los shards de `tipo` ('intenciones' o 'respuestas') en orden; nada si no hay"""
+    directorio = directorio or REGISTRO_CHAT_CONFIG['directorio_shards']
+    for ruta in sorted(glob.glob(os.path.join(directorio, f"{tipo}-*.jsonl"))):
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            for linea in archivo:
+                yield json.loads(linea)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arma los shards de entrenamiento a partir del registro del chat")
+    parser.add_argument('--registros', nargs='*',
+                        help="Archivos de registro (acepta comodines; default: los de REGISTRO_CHAT_CONFIG['directorio'])")
+    parser.add_argument('--salida', help="Directorio de los shards (default: REGISTRO_CHAT_CONFIG['directorio_shards'])")
+    args = parser.parse_args()
+
+    print(json.dumps(construir_shards(args.registros, args.salida), indent=2, ensure_ascii=False))
@@ -0,0 +1,170 @@
+"""
+TOKENIZADOR DE SUBPALABRAS (BPE)
+Vocabulario entrenable por fusión de pares para el transformer: más chico que
+el de palabras y sin palabras desconocidas (nombres, números y acentos se
+arman con piezas)
+"""
+
+import heapq
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from normalizacion import NORMALIZADOR_HIBRIDO
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Marca de comienzo de palabra: al decodificar se cambia por un espacio
+INICIO_PALABRA = '▁'
+# Todo carácter que deja NORMALIZADOR_HIBRIDO: con él como base ningún texto queda fuera
+ALFABETO = 'abcdefghijklmnopqrstuvwxyzáéíóúñü0123456789'
+VERSION_TOKENIZADOR = 1
+# Palabras ya partidas que se recuerdan (los mensajes repiten casi siempre las mismas)
+TAMANO_CACHE_PALABRAS = 50_000
+
+
+# =============================================================================
+# TOKENIZADOR
+# =============================================================================
+
+class TokenizadorBPE:
+    """
+    Byte-pair encoding sobre caracteres, por palabra
+
+    El texto pasa por NORMALIZADOR_HIBRIDO (minúsculas, con acentos y dígitos,
+    sin puntuación); cada palabra empieza como INICIO_PALABRA + sus caracteres
+    y se le aplican las fusiones aprendidas en orden de prioridad. El
+    vocabulario es: tokens especiales, alfabeto base y una pieza por fusión
+
+    Uso:
+        tokenizador = TokenizadorBPE.entrenar(textos, 2000, ['<PAD>', '<SOS>', '<EOS>', '<UNK>'])
+        piezas = tokenizador.tokens("Luna tiene 3 años")  # ['▁luna', '▁tiene', '▁3', '▁años']
+        tokenizador.decodificar(piezas)                    # 'luna tiene 3 años'
+    """
+
+    def __init__(self, especiales: Sequence[str], fusiones: Optional[Iterable[Tuple[str, str]]] = None):
+        self.especiales = list(especiales)
+        self.fusiones = [tuple(par) for par in (fusiones or [])]
+        self.rangos = {par: rango for rango, par in enumerate(self.fusiones)}
+        # Dos fusiones distintas pueden dar la misma pieza ('a'+'bc' y 'ab'+'c'): una sola entrada
+        self.vocab = list(dict.fromkeys(
+            self.especiales + [INICIO_PALABRA] + list(ALFABETO) + [a + b for a, b in self.fusiones]
+        ))
+        self._cache: Dict[str, Tuple[str, ...]] = {}
+
+    @classmethod
+    def entrenar(cls, textos: Iterable[str], tamano_vocabulario: int, especiales: Sequence[str],
+                 frecuencia_minima: int = 2) -> 'TokenizadorBPE':
+        """
+        Aprende fusiones hasta llegar a `tamano_vocabulario` piezas (contando
+        especiales y alfabeto) o hasta que ningún par aparezca
+        `frecuencia_minima` veces
+
+        Cuenta pares una sola vez y después solo actualiza las palabras que
+        contienen el par fusionado; el par más frecuente sale de un heap con
+        entradas viejas descartadas al sacarlas (empates: el menor par)
+        """
+        conteo_palabras = Counter(palabra for texto in textos for palabra in NORMALIZADOR_HIBRIDO.tokens(texto))
+        palabras = [[INICIO_PALABRA] + list(palabra) for palabra in conteo_palabras]
+        frecuencias = list(conteo_palabras.values())
+
+        pares: Counter = Counter()
+        donde: Dict[Tuple[str, str], set] = defaultdict(set)
+        for i, simbolos in enumerate(palabras):
+            for par in zip(simbolos, simbolos[1:]):
+                pares[par] += frecuencias[i]
+                donde[par].add(i)
+        heap = [(-conteo, par) for par, conteo in pares.items()]
+        heapq.heapify(heap)
+
+        tokenizador = cls(especiales)
+        piezas = set(tokenizador.vocab)
+        fusiones = []
+        while len(piezas) < tamano_vocabulario and heap:
+            conteo, par = heapq.heappop(heap)
+            if -conteo != pares.get(par, 0):
+                continue  # entrada vieja: el conteo cambió después de agregarla
+            if -conteo < frecuencia_minima:
+                break
+            fusiones.append(par)
+            piezas.add(par[0] + par[1])
+
+            cambiados = set()
+            for i in donde.pop(par):
+                simbolos = palabras[i]
+                nuevos = fusionar(simbolos, par)
+                if len(nuevos) == len(simbolos):
+                    continue
+                for viejo in zip(simbolos, simbolos[1:]):
+                    pares[viejo] -= frecuencias[i]
+                    cambiados.add(viejo)
+                for nuevo in zip(nuevos, nuevos[1:]):
+                    pares[nuevo] += frecuencias[i]
+                    donde[nuevo].add(i)
+                    cambiados.add(nuevo)
+                palabras[i] = nuevos
+            del pares[par]
+            for cambiado in cambiados - {par}:
+                if pares[cambiado] > 0:
+                    heapq.heappush(heap, (-pares[cambiado], cambiado))
+                else:
+                    del pares[cambiado]
+
+        logger.info(f"Tokenizador BPE entrenado: {len(fusiones)} fusiones sobre {len(conteo_palabras)} palabras")
+        return cls(especiales, fusiones)
+
+    def _partir_palabra(self, palabra: str) -> Tuple[str, ...]:
+        """Aplica las fusiones a una palabra, la de menor rango primero"""
+        simbolos = [INICIO_PALABRA] + list(palabra)
+        rangos = self.rangos
+        while len(simbolos) > 1:
+            rango, i = min((rangos.get(par, len(rangos)), i) for i, par in enumerate(zip(simbolos, simbolos[1:])))
+            if rango == len(rangos):
+                break
+            simbolos[i:i + 2] = [simbolos[i] + simbolos[i + 1]]
+        return tuple(simbolos)
+
+    def tokens(self, texto: str) -> List[str]:
+        """Piezas del texto (se convierten a índices con el vocabulario del bot)"""
+        piezas = []
+        for palabra in NORMALIZADOR_HIBRIDO.tokens(texto):
+            partida = self._cache.get(palabra)
+            if partida is None:
+                partida = self._partir_palabra(palabra)
+                if len(self._cache) < TAMANO_CACHE_PALABRAS:
+                    self._cache[palabra] = partida
+            piezas.extend(partida)
+        return piezas
+
+    def decodificar(self, piezas: Iterable[str]) -> str:
+        """Une las piezas: cada INICIO_PALABRA vuelve a ser un espacio"""
+        return ''.join(piezas).replace(INICIO_PALABRA, ' ').strip()
+
+    def a_dict(self) -> Dict:
+        """Estado serializable (se guarda dentro del checkpoint del modelo)"""
+        return {
+            'version': VERSION_TOKENIZADOR,
+            'especiales': self.especiales,
+            'fusiones': [list(par) for par in self.fusiones],
+        }
+
+    @classmethod
+    def desde_dict(cls, estado: Dict) -> 'TokenizadorBPE':
+        return cls(estado['especiales'], estado['fusiones'])
+
+
+def fusionar(simbolos: List[str], par: Tuple[str, str]) -> List[str]:
+    """Reemplaza cada aparición de `par` (de izquierda a derecha, sin solaparse) por su unión"""
+    primero, segundo = par
+    nuevos = []
+    i = 0
+    while i < len(simbolos):
+        if i + 1 < len(simbolos) and simbolos[i] == primero and simbolos[i + 1] == segundo:
+            nuevos.append(primero + segundo)
+            i += 2
+        else:
+            nuevos.append(simbolos[i])
+            i += 1
+    return nuevos
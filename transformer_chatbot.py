@@ -4,7 +4,6 @@ Utiliza arquitectura Transformer (similar a GPT) para generar respuestas context
 """
 
 import torch
-import torch.nn as nn
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
@@ -13,255 +12,22 @@ import os
 import pickle
 from database import PetStoreDatabase
 from predictor import PetStorePredictor
+from analitica import AnaliticaCitas
+from busqueda import IndiceBusqueda, es_coincidencia_aproximada
+from contadores import ContadorEstadisticas
+from modelo_transformer import TransformerChatbot, guardar_atomico
+from normalizacion import NORMALIZADOR_HIBRIDO, NORMALIZADOR_TRANSFORMER, matriz_indices
+from tokenizador_bpe import TokenizadorBPE
+from config_transformer import get_config
+from trazas import etapa, trazado
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-
-# =============================================================================
-# ARQUITECTURA TRANSFORMER
-# =============================================================================
-
-class MultiHeadAttention(nn.Module):
-    """
-    Mecanismo de Multi-Head Attention para Transformer
-    """
-    def __init__(self, d_model: int, num_heads: int, dropout: float = 0.1):
-        super().__init__()
-        assert d_model % num_heads == 0, "d_model debe ser divisible por num_heads"
-        
-        self.d_model = d_model
-        self.num_heads = num_heads
-        self.d_k = d_model // num_heads
-        
-        # Proyecciones lineales para Q, K, V
-        self.W_q = nn.Linear(d_model, d_model)
-        self.W_k = nn.Linear(d_model, d_model)
-        self.W_v = nn.Linear(d_model, d_model)
-        self.W_o = nn.Linear(d_model, d_model)
-        
-        self.dropout = nn.Dropout(dropout)
-        self.scale = torch.sqrt(torch.FloatTensor([self.d_k]))
-    
-    def forward(self, query, key, value, mask=None):
-        batch_size = query.shape[0]
-        
-        # Proyecciones lineales
-        Q = self.W_q(query)
-        K = self.W_k(key)
-        V = self.W_v(value)
-        
-        # Dividir en múltiples heads
-        Q = Q.view(batch_size, -1, self.num_heads, self.d_k).permute(0, 2, 1, 3)
-        K = K.view(batch_size, -1, self.num_heads, self.d_k).permute(0, 2, 1, 3)
-        V = V.view(batch_size, -1, self.num_heads, self.d_k).permute(0, 2, 1, 3)
-        
-        # Calcular attention scores
-        scores = torch.matmul(Q, K.permute(0, 1, 3, 2)) / self.scale.to(query.device)
-        
-        if mask is not None:
-            scores = scores.masked_fill(mask == 0, -1e9)
-        
-        # Aplicar softmax
-        attention = torch.softmax(scores, dim=-1)
-        attention = self.dropout(attention)
-        
-        # Aplicar attention a valores
-        x = torch.matmul(attention, V)
-        
-        # Concatenar heads
-        x = x.permute(0, 2, 1, 3).contiguous()
-        x = x.view(batch_size, -1, self.d_model)
-        
-        # Proyección final
-        x = self.W_o(x)
-        
-        return x, attention
-
-
-class PositionwiseFeedForward(nn.Module):
-    """
-    Feed-Forward Network para cada posición
-    """
-    def __init__(self, d_model: int, d_ff: int, dropout: float = 0.1):
-        super().__init__()
-        self.fc1 = nn.Linear(d_model, d_ff)
-        self.fc2 = nn.Linear(d_ff, d_model)
-        self.dropout = nn.Dropout(dropout)
-        self.gelu = nn.GELU()
-    
-    def forward(self, x):
-        x = self.fc1(x)
-        x = self.gelu(x)
-        x = self.dropout(x)
-        x = self.fc2(x)
-        return x
-
-
-class TransformerBlock(nn.Module):
-    """
-    Bloque Transformer completo (Attention + FFN + Normalization)
-    """
-    def __init__(self, d_model: int, num_heads: int, d_ff: int, dropout: float = 0.1):
-        super().__init__()
-        self.attention = MultiHeadAttention(d_model, num_heads, dropout)
-        self.norm1 = nn.LayerNorm(d_model)
-        self.ff = PositionwiseFeedForward(d_model, d_ff, dropout)
-        self.norm2 = nn.LayerNorm(d_model)
-        self.dropout = nn.Dropout(dropout)
-    
-    def forward(self, x, mask=None):
-        # Multi-Head Attention con residual connection
-        attn_output, _ = self.attention(x, x, x, mask)
-        x = self.norm1(x + self.dropout(attn_output))
-        
-        # Feed-Forward con residual connection
-        ff_output = self.ff(x)
-        x = self.norm2(x + self.dropout(ff_output))
-        
-        return x
-
-
-class PositionalEncoding(nn.Module):
-    """
-    Codificación posicional para Transformer
-    """
-    def __init__(self, d_model: int, max_len: int = 512, dropout: float = 0.1):
-        super().__init__()
-        self.dropout = nn.Dropout(dropout)
-        
-        # Crear matriz de codificación posicional
-        pe = torch.zeros(max_len, d_model)
-        position = torch.arange(0, max_len, dtype=torch.float).unsqueeze(1)
-        div_term = torch.exp(torch.arange(0, d_model, 2).float() * (-np.log(10000.0) / d_model))
-        
-        pe[:, 0::2] = torch.sin(position * div_term)
-        pe[:, 1::2] = torch.cos(position * div_term)
-        
-        pe = pe.unsqueeze(0)
-        self.register_buffer('pe', pe)
-    
-    def forward(self, x):
-        x = x + self.pe[:, :x.size(1), :]
-        return self.dropout(x)
-
-
-class TransformerChatbot(nn.Module):
-    """
-    Modelo Transformer completo para generación de respuestas
-    
-    Arquitectura:
-    - Embedding Layer (convierte palabras a vectores)
-    - Positional Encoding (agrega información de posición)
-    - N capas de Transformer Blocks
-    - Capa de salida (genera siguiente palabra)
-    """
-    def __init__(
-        self,
-        vocab_size: int,
-        d_model: int = 256,
-        num_heads: int = 8,
-        num_layers: int = 6,
-        d_ff: int = 1024,
-        max_len: int = 128,
-        dropout: float = 0.1
-    ):
-        super().__init__()
-        
-        self.d_model = d_model
-        self.vocab_size = vocab_size
-        
-        # Embedding de palabras
-        self.embedding = nn.Embedding(vocab_size, d_model)
-        self.pos_encoding = PositionalEncoding(d_model, max_len, dropout)
-        
-        # Stack de Transformer Blocks
-        self.transformer_blocks = nn.ModuleList([
-            TransformerBlock(d_model, num_heads, d_ff, dropout)
-            for _ in range(num_layers)
-        ])
-        
-        # Capa de salida
-        self.fc_out = nn.Linear(d_model, vocab_size)
-        self.dropout = nn.Dropout(dropout)
-        
-        # Inicializar pesos
-        self._init_weights()
-    
-    def _init_weights(self):
-        """Inicialización de pesos"""
-        for p in self.parameters():
-            if p.dim() > 1:
-                nn.init.xavier_uniform_(p)
-    
-    def forward(self, x, mask=None):
-        """
-        Forward pass del transformer
-        
-        Args:
-            x: tensor de entrada (batch_size, seq_len) con índices de palabras
-            mask: máscara opcional para atención
-        
-        Returns:
-            logits de salida (batch_size, seq_len, vocab_size)
-        """
-        # Embedding y escalado
-        x = self.embedding(x) * np.sqrt(self.d_model)
-        
-        # Agregar codificación posicional
-        x = self.pos_encoding(x)
-        
-        # Pasar por bloques transformer
-        for transformer_block in self.transformer_blocks:
-            x = transformer_block(x, mask)
-        
-        # Capa de salida
-        output = self.fc_out(x)
-        
-        return output
-    
-    def generate(self, input_ids, max_length=100, temperature=0.8, top_k=50):
-        """
-        Genera texto autoregresivamente
-        
-        Args:
-            input_ids: secuencia de entrada
-            max_length: longitud máxima de generación
-            temperature: controla aleatoriedad (mayor = más aleatorio)
-            top_k: considera solo las top-k palabras más probables
-        
-        Returns:
-            secuencia generada
-        """
-        self.eval()
-        generated = input_ids.clone()
-        
-        with torch.no_grad():
-            for _ in range(max_length):
-                # Predecir siguiente token
-                outputs = self.forward(generated)
-                
-                # Obtener logits de la última posición
-                next_token_logits = outputs[:, -1, :] / temperature
-                
-                # Aplicar top-k filtering
-                if top_k > 0:
-                    indices_to_remove = next_token_logits < torch.topk(next_token_logits, top_k)[0][..., -1, None]
-                    next_token_logits[indices_to_remove] = -float('Inf')
-                
-                # Muestrear siguiente token
-                probs = torch.softmax(next_token_logits, dim=-1)
-                next_token = torch.multinomial(probs, num_samples=1)
-                
-                # Agregar a secuencia generada
-                generated = torch.cat([generated, next_token], dim=1)
-                
-                # Detener si generamos token de fin
-                if next_token.item() == 2:  # <EOS> token
-                    break
-        
-        return generated
+# Tokens que puede generar una respuesta, y mínimo reservado para ella en modo causal
+LARGO_RESPUESTA_MAX = 80
+LARGO_RESPUESTA_MIN = 16
 
 
 # =============================================================================
@@ -276,23 +42,29 @@ class PetStoreBotTransformer:
     basadas en el mensaje del usuario y datos de la base de datos.
     """
     
-    def __init__(self):
-        self.db = PetStoreDatabase()
-        self.predictor = PetStorePredictor()
-        
-        # Configuración del modelo
-        self.d_model = 256
-        self.num_heads = 8
-        self.num_layers = 4
-        self.d_ff = 1024
-        self.max_len = 128
-        self.dropout = 0.1
+    def __init__(self, db: PetStoreDatabase = None, predictor: PetStorePredictor = None,
+                 analitica: AnaliticaCitas = None, busqueda: IndiceBusqueda = None,
+                 contador: ContadorEstadisticas = None):
+        """Los componentes que se reciben se comparten (ver PetStoreBot); los que faltan se crean sobre `db`"""
+        self.db = db if db is not None else PetStoreDatabase()
+        self.predictor = predictor if predictor is not None else PetStorePredictor()
+        self.analitica = analitica if analitica is not None else AnaliticaCitas(self.db)
+        self.busqueda = busqueda if busqueda is not None else IndiceBusqueda(self.db)
+        self.contador = contador if contador is not None else ContadorEstadisticas(self.db)
+        
+        # Configuración del modelo (tamaño de TRANSFORMER_PRESETS; cargar_modelo usa el del checkpoint)
+        config = get_config('TRANSFORMER_CONFIG')
+        self.usar_preset(config['model_size'])
+        self.tie_embeddings = config['tie_embeddings']
+        self.max_len = config['max_len']
         
         # Vocabulario y tokenización
         self.vocab = None
         self.word2idx = None
         self.idx2word = None
         self.vocab_size = 0
+        # None: una entrada por palabra; TokenizadorBPE: piezas de subpalabra
+        self.tokenizador = None
         
         # Modelo transformer
         self.model = None
@@ -304,6 +76,9 @@ class PetStoreBotTransformer:
         self.EOS_TOKEN = '<EOS>'
         self.UNK_TOKEN = '<UNK>'
         
+        # 'causal': prompt + <SOS> + respuesta; 'posicional': pregunta y respuesta alineadas por posición
+        self.objetivo = 'posicional'
+        
         # Intentar cargar modelo entrenado
         self.model_trained = False
         try:
@@ -313,60 +88,109 @@ class PetStoreBotTransformer:
             logger.warning(f"  Modelo Transformer no encontrado: {e}")
             logger.info("   Se usará modo híbrido con respuestas predefinidas")
     
-    def construir_vocabulario(self, textos: List[str]):
+    def usar_preset(self, nombre: str):
+        """Toma d_model, num_heads, num_layers, d_ff y dropout del preset `nombre`"""
+        presets = get_config('TRANSFORMER_PRESETS')
+        if nombre not in presets:
+            raise ValueError(f"Tamaño '{nombre}' desconocido; opciones: {', '.join(presets)}")
+        self.preset = nombre
+        for clave, valor in presets[nombre].items():
+            setattr(self, clave, valor)
+    
+    def crear_modelo(self) -> TransformerChatbot:
+        """TransformerChatbot con el vocabulario y la configuración actuales del bot"""
+        return TransformerChatbot(
+            vocab_size=self.vocab_size,
+            d_model=self.d_model,
+            num_heads=self.num_heads,
+            num_layers=self.num_layers,
+            d_ff=self.d_ff,
+            max_len=self.max_len,
+            dropout=self.dropout,
+            causal=self.objetivo == 'causal',
+            tie_embeddings=self.tie_embeddings
+        ).to(self.device)
+    
+    def construir_vocabulario(self, textos: List[str], tipo: str = 'palabras', tamano: int = 5000):
         """
         Construye vocabulario a partir de textos de entrenamiento
+        
+        Args:
+            tipo: 'palabras' (las `tamano` más frecuentes, el resto es <UNK>)
+                  o 'bpe' (TokenizadorBPE de `tamano` piezas en total)
         """
         from collections import Counter
-        import re
-        
-        # Tokenizar todos los textos
-        words = []
-        for texto in textos:
-            texto = texto.lower()
-            texto = re.sub(r'[^a-záéíóúñü\s]', '', texto)
-            words.extend(texto.split())
         
-        # Contar frecuencias
-        word_counts = Counter(words)
-        
-        # Crear vocabulario (palabras más frecuentes)
-        vocab_list = [self.PAD_TOKEN, self.SOS_TOKEN, self.EOS_TOKEN, self.UNK_TOKEN]
-        vocab_list += [word for word, _ in word_counts.most_common(5000)]
+        especiales = [self.PAD_TOKEN, self.SOS_TOKEN, self.EOS_TOKEN, self.UNK_TOKEN]
+        if tipo == 'bpe':
+            self.tokenizador = TokenizadorBPE.entrenar(textos, tamano, especiales)
+            vocab_list = self.tokenizador.vocab
+        else:
+            self.tokenizador = None
+            
+            # Tokenizar todos los textos
+            words = []
+            for texto in textos:
+                words.extend(NORMALIZADOR_TRANSFORMER.tokens(texto))
+            
+            # Contar frecuencias
+            word_counts = Counter(words)
+            
+            # Crear vocabulario (palabras más frecuentes)
+            vocab_list = especiales + [word for word, _ in word_counts.most_common(tamano)]
         
         self.vocab = vocab_list
         self.word2idx = {word: idx for idx, word in enumerate(vocab_list)}
         self.idx2word = {idx: word for word, idx in self.word2idx.items()}
         self.vocab_size = len(vocab_list)
         
-        logger.info(f"Vocabulario construido: {self.vocab_size} palabras")
+        logger.info(f"Vocabulario construido: {self.vocab_size} tokens ({tipo})")
+    
+    def tokens(self, texto: str) -> List[str]:
+        """Palabras o piezas BPE del texto, según el vocabulario"""
+        if self.tokenizador is not None:
+            return self.tokenizador.tokens(texto)
+        return NORMALIZADOR_TRANSFORMER.tokens(texto)
     
     def texto_a_indices(self, texto: str, max_len: Optional[int] = None) -> torch.Tensor:
         """
         Convierte texto a secuencia de índices
         """
-        import re
-        
         if max_len is None:
             max_len = self.max_len
         
-        # Normalizar texto
-        texto = texto.lower()
-        texto = re.sub(r'[^a-záéíóúñü\s]', '', texto)
-        palabras = texto.split()
-        
-        # Convertir a índices
-        indices = [self.word2idx.get(self.SOS_TOKEN, 1)]
-        for palabra in palabras[:max_len-2]:
-            idx = self.word2idx.get(palabra, self.word2idx[self.UNK_TOKEN])
-            indices.append(idx)
-        indices.append(self.word2idx.get(self.EOS_TOKEN, 2))
-        
-        # Padding
-        while len(indices) < max_len:
-            indices.append(self.word2idx.get(self.PAD_TOKEN, 0))
+        return torch.from_numpy(self.textos_a_indices([texto], max_len)[0])
+    
+    def textos_a_indices(self, textos: List[str], max_len: Optional[int] = None,
+                         salida: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Convierte un lote de textos a una matriz (len(textos), max_len) de índices:
+        <SOS> + palabras + <EOS> y relleno con <PAD>. `salida` permite reutilizar
+        una matriz preasignada (p. ej. la vista de un tensor con tensor.numpy())
+        """
+        if max_len is None:
+            max_len = self.max_len
         
-        return torch.tensor(indices[:max_len], dtype=torch.long)
+        return matriz_indices(
+            [self.tokens(texto) for texto in textos], self.word2idx, max_len,
+            desconocido=self.word2idx[self.UNK_TOKEN],
+            inicio=self.word2idx.get(self.SOS_TOKEN, 1),
+            fin=self.word2idx.get(self.EOS_TOKEN, 2),
+            relleno=self.word2idx.get(self.PAD_TOKEN, 0),
+            salida=salida
+        )
+    
+    def prompt_causal(self, mensaje: str, reserva: int = 0) -> torch.Tensor:
+        """
+        Prompt del modo causal, sin relleno: palabras del mensaje + <SOS>
+        (1, largo). Deja `reserva` posiciones libres para la respuesta dentro
+        de max_len recortando las primeras palabras si hace falta
+        """
+        desconocido = self.word2idx[self.UNK_TOKEN]
+        indices = [self.word2idx.get(palabra, desconocido) for palabra in self.tokens(mensaje)]
+        indices = indices[max(0, len(indices) - (self.max_len - 1 - reserva)):]
+        indices.append(self.word2idx[self.SOS_TOKEN])
+        return torch.tensor([indices], dtype=torch.long)
     
     def indices_a_texto(self, indices: torch.Tensor) -> str:
         """
@@ -382,6 +206,8 @@ class PetStoreBotTransformer:
             if palabra not in [self.PAD_TOKEN, self.SOS_TOKEN]:
                 palabras.append(palabra)
         
+        if self.tokenizador is not None:
+            return self.tokenizador.decodificar(palabras)
         return ' '.join(palabras)
     
     def generar_respuesta_con_contexto(self, mensaje: str) -> Tuple[str, float]:
@@ -396,33 +222,45 @@ class PetStoreBotTransformer:
         """
         # Si el modelo no está entrenado, usar respuestas híbridas
         if not self.model_trained or self.model is None:
-            return self.generar_respuesta_hibrida(mensaje)
+            with etapa('hibrida'):
+                return self.generar_respuesta_hibrida(mensaje)
         
         try:
             # Convertir mensaje a tensor
-            input_tensor = self.texto_a_indices(mensaje).unsqueeze(0).to(self.device)
+            with etapa('tokenizar'):
+                if self.objetivo == 'causal':
+                    input_tensor = self.prompt_causal(mensaje, reserva=LARGO_RESPUESTA_MIN).to(self.device)
+                    max_length = min(LARGO_RESPUESTA_MAX, self.max_len - input_tensor.size(1))
+                else:
+                    input_tensor = self.texto_a_indices(mensaje).unsqueeze(0).to(self.device)
+                    max_length = LARGO_RESPUESTA_MAX
             
             # Generar respuesta con el transformer
-            self.model.eval()
-            with torch.no_grad():
-                output_indices = self.model.generate(
-                    input_tensor,
-                    max_length=80,
-                    temperature=0.7,
-                    top_k=40
-                )
+            with etapa('modelo'):
+                self.model.eval()
+                with torch.no_grad():
+                    output_indices = self.model.generate(
+                        input_tensor,
+                        max_length=max_length,
+                        temperature=0.7,
+                        top_k=40
+                    )
             
-            # Convertir a texto
-            respuesta = self.indices_a_texto(output_indices[0])
+            # Convertir a texto (en modo causal, solo lo generado después del prompt)
+            with etapa('decodificar'):
+                inicio = input_tensor.size(1) if self.objetivo == 'causal' else 0
+                respuesta = self.indices_a_texto(output_indices[0, inicio:])
             
             # Enriquecer con datos si es necesario
-            respuesta_enriquecida = self.enriquecer_respuesta(mensaje, respuesta)
+            with etapa('respuesta'):
+                respuesta_enriquecida = self.enriquecer_respuesta(mensaje, respuesta)
             
             return respuesta_enriquecida, 0.85
             
         except Exception as e:
             logger.error(f"Error generando respuesta con transformer: {e}")
-            return self.generar_respuesta_hibrida(mensaje)
+            with etapa('hibrida'):
+                return self.generar_respuesta_hibrida(mensaje)
     
     def generar_respuesta_hibrida(self, mensaje: str) -> Tuple[str, float]:
         """
@@ -431,12 +269,8 @@ class PetStoreBotTransformer:
         Usado como fallback cuando el transformer no está disponible
         Usa el sistema de detección de intenciones del chatbot original
         """
-        import re
-        mensaje_lower = mensaje.lower()
-        
         # Normalizar texto
-        texto_norm = re.sub(r'[^a-záéíóúñü\s0-9]', '', mensaje_lower)
-        texto_norm = re.sub(r'\s+', ' ', texto_norm).strip()
+        texto_norm = NORMALIZADOR_HIBRIDO.normalizar(mensaje).strip()
         
         # === SALUDOS ===
         if any(palabra in texto_norm for palabra in ['hola', 'buenos', 'buenas', 'hey', 'saludos']):
@@ -477,8 +311,8 @@ class PetStoreBotTransformer:
                     break
             
             if nombre:
-                df = self.db.buscar_mascota_por_nombre(nombre)
-                if df.empty:
+                mascotas = self.busqueda.buscar_mascotas(nombre)
+                if not mascotas:
                     respuesta = f" No se encontró ninguna mascota con el nombre '{nombre}'.\n\n"
                     respuesta += " **Sugerencias:**\n"
                     respuesta += "• Verifica la ortografía\n"
@@ -487,7 +321,9 @@ class PetStoreBotTransformer:
                     return respuesta, 0.85
                 
                 respuesta = f" **RESULTADOS DE BÚSQUEDA: '{nombre}'**\n\n"
-                for idx, row in df.iterrows():
+                if es_coincidencia_aproximada(nombre, mascotas):
+                    respuesta += " _Sin coincidencia exacta, mostrando nombres parecidos:_\n\n"
+                for row in mascotas:
                     respuesta += f" **{row['nombre']}** (ID: {row['pet_id']})\n"
                     respuesta += f"   • Tipo: {row['tipo']}\n"
                     respuesta += f"   • Raza: {row['raza']}\n"
@@ -507,7 +343,7 @@ class PetStoreBotTransformer:
         # NOTA: Excluir cuando dice explícitamente "predicciones"
         if (any(palabra in texto_norm for palabra in ['estadistica', 'estadisticas', 'metricas', 'reporte', 'resumen', 'numeros', 'cifras']) and 
             not any(palabra in texto_norm for palabra in ['prediccion', 'predicciones', 'predecir', 'pronostico'])):
-            stats = self.db.obtener_estadisticas_generales()
+            stats = self.contador.obtener()
             respuesta = f""" **Estadísticas del Sistema:**
 
              Mascotas registradas: {stats['total_mascotas']}
@@ -566,9 +402,8 @@ class PetStoreBotTransformer:
         
         # === TIPO DE MASCOTA MÁS COMÚN ===
         if ('tipo' in texto_norm and 'mascota' in texto_norm) or ('mascota' in texto_norm and any(p in texto_norm for p in ['comun', 'frecuente', 'popular'])):
-            df = self.db.obtener_dataset_completo()
-            if not df.empty:
-                analisis = self.predictor.analizar_tipo_mascota_mas_comun(df)
+            analisis = self.analitica.tipo_mascota_mas_comun()
+            if analisis is not None:
                 respuesta = f" **ANÁLISIS: Tipo de Mascota Más Común**\n\n"
                 respuesta += f" El tipo más común es: **{analisis['tipo_mas_comun']}**\n\n"
                 respuesta += " **Distribución completa:**\n"
@@ -969,7 +804,7 @@ class PetStoreBotTransformer:
         
         # Si menciona estadísticas, agregar datos reales
         if 'estadistica' in mensaje_lower or 'metrica' in mensaje_lower:
-            stats = self.db.obtener_estadisticas_generales()
+            stats = self.contador.obtener()
             respuesta_base += f"\n\n Datos actuales:\n"
             respuesta_base += f"• Mascotas: {stats['total_mascotas']}\n"
             respuesta_base += f"• Clientes: {stats['total_clientes']}\n"
@@ -977,12 +812,14 @@ class PetStoreBotTransformer:
         
         return respuesta_base
     
+    @trazado('transformer')
     def procesar_mensaje(self, mensaje: str) -> Dict:
         """
         Procesa mensaje y genera respuesta usando Transformer
         
         Returns:
-            Dict con respuesta, intención, confianza y timestamp
+            Dict con respuesta, intención, confianza, timestamp y debug_timings
+            (tiempos por etapa; ver trazas.py)
         """
         # Utilizo el modelo Transformer para generar una respuesta contextual al mensaje del usuario
         respuesta, confianza = self.generar_respuesta_con_contexto(mensaje)
@@ -996,27 +833,32 @@ class PetStoreBotTransformer:
             "modelo": "Transformer" if self.model_trained else "Híbrido"  # Identifico qué modelo se usó (Transformer si está entrenado, Híbrido si no)
         }
     
+    def estado_modelo(self) -> Dict:
+        """Pesos, vocabulario y configuración: lo que guarda guardar_modelo"""
+        return {
+            'model_state': self.model.state_dict(),
+            'vocab': self.vocab,
+            'word2idx': self.word2idx,
+            'idx2word': self.idx2word,
+            'vocab_size': self.vocab_size,
+            'tokenizador': self.tokenizador.a_dict() if self.tokenizador is not None else None,
+            'config': {
+                'preset': self.preset,
+                'tie_embeddings': self.tie_embeddings,
+                'd_model': self.d_model,
+                'num_heads': self.num_heads,
+                'num_layers': self.num_layers,
+                'd_ff': self.d_ff,
+                'max_len': self.max_len,
+                'dropout': self.dropout,
+                'objetivo': self.objetivo
+            }
+        }
+    
     def guardar_modelo(self, ruta='models/'):
         """Guarda el modelo transformer"""
-        os.makedirs(ruta, exist_ok=True)
-        
         if self.model is not None:
-            torch.save({
-                'model_state': self.model.state_dict(),
-                'vocab': self.vocab,
-                'word2idx': self.word2idx,
-                'idx2word': self.idx2word,
-                'vocab_size': self.vocab_size,
-                'config': {
-                    'd_model': self.d_model,
-                    'num_heads': self.num_heads,
-                    'num_layers': self.num_layers,
-                    'd_ff': self.d_ff,
-                    'max_len': self.max_len,
-                    'dropout': self.dropout
-                }
-            }, os.path.join(ruta, 'transformer_chatbot.pth'))
-            
+            guardar_atomico(self.estado_modelo(), os.path.join(ruta, 'transformer_chatbot.pth'))
             logger.info(" Modelo Transformer guardado")
     
     def cargar_modelo(self, ruta='models/transformer_chatbot.pth'):
@@ -1025,12 +867,21 @@ class PetStoreBotTransformer:
             raise FileNotFoundError(f"Modelo no encontrado en {ruta}")
         
         checkpoint = torch.load(ruta, map_location=self.device)
+        self.aplicar_estado_modelo(checkpoint)
+        self.model.eval()
+        self.model_trained = True
         
+        logger.info(f" Modelo Transformer cargado desde {ruta}")
+    
+    def aplicar_estado_modelo(self, checkpoint: Dict):
+        """Restaura vocabulario, configuración y pesos desde un dict de estado_modelo"""
         # Cargar vocabulario
         self.vocab = checkpoint['vocab']
         self.word2idx = checkpoint['word2idx']
         self.idx2word = checkpoint['idx2word']
         self.vocab_size = checkpoint['vocab_size']
+        estado_tokenizador = checkpoint.get('tokenizador')  # checkpoints anteriores: palabras
+        self.tokenizador = TokenizadorBPE.desde_dict(estado_tokenizador) if estado_tokenizador else None
         
         # Cargar configuración
         config = checkpoint['config']
@@ -1040,23 +891,14 @@ class PetStoreBotTransformer:
         self.d_ff = config['d_ff']
         self.max_len = config['max_len']
         self.dropout = config['dropout']
+        self.objetivo = config.get('objetivo', 'posicional')  # checkpoints anteriores: posicional
+        # Checkpoints anteriores: dimensiones fijas y embeddings sin compartir
+        self.preset = config.get('preset', 'personalizado')
+        self.tie_embeddings = config.get('tie_embeddings', False)
         
         # Crear y cargar modelo
-        self.model = TransformerChatbot(
-            vocab_size=self.vocab_size,
-            d_model=self.d_model,
-            num_heads=self.num_heads,
-            num_layers=self.num_layers,
-            d_ff=self.d_ff,
-            max_len=self.max_len,
-            dropout=self.dropout
-        ).to(self.device)
-        
+        self.model = self.crear_modelo()
         self.model.load_state_dict(checkpoint['model_state'])
-        self.model.eval()
-        self.model_trained = True
-        
-        logger.info(f" Modelo Transformer cargado desde {ruta}")
 
 
 # =============================================================================
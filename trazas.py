@@ -0,0 +1,196 @@
+"""
+MÓDULO DE TRAZAS DE LATENCIA
+Tiempos por etapa de cada mensaje del chatbot (normalizar, intención, modelo,
+consultas a la base de datos, respuesta) con histogramas y percentiles
+"""
+
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from config import TRAZAS_CONFIG
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# HISTOGRAMAS
+# =============================================================================
+
+# Límites superiores de los buckets en milisegundos (el último es +inf)
+LIMITES_MS: Tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+class HistogramaLatencias:
+    """
+    Histograma de buckets fijos; los percentiles se estiman interpolando
+    dentro del bucket (memoria constante sin importar cuántas muestras haya)
+    """
+
+    def __init__(self, nombre: str, limites: Tuple[float, ...] = LIMITES_MS):
+        self.nombre = nombre
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.total = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, ms: float):
+        with self._lock:
+            self.conteos[bisect.bisect_left(self.limites, ms)] += 1
+            self.total += 1
+            self.suma_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def instantanea(self) -> Tuple[List[int], int, float]:
+        """(conteos por bucket, total, suma en ms) leídos de forma consistente"""
+        with self._lock:
+            return list(self.conteos), self.total, self.suma_ms
+
+    def percentil(self, p: float) -> float:
+        """Percentil p (0-100) estimado en milisegundos"""
+        with self._lock:
+            if not self.total:
+                return 0.0
+            objetivo = p / 100 * self.total
+            acumulado = 0
+            for i, conteo in enumerate(self.conteos):
+                if conteo and acumulado + conteo >= objetivo:
+                    inferior = self.limites[i - 1] if i > 0 else 0.0
+                    superior = min(self.limites[i], self.max_ms)
+                    fraccion = (objetivo - acumulado) / conteo
+                    return inferior + (max(superior, inferior) - inferior) * fraccion
+                acumulado += conteo
+            return self.max_ms
+
+    def resumen(self) -> Dict:
+        return {
+            "etapa": self.nombre,
+            "muestras": self.total,
+            "promedio_ms": round(self.suma_ms / self.total, 3) if self.total else 0.0,
+            "p50_ms": round(self.percentil(50), 3),
+            "p95_ms": round(self.percentil(95), 3),
+            "p99_ms": round(self.percentil(99), 3),
+            "max_ms": round(self.max_ms, 3)
+        }
+
+
+_LOCK_HISTOGRAMAS = threading.Lock()
+# "origen.etapa" -> histograma (p. ej. "lstm.intencion", "transformer.db.citas_hoy")
+HISTOGRAMAS: Dict[str, HistogramaLatencias] = {}
+
+
+def histograma(nombre: str) -> HistogramaLatencias:
+    """Histograma con ese nombre (se crea la primera vez)"""
+    hist = HISTOGRAMAS.get(nombre)
+    if hist is None:
+        with _LOCK_HISTOGRAMAS:
+            hist = HISTOGRAMAS.setdefault(nombre, HistogramaLatencias(nombre))
+    return hist
+
+
+def resumen_latencias() -> List[Dict]:
+    """Percentiles de cada etapa registrada, ordenados por nombre"""
+    return [HISTOGRAMAS[nombre].resumen() for nombre in sorted(HISTOGRAMAS)]
+
+
+# =============================================================================
+# TRAZAS
+# =============================================================================
+
+class Traza:
+    """Etapas cronometradas de un mensaje; una etapa repetida suma sus tiempos"""
+
+    def __init__(self, origen: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.origen = origen
+        self.inicio = time.perf_counter()
+        self.etapas: List[Tuple[str, float]] = []
+        self.total_ms: Optional[float] = None
+
+    def agregar(self, nombre: str, segundos: float):
+        self.etapas.append((nombre, segundos * 1000))
+
+    def terminar(self):
+        self.total_ms = (time.perf_counter() - self.inicio) * 1000
+
+    def como_dict(self) -> Dict:
+        etapas: Dict[str, float] = {}
+        for nombre, ms in self.etapas:
+            etapas[nombre] = etapas.get(nombre, 0.0) + ms
+        return {
+            "traza_id": self.id,
+            "origen": self.origen,
+            "etapas_ms": {nombre: round(ms, 3) for nombre, ms in etapas.items()},
+            "total_ms": round(self.total_ms, 3) if self.total_ms is not None else None
+        }
+
+
+_traza_actual: contextvars.ContextVar[Optional[Traza]] = contextvars.ContextVar('traza_actual', default=None)
+
+
+def traza_actual() -> Optional[Traza]:
+    return _traza_actual.get()
+
+
+def registrar_etapa(nombre: str, segundos: float):
+    """Agrega una etapa a la traza en curso (no hace nada fuera de una traza)"""
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.agregar(nombre, segundos)
+
+
+@contextmanager
+def etapa(nombre: str):
+    """Cronometra el bloque como una etapa de la traza en curso"""
+    traza = _traza_actual.get()
+    if traza is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza.agregar(nombre, time.perf_counter() - inicio)
+
+
+def _finalizar(traza: Traza):
+    """Vuelca la traza a los histogramas y al log estructurado"""
+    traza.terminar()
+    datos = traza.como_dict()
+    histograma(f"{traza.origen}.total").observar(traza.total_ms)
+    for nombre, ms in datos['etapas_ms'].items():
+        histograma(f"{traza.origen}.{nombre}").observar(ms)
+    if TRAZAS_CONFIG['log_json']:
+        logger.info(json.dumps(datos, ensure_ascii=False))
+    elif traza.total_ms >= TRAZAS_CONFIG['lento_ms']:
+        logger.warning(f" Mensaje lento ({traza.total_ms:.0f} ms): {datos['etapas_ms']}")
+
+
+def trazado(origen: str) -> Callable:
+    """
+    Decorador para procesar_mensaje: abre una traza, la cierra al terminar
+    y agrega sus tiempos al resultado en la clave 'debug_timings'
+    """
+    def decorador(funcion: Callable[..., Dict]) -> Callable[..., Dict]:
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs) -> Dict:
+            traza = Traza(origen)
+            token = _traza_actual.set(traza)
+            try:
+                resultado = funcion(*args, **kwargs)
+            finally:
+                _traza_actual.reset(token)
+                _finalizar(traza)
+            resultado['debug_timings'] = traza.como_dict()
+            return resultado
+        return envoltura
+    return decorador
@@ -0,0 +1,125 @@
+"""
+VERIFICADOR DE ÍNDICES
+Ejecuta EXPLAIN sobre las consultas de métricas y señala los Seq Scan
+en las tablas grandes (appointment, venta, detalle_venta, producto)
+
+Uso:
+    python verificar_indices.py                  # plan real del planificador
+    python verificar_indices.py --forzar-indices # enable_seqscan = off
+    python verificar_indices.py --consulta ventas_mes
+
+Con tablas pequeñas PostgreSQL prefiere un Seq Scan aunque exista el índice;
+--forzar-indices desalienta los Seq Scan, así que uno que sobreviva indica que
+no hay índice utilizable para ese filtro (ver migraciones/001_indices_metricas.sql).
+Termina con código 1 si encuentra algún Seq Scan en las tablas vigiladas.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from typing import Dict, List
+from database import PetStoreDatabase, CONSULTAS_METRICAS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+TABLAS_VIGILADAS = {'appointment', 'venta', 'detalle_venta', 'producto'}
+
+
+def recorrer_plan(nodo: Dict, encontrados: List[Dict]):
+    """Agrega a `encontrados` los nodos Seq Scan del plan (recursivo)"""
+    if nodo.get('Node Type') == 'Seq Scan':
+        encontrados.append({
+            'tabla': nodo.get('Relation Name'),
+            'alias': nodo.get('Alias'),
+            'filas_estimadas': nodo.get('Plan Rows'),
+            'filtro': nodo.get('Filter', '')
+        })
+    for hijo in nodo.get('Plans', []):
+        recorrer_plan(hijo, encontrados)
+
+
+def explicar_consulta(conn, query: str, params: tuple = None, forzar_indices: bool = False) -> List[Dict]:
+    """
+    Ejecuta EXPLAIN (sin ANALYZE) y retorna los Seq Scan del plan
+
+    Se usa una transacción que siempre se revierte, de modo que el
+    SET LOCAL no afecta a otras consultas de la conexión.
+    """
+    cursor = conn.cursor()
+    try:
+        # La conexión de PetStoreDatabase está en autocommit: abrir la transacción a mano
+        if conn.autocommit:
+            cursor.execute("BEGIN")
+        if forzar_indices:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("EXPLAIN (FORMAT JSON) " + query.strip().rstrip(';'), params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        encontrados: List[Dict] = []
+        recorrer_plan(plan[0]['Plan'], encontrados)
+        return encontrados
+    finally:
+        if conn.autocommit:
+            cursor.execute("ROLLBACK")
+        else:
+            conn.rollback()
+        cursor.close()
+
+
+def verificar(consultas: List[str], forzar_indices: bool = False) -> int:
+    """Revisa cada consulta y retorna la cantidad de Seq Scan marcados"""
+    db = PetStoreDatabase()
+    marcados = 0
+
+    print("=" * 80)
+    print(f"  VERIFICACIÓN DE ÍNDICES{' (enable_seqscan = off)' if forzar_indices else ''}")
+    print("=" * 80)
+
+    try:
+        for nombre in consultas:
+            query, params = CONSULTAS_METRICAS[nombre]
+            try:
+                seq_scans = explicar_consulta(db.conn, query, params, forzar_indices)
+            except Exception as e:
+                print(f"\n ?  {nombre}: no se pudo obtener el plan ({e})")
+                continue
+
+            vigilados = [s for s in seq_scans if s['tabla'] in TABLAS_VIGILADAS]
+            if not vigilados:
+                print(f"\n OK {nombre}")
+                continue
+
+            marcados += len(vigilados)
+            print(f"\n !! {nombre}")
+            for scan in vigilados:
+                print(f"      Seq Scan en {scan['tabla']} ({scan['alias']}), "
+                      f"~{scan['filas_estimadas']} filas")
+                if scan['filtro']:
+                    print(f"      Filtro: {scan['filtro']}")
+    finally:
+        db.cerrar()
+
+    print("\n" + "=" * 80)
+    if marcados:
+        print(f"  {marcados} Seq Scan en tablas vigiladas. "
+              f"¿Se aplicó migraciones/001_indices_metricas.sql?")
+    else:
+        print("  Todas las consultas usan índices en las tablas vigiladas")
+    print("=" * 80)
+    return marcados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Señala Seq Scan en las consultas de métricas")
+    parser.add_argument('--forzar-indices', action='store_true',
+                        help="Desalentar Seq Scan (enable_seqscan = off) para validar que existe índice")
+    parser.add_argument('--consulta', choices=sorted(CONSULTAS_METRICAS), action='append',
+                        help="Consulta a revisar (se puede repetir; default: todas)")
+    args = parser.parse_args()
+
+    total = verificar(args.consulta or list(CONSULTAS_METRICAS), args.forzar_indices)
+    sys.exit(1 if total else 0)